@@ -0,0 +1,610 @@
+# config/grafo_vial.py
+"""
+Grafo vial en proceso construido desde un extracto de OpenStreetMap.
+
+Construcción (python manage.py importar_osm bogota.osm.pbf):
+    1. Se leen las vías transitables en carro (highway=*) del extracto XML
+       o PBF (este último requiere el paquete opcional osmium).
+    2. Los nodos intermedios de cada vía (grado 2) se contraen: el grafo solo
+       tiene intersecciones y cada arista guarda la geometría que recorre.
+    3. Se conserva la componente fuertemente conexa más grande, así toda
+       consulta entre dos nodos tiene respuesta.
+    4. Se precalculan tiempos desde y hacia unos pocos hitos (landmarks) que
+       dan la cota inferior de la búsqueda A* (ALT) de route, y una grilla
+       para ubicar el nodo más cercano a una coordenada.
+
+Todo se guarda como arrays .npy en un directorio y se abre con mmap: los
+workers de gunicorn comparten las mismas páginas en memoria y arrancan sin
+procesar nada.
+
+Costos en unidades de OSRM: duracion_s (tiempo en flujo libre según el tipo
+de vía o maxspeed) y distancia_m. El tramo entre la coordenada pedida y el
+nodo más cercano se suma en línea recta con el factor de circuito.
+"""
+
+import heapq
+import json
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from routes.geodesia import RADIO_TIERRA_KM, distancias_tramos, distancias_desde
+
+
+VERSION = 1
+
+# Velocidad (km/h) por tipo de vía cuando no tiene maxspeed
+VELOCIDADES_KMH = {
+    "motorway": 80, "motorway_link": 45,
+    "trunk": 60, "trunk_link": 40,
+    "primary": 45, "primary_link": 30,
+    "secondary": 35, "secondary_link": 25,
+    "tertiary": 30, "tertiary_link": 20,
+    "unclassified": 25,
+    "residential": 20,
+    "living_street": 10,
+    "service": 15,
+}
+ACCESO_RESTRINGIDO = {"no", "private"}
+
+NUM_HITOS = 8
+TAMANO_CELDA_GRADOS = 0.005  # ~550 m
+LOTE_FUENTES = 32            # Fuentes por lote en los cálculos uno contra todos
+BLOQUE_COTAS = 1024          # Nodos por bloque de cotas de A* (ver GrafoVial.cotas)
+
+ARRAYS = (
+    "nodos_lat", "nodos_lng",
+    "indptr", "destino", "duracion_s", "distancia_m",
+    "geometria_inicio", "geometria_fin", "invertida",
+    "geometria_lat", "geometria_lng",
+    "inv_indptr", "inv_arista",
+    "hitos", "hitos_desde", "hitos_hacia",
+    "celdas_claves", "celdas_inicio", "celdas_nodos",
+)
+
+
+# ---------------------------------------------------------------------------
+# Lectura del extracto
+# ---------------------------------------------------------------------------
+
+def _transitable(etiquetas):
+    return (
+        etiquetas.get("highway") in VELOCIDADES_KMH
+        and etiquetas.get("access") not in ACCESO_RESTRINGIDO
+        and etiquetas.get("motor_vehicle") not in ACCESO_RESTRINGIDO
+        and etiquetas.get("area") != "yes"
+    )
+
+
+def leer_osm_xml(archivo):
+    """
+    Returns:
+        (coordenadas, vias) donde coordenadas es {id_nodo: (lat, lng)} y vias
+        una lista de (ids_nodos, etiquetas) de las vías transitables
+    """
+    coordenadas = {}
+    vias = []
+    nodos_via, etiquetas = [], {}
+
+    for _, elemento in ET.iterparse(str(archivo), events=("end",)):
+        if elemento.tag == "node":
+            coordenadas[int(elemento.get("id"))] = (float(elemento.get("lat")), float(elemento.get("lon")))
+            etiquetas = {}
+            elemento.clear()
+        elif elemento.tag == "nd":
+            nodos_via.append(int(elemento.get("ref")))
+        elif elemento.tag == "tag":
+            etiquetas[elemento.get("k")] = elemento.get("v")
+        elif elemento.tag == "way":
+            if _transitable(etiquetas) and len(nodos_via) > 1:
+                vias.append((nodos_via, etiquetas))
+            nodos_via, etiquetas = [], {}
+            elemento.clear()
+        elif elemento.tag == "relation":
+            nodos_via, etiquetas = [], {}
+            elemento.clear()
+
+    return coordenadas, vias
+
+
+def leer_osm_pbf(archivo):
+    """
+    Igual que leer_osm_xml para extractos .osm.pbf (requiere osmium).
+    """
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError("Para leer archivos .pbf instala el paquete osmium (pip install osmium)")
+
+    coordenadas = {}
+    vias = []
+
+    class Lector(osmium.SimpleHandler):
+        def way(self, way):
+            etiquetas = {tag.k: tag.v for tag in way.tags}
+            if not _transitable(etiquetas) or len(way.nodes) < 2:
+                return
+            nodos_via = []
+            for nodo in way.nodes:
+                if not nodo.location.valid():
+                    return
+                coordenadas[nodo.ref] = (nodo.location.lat, nodo.location.lon)
+                nodos_via.append(nodo.ref)
+            vias.append((nodos_via, etiquetas))
+
+    Lector().apply_file(str(archivo), locations=True)
+    return coordenadas, vias
+
+
+def leer_osm(archivo):
+    archivo = Path(archivo)
+    if archivo.name.endswith(".pbf"):
+        return leer_osm_pbf(archivo)
+    return leer_osm_xml(archivo)
+
+
+def _sentido(etiquetas):
+    """
+    1 solo en el sentido de la vía, -1 solo en contra, 0 en ambos.
+    """
+    oneway = etiquetas.get("oneway", "")
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway in ("-1", "reverse"):
+        return -1
+    if oneway == "no":
+        return 0
+    if etiquetas.get("junction") in ("roundabout", "circular") or etiquetas.get("highway") == "motorway":
+        return 1
+    return 0
+
+
+def _velocidad_kmh(etiquetas):
+    maxspeed = etiquetas.get("maxspeed", "").strip()
+    numero = maxspeed.split()[0] if maxspeed else ""
+    if numero.replace(".", "", 1).isdigit() and float(numero) > 0:
+        return float(numero) * (1.609 if maxspeed.endswith("mph") else 1)
+    return VELOCIDADES_KMH[etiquetas["highway"]]
+
+
+# ---------------------------------------------------------------------------
+# Construcción
+# ---------------------------------------------------------------------------
+
+def _csr(origenes, n):
+    """
+    Índices de aristas agrupados por origen (orden estable) e indptr de largo n+1.
+    """
+    orden = np.argsort(origenes, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origenes, minlength=n), out=indptr[1:])
+    return orden, indptr
+
+
+def _aristas_de(indptr, nodos):
+    """
+    (posiciones en el arreglo de aristas, índice del nodo de cada una) de las
+    aristas que salen de nodos, vectorizado.
+    """
+    inicio = indptr[nodos]
+    cuenta = indptr[np.asarray(nodos) + 1] - inicio
+    total = int(cuenta.sum())
+    dueno = np.repeat(np.arange(len(nodos)), cuenta)
+    desplazamiento = np.arange(total) - np.repeat(np.cumsum(cuenta) - cuenta, cuenta)
+    return np.repeat(inicio, cuenta) + desplazamiento, dueno
+
+
+def _alcanzables(indptr, vecinos, inicio, n):
+    visitados = np.zeros(n, dtype=bool)
+    visitados[inicio] = True
+    frontera = np.array([inicio])
+    while len(frontera):
+        posiciones, _ = _aristas_de(indptr, frontera)
+        siguientes = np.unique(vecinos[posiciones])
+        frontera = siguientes[~visitados[siguientes]]
+        visitados[frontera] = True
+    return visitados
+
+
+def construir_grafo(coordenadas, vias):
+    """
+    Construye el grafo contraído a partir de las vías leídas.
+
+    Returns:
+        dict con los arrays de ARRAYS (salvo hitos y grilla) y un resumen
+    """
+    if not vias:
+        raise ValueError("El extracto no tiene vías transitables")
+
+    # 1. Intersecciones: nodos usados por más de una vía o extremos de una vía
+    todos = np.concatenate([np.asarray(nodos, dtype=np.int64) for nodos, _ in vias])
+    ids, usos = np.unique(todos, return_counts=True)
+    extremos = np.unique(np.array([n for nodos, _ in vias for n in (nodos[0], nodos[-1])], dtype=np.int64))
+    es_interseccion = usos > 1
+    es_interseccion[np.searchsorted(ids, extremos)] = True
+    intersecciones = ids[es_interseccion]
+    indice_interseccion = {int(id_nodo): i for i, id_nodo in enumerate(intersecciones)}
+
+    # 2. Segmentos entre intersecciones consecutivas de cada vía
+    origenes, destinos, duraciones, distancias = [], [], [], []
+    geo_inicio, geo_fin, invertidas = [], [], []
+    geometria = []
+
+    for nodos, etiquetas in vias:
+        puntos = np.array([coordenadas[n] for n in nodos], dtype=np.float64)
+        metros = distancias_tramos(puntos) * 1000
+        velocidad_ms = _velocidad_kmh(etiquetas) / 3.6
+        sentido = _sentido(etiquetas)
+
+        cortes = [k for k, n in enumerate(nodos) if n in indice_interseccion]
+        for a, b in zip(cortes[:-1], cortes[1:]):
+            u, v = indice_interseccion[nodos[a]], indice_interseccion[nodos[b]]
+            if u == v:
+                continue
+            largo = float(metros[a:b].sum())
+            inicio = len(geometria)
+            geometria.extend(puntos[a + 1:b].tolist())
+
+            for desde, hasta, invertida in ((u, v, False), (v, u, True)):
+                if (sentido == 1 and invertida) or (sentido == -1 and not invertida):
+                    continue
+                origenes.append(desde)
+                destinos.append(hasta)
+                distancias.append(largo)
+                duraciones.append(largo / velocidad_ms)
+                geo_inicio.append(inicio)
+                geo_fin.append(len(geometria))
+                invertidas.append(invertida)
+
+    n = len(intersecciones)
+    origenes = np.array(origenes, dtype=np.int64)
+    destinos = np.array(destinos, dtype=np.int64)
+
+    # 3. Componente fuertemente conexa más grande (se prueba desde los nodos con más aristas)
+    orden, indptr = _csr(origenes, n)
+    inv_orden, inv_indptr = _csr(destinos, n)
+    grado = np.diff(indptr) + np.diff(inv_indptr)
+    componente = np.zeros(n, dtype=bool)
+    for semilla in np.argsort(-grado, kind="stable")[:5]:
+        if componente[semilla]:
+            continue
+        candidata = (
+            _alcanzables(indptr, destinos[orden], semilla, n)
+            & _alcanzables(inv_indptr, origenes[inv_orden], semilla, n)
+        )
+        if candidata.sum() > componente.sum():
+            componente = candidata
+
+    nuevo_indice = np.full(n, -1, dtype=np.int64)
+    nuevo_indice[componente] = np.arange(int(componente.sum()))
+    conservar = componente[origenes] & componente[destinos]
+
+    origenes = nuevo_indice[origenes[conservar]]
+    destinos = nuevo_indice[destinos[conservar]]
+    n = int(componente.sum())
+    orden, indptr = _csr(origenes, n)
+    inv_orden, inv_indptr = _csr(destinos, n)
+
+    nodos_coordenadas = np.array([coordenadas[int(i)] for i in intersecciones[componente]], dtype=np.float64)
+    geometria = np.array(geometria, dtype=np.float64).reshape(-1, 2)
+
+    def filtrar(valores, dtype):
+        return np.asarray(valores, dtype=dtype)[conservar][orden]
+
+    return {
+        "nodos_lat": nodos_coordenadas[:, 0],
+        "nodos_lng": nodos_coordenadas[:, 1],
+        "indptr": indptr,
+        "destino": destinos[orden].astype(np.int32),
+        "duracion_s": filtrar(duraciones, np.float32),
+        "distancia_m": filtrar(distancias, np.float32),
+        "geometria_inicio": filtrar(geo_inicio, np.int64),
+        "geometria_fin": filtrar(geo_fin, np.int64),
+        "invertida": filtrar(invertidas, bool),
+        "geometria_lat": geometria[:, 0],
+        "geometria_lng": geometria[:, 1],
+        # Grafo inverso: para cada nodo, las aristas que llegan a él (índices en el orden final)
+        "inv_indptr": inv_indptr,
+        "inv_arista": np.argsort(orden, kind="stable")[inv_orden].astype(np.int64),
+        "resumen": {
+            "vias": len(vias),
+            "intersecciones": int(len(intersecciones)),
+            "nodos": n,
+            "aristas": int(len(destinos)),
+            "descartados_fuera_de_componente": int(len(intersecciones) - n),
+        },
+    }
+
+
+def _relajar_desde(indptr, vecinos, pesos, fuentes, n, pesos_secundarios=None, objetivos=None):
+    """
+    Costos mínimos desde cada fuente a todos los nodos (corrección de
+    etiquetas sincronizada y vectorizada sobre todas las fuentes a la vez).
+    Si se dan objetivos, solo se garantizan los costos hacia esos nodos: se
+    deja de expandir todo nodo cuyo costo ya iguala o supera al del objetivo
+    más lejano de su fuente, porque ningún camino por él puede mejorarlo.
+
+    Returns:
+        (costos, secundarios) arrays (len(fuentes) x n) en float32; secundarios
+        es la suma de pesos_secundarios a lo largo del camino de menor costo
+    """
+    s = len(fuentes)
+    costos = np.full((s, n), np.inf, dtype=np.float32)
+    secundarios = np.full((s, n), np.inf, dtype=np.float32) if pesos_secundarios is not None else None
+    costos[np.arange(s), fuentes] = 0
+    if secundarios is not None:
+        secundarios[np.arange(s), fuentes] = 0
+
+    plano = costos.reshape(-1)
+    plano_secundario = secundarios.reshape(-1) if secundarios is not None else None
+    frontera = np.arange(s) * n + np.asarray(fuentes)
+
+    while len(frontera):
+        fila, nodo = np.divmod(frontera, n)
+        if objetivos is not None:
+            limite = costos[:, objetivos].max(axis=1)
+            vigentes = plano[frontera] < limite[fila]
+            frontera, fila, nodo = frontera[vigentes], fila[vigentes], nodo[vigentes]
+        posiciones, dueno = _aristas_de(indptr, nodo)
+        claves_origen = frontera[dueno]
+        claves_destino = fila[dueno] * n + vecinos[posiciones]
+        candidato = plano[claves_origen] + pesos[posiciones]
+
+        mejora = candidato < plano[claves_destino]
+        claves_origen, claves_destino, candidato, posiciones = (
+            claves_origen[mejora], claves_destino[mejora], candidato[mejora], posiciones[mejora]
+        )
+        np.minimum.at(plano, claves_destino, candidato)
+
+        ganadoras = plano[claves_destino] == candidato
+        if plano_secundario is not None:
+            plano_secundario[claves_destino[ganadoras]] = (
+                plano_secundario[claves_origen[ganadoras]] + pesos_secundarios[posiciones[ganadoras]]
+            )
+        # Un empate exacto puede repetir una clave; solo repite trabajo, no cambia el resultado
+        frontera = claves_destino[ganadoras]
+
+    return costos, secundarios
+
+
+def _elegir_hitos(lats, lngs, k):
+    """
+    Hitos repartidos en la periferia: el nodo más lejano del centro y luego,
+    uno a uno, el más lejano de los ya elegidos.
+    """
+    puntos = np.column_stack((lats, lngs))
+    lejania = distancias_desde((lats.mean(), lngs.mean()), puntos)
+    hitos = [int(np.argmax(lejania))]
+    minima = distancias_desde(hitos[0], puntos)
+    while len(hitos) < min(k, len(lats)):
+        hitos.append(int(np.argmax(minima)))
+        minima = np.minimum(minima, distancias_desde(hitos[-1], puntos))
+    return np.array(hitos, dtype=np.int64)
+
+
+def preprocesar(grafo, num_hitos=NUM_HITOS, tamano_celda=TAMANO_CELDA_GRADOS):
+    """
+    Agrega al grafo las tablas de hitos (ALT) y la grilla de nodos.
+    """
+    n = len(grafo["nodos_lat"])
+    destino = grafo["destino"].astype(np.int64)
+    origen_inverso = np.repeat(np.arange(n), np.diff(grafo["indptr"]))[grafo["inv_arista"]]
+
+    hitos = _elegir_hitos(grafo["nodos_lat"], grafo["nodos_lng"], num_hitos)
+    grafo["hitos"] = hitos
+    grafo["hitos_desde"], _ = _relajar_desde(grafo["indptr"], destino, grafo["duracion_s"], hitos, n)
+    grafo["hitos_hacia"], _ = _relajar_desde(
+        grafo["inv_indptr"], origen_inverso, grafo["duracion_s"][grafo["inv_arista"]], hitos, n
+    )
+
+    celdas = _claves_celda(grafo["nodos_lat"], grafo["nodos_lng"], tamano_celda)
+    orden = np.argsort(celdas, kind="stable")
+    claves, inicio = np.unique(celdas[orden], return_index=True)
+    grafo["celdas_claves"] = claves
+    grafo["celdas_inicio"] = np.append(inicio, n).astype(np.int64)
+    grafo["celdas_nodos"] = orden.astype(np.int64)
+    grafo["resumen"]["tamano_celda_grados"] = tamano_celda
+    return grafo
+
+
+DESPLAZAMIENTO_CELDA = 1 << 20
+
+
+def _claves_celda(lats, lngs, tamano_celda):
+    fila = np.floor((np.asarray(lats) + 90) / tamano_celda).astype(np.int64)
+    columna = np.floor((np.asarray(lngs) + 180) / tamano_celda).astype(np.int64)
+    return fila * DESPLAZAMIENTO_CELDA + columna
+
+
+def guardar_grafo(grafo, directorio, fuente=None):
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    for nombre in ARRAYS:
+        np.save(directorio / f"{nombre}.npy", np.ascontiguousarray(grafo[nombre]))
+
+    meta = {
+        "version": VERSION,
+        "fuente": str(fuente) if fuente else None,
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        **grafo["resumen"],
+    }
+    (directorio / "meta.json").write_text(json.dumps(meta, indent=2, ensure_ascii=False))
+    return meta
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+class GrafoVial:
+    """
+    Grafo ya construido, abierto con mmap. Las consultas son de solo lectura,
+    así que una instancia se puede compartir entre hilos.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self.meta = json.loads((self.directorio / "meta.json").read_text())
+        if self.meta.get("version") != VERSION:
+            raise ValueError(
+                f"El grafo de {self.directorio} es de otra versión; vuelve a generarlo con importar_osm"
+            )
+        for nombre in ARRAYS:
+            # Vista ndarray sobre el mmap: sin el costo de indexar un np.memmap
+            setattr(self, nombre, np.asarray(np.load(self.directorio / f"{nombre}.npy", mmap_mode="r")))
+        self.n = len(self.nodos_lat)
+        self.tamano_celda = self.meta["tamano_celda_grados"]
+
+    # -- Ubicación de coordenadas -------------------------------------------
+
+    def nodo_cercano(self, lat, lng):
+        """
+        Nodo más cercano a (lat, lng) buscando en anillos de celdas crecientes.
+
+        Returns:
+            (nodo, distancia_m)
+        """
+        clave = int(_claves_celda(lat, lng, self.tamano_celda))
+        fila, columna = divmod(clave, DESPLAZAMIENTO_CELDA)
+
+        for radio in range(1, 9):
+            candidatos = []
+            for f in range(fila - radio, fila + radio + 1):
+                desde = np.searchsorted(self.celdas_claves, f * DESPLAZAMIENTO_CELDA + columna - radio)
+                hasta = np.searchsorted(self.celdas_claves, f * DESPLAZAMIENTO_CELDA + columna + radio, side="right")
+                if hasta > desde:
+                    candidatos.append(self.celdas_nodos[self.celdas_inicio[desde]:self.celdas_inicio[hasta]])
+            if candidatos:
+                candidatos = np.concatenate(candidatos)
+                distancias = distancias_desde(
+                    (lat, lng), np.column_stack((self.nodos_lat[candidatos], self.nodos_lng[candidatos]))
+                )
+                mejor = int(np.argmin(distancias))
+                # Con radio r la grilla cubre con certeza hasta (r - 1) celdas de distancia
+                if distancias[mejor] <= (radio - 1) * self.tamano_celda * np.pi / 180 * RADIO_TIERRA_KM * 0.99 \
+                        or radio == 8:
+                    return int(candidatos[mejor]), float(distancias[mejor] * 1000)
+
+        return None, None
+
+    # -- Búsqueda punto a punto ----------------------------------------------
+
+    def cotas(self, destino):
+        """
+        Cota inferior (s) del tiempo de un nodo al destino, por desigualdad
+        triangular con los hitos: d(v, t) >= d(L, t) - d(L, v) y d(v, L) - d(t, L).
+
+        Returns:
+            función cota(nodo). Las cotas se calculan vectorizadas por bloques
+            de BLOQUE_COTAS nodos la primera vez que la búsqueda alcanza un
+            nodo del bloque, así una consulta solo paga por la zona que explora
+            y no por todo el grafo
+        """
+        desde_destino = np.array(self.hitos_desde[:, destino])[:, None]
+        hacia_destino = np.array(self.hitos_hacia[:, destino])[:, None]
+        bloques = {}
+
+        def cota(nodo):
+            bloque = nodo // BLOQUE_COTAS
+            valores = bloques.get(bloque)
+            if valores is None:
+                inicio = bloque * BLOQUE_COTAS
+                fin = min(inicio + BLOQUE_COTAS, self.n)
+                valores = np.maximum(
+                    np.maximum((desde_destino - self.hitos_desde[:, inicio:fin]).max(axis=0),
+                               (self.hitos_hacia[:, inicio:fin] - hacia_destino).max(axis=0)),
+                    0
+                ).tolist()
+                bloques[bloque] = valores
+            return valores[nodo - bloque * BLOQUE_COTAS]
+
+        return cota
+
+    def camino(self, origen, destino):
+        """
+        Camino de menor duración con A* y cotas por hitos (ALT).
+
+        Returns:
+            (duracion_s, distancia_m, aristas) o None si no hay camino
+        """
+        if origen == destino:
+            return 0.0, 0.0, []
+
+        cota = self.cotas(destino)
+        indptr, vecinos, pesos = self.indptr, self.destino, self.duracion_s
+        costos = {origen: 0.0}
+        llegada = {}
+        cerrados = set()
+        cola = [(cota(origen), 0.0, origen)]
+
+        while cola:
+            _, costo, nodo = heapq.heappop(cola)
+            if nodo in cerrados:
+                continue
+            if nodo == destino:
+                break
+            cerrados.add(nodo)
+
+            inicio, fin = int(indptr[nodo]), int(indptr[nodo + 1])
+            for arista, vecino, peso in zip(range(inicio, fin), vecinos[inicio:fin].tolist(), pesos[inicio:fin].tolist()):
+                nuevo = costo + peso
+                if nuevo < costos.get(vecino, np.inf):
+                    costos[vecino] = nuevo
+                    llegada[vecino] = arista
+                    heapq.heappush(cola, (nuevo + cota(vecino), nuevo, vecino))
+        else:
+            return None
+
+        aristas = []
+        nodo = destino
+        while nodo != origen:
+            arista = llegada[nodo]
+            aristas.append(arista)
+            nodo = int(np.searchsorted(self.indptr, arista, side="right") - 1)
+        aristas.reverse()
+
+        return costos[destino], float(self.distancia_m[aristas].sum()), aristas
+
+    def geometria(self, aristas, origen):
+        """
+        Coordenadas [lng, lat] del camino que empieza en el nodo origen.
+        """
+        coordenadas = [[float(self.nodos_lng[origen]), float(self.nodos_lat[origen])]]
+        for arista in aristas:
+            inicio, fin = int(self.geometria_inicio[arista]), int(self.geometria_fin[arista])
+            intermedios = np.column_stack((self.geometria_lng[inicio:fin], self.geometria_lat[inicio:fin]))
+            if self.invertida[arista]:
+                intermedios = intermedios[::-1]
+            coordenadas.extend(intermedios.tolist())
+            siguiente = int(self.destino[arista])
+            coordenadas.append([float(self.nodos_lng[siguiente]), float(self.nodos_lat[siguiente])])
+        return coordenadas
+
+    def matriz(self, origenes, destinos):
+        """
+        Duración (s) y distancia (m) entre nodos, por lotes de fuentes.
+
+        Returns:
+            (duraciones, distancias) arrays (len(origenes) x len(destinos))
+        """
+        origenes = np.asarray(origenes, dtype=np.int64)
+        destinos = np.asarray(destinos, dtype=np.int64)
+        duraciones = np.empty((len(origenes), len(destinos)))
+        distancias = np.empty((len(origenes), len(destinos)))
+
+        # Solo se relaja una vez cada fuente distinta
+        unicos, posicion = np.unique(origenes, return_inverse=True)
+        vecinos = np.asarray(self.destino, dtype=np.int64)
+        for inicio in range(0, len(unicos), LOTE_FUENTES):
+            lote = unicos[inicio:inicio + LOTE_FUENTES]
+            costos, metros = _relajar_desde(
+                self.indptr, vecinos, self.duracion_s, lote, self.n,
+                pesos_secundarios=self.distancia_m, objetivos=destinos
+            )
+            filas = np.flatnonzero((posicion >= inicio) & (posicion < inicio + len(lote)))
+            duraciones[filas] = costos[posicion[filas] - inicio][:, destinos]
+            distancias[filas] = metros[posicion[filas] - inicio][:, destinos]
+
+        return duraciones, distancias
@@ -2,7 +2,7 @@
 import requests
 from decimal import Decimal
 from config.settings import base
-import time
+from config.routing import get_routing_backend
 
 
 """ Hecho con IA """
@@ -10,7 +10,6 @@ class OSMService:
     
     NOMINATIM_URL = "https://us1.locationiq.com/v1/search"
     API_KEY = base.GEOCODING_KEY
-    OSRM_URL = "https://router.project-osrm.org/route/v1/driving"
     
     @staticmethod
     def geocodificar_direccion(direccion_completa):
@@ -55,78 +54,23 @@ class OSMService:
     
     
     @staticmethod
-    def calcular_ruta_optimizada(coordenadas):
+    def calcular_matriz(coordenadas, origenes=None, destinos=None):
         """
-        Calcula la ruta optimizada usando OSRM.
+        Calcula la matriz de duración y distancia por vía con el backend configurado.
         
         Args:
             coordenadas: Lista de tuplas [(lat1, lng1), (lat2, lng2), ...]
+            origenes: Índices de coordenadas usados como origen (todas si es None)
+            destinos: Índices de coordenadas usados como destino (todas si es None)
             
         Returns:
             dict: {
-                'polyline': str,
-                'distancia_km': float,
-                'duracion_minutos': int,
-                'orden': [0, 1, 2, ...]  # Índices en el orden original
+                'duraciones': [[segundos, ...], ...],  # len(origenes) x len(destinos)
+                'distancias': [[metros, ...], ...]
             }
             o None si falla
         """
         if len(coordenadas) < 2:
             return None
         
-        try:
-            # Formato OSRM: lng,lat;lng,lat;lng,lat
-            coords_str = ";".join([f"{lng},{lat}" for lat, lng in coordenadas])
-            
-            url = f"{OSMService.OSRM_URL}/{coords_str}"
-            
-            params = {
-                'overview': 'full',
-                'geometries': 'geojson',
-                'steps': 'false'
-            }
-            
-            headers = {
-                'User-Agent': 'RouteManager/1.0'
-            }
-            
-            response = requests.get(url, params=params, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if data.get('code') != 'Ok':
-                print(f"Error OSRM: {data.get('message')}")
-                return None
-            
-            route = data['routes'][0]
-            
-            # Extraer geometría (polyline en formato GeoJSON)
-            geometry = route['geometry']
-            
-            # Convertir a string para guardar en JSON
-            polyline = str(geometry['coordinates'])
-            
-            # Distancia en metros → km
-            distancia_km = round(route['distance'] / 1000, 2)
-            
-            # Duración en segundos → minutos
-            duracion_minutos = round(route['duration'] / 60)
-            
-            # OSRM no reordena automáticamente, mantiene el orden dado
-            orden = list(range(len(coordenadas)))
-            
-            return {
-                'polyline': polyline,
-                'geometry': geometry,  # GeoJSON completo para el frontend
-                'distancia_km': distancia_km,
-                'duracion_minutos': duracion_minutos,
-                'orden': orden
-            }
-            
-        except requests.RequestException as e:
-            print(f"Error en OSRM: {e}")
-            return None
-        
-        finally:
-            time.sleep(0.5)  # Rate limit más flexible que Nominatim
\ No newline at end of file
+        return get_routing_backend().table(coordenadas, origenes, destinos)
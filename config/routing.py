@@ -0,0 +1,525 @@
+# config/routing.py
+"""
+Backends de enrutamiento intercambiables.
+
+Todos exponen las mismas tres operaciones sobre coordenadas [(lat, lng), ...]
+y responden en unidades de OSRM (metros y segundos):
+
+    route(coordenadas)  -> {'geometry', 'distancia_m', 'duracion_s', 'tramos'}
+    table(coordenadas, origenes, destinos) -> {'duraciones', 'distancias'}
+    trip(coordenadas)   -> {'orden', 'geometry', 'distancia_m', 'duracion_s'}
+
+o None si la operación falla. El backend activo se elige con ROUTING_BACKEND.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class RoutingBackend(ABC):
+
+    @abstractmethod
+    def route(self, coordenadas):
+        ...
+
+    @abstractmethod
+    def table(self, coordenadas, origenes=None, destinos=None):
+        ...
+
+    @abstractmethod
+    def trip(self, coordenadas):
+        ...
+
+
+class CircuitoEnrutamiento:
+    """
+    Cortacircuito de las peticiones a un servicio de enrutamiento externo.
+
+    Tras ROUTING_CIRCUITO_FALLOS fallos seguidos se abre y las peticiones se
+    rechazan de inmediato (sin esperar el timeout) durante
+    ROUTING_CIRCUITO_ESPERA_S segundos. Pasado ese tiempo deja pasar una
+    petición de prueba: si responde se cierra, si falla vuelve a abrirse.
+    """
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, nombre, fallos=None, espera_s=None):
+        self.nombre = nombre
+        self.fallos_maximos = max(fallos or settings.ROUTING_CIRCUITO_FALLOS, 1)
+        self.espera_s = espera_s if espera_s is not None else settings.ROUTING_CIRCUITO_ESPERA_S
+        self.estado = self.CERRADO
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._lock = threading.Lock()
+
+
+    def permite(self):
+        """
+        True si la petición puede salir. Con el circuito abierto y la espera
+        cumplida, solo la primera petición pasa como prueba.
+        """
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return True
+            if self.estado == self.ABIERTO and time.monotonic() - self._abierto_desde >= self.espera_s:
+                self.estado = self.SEMIABIERTO
+                return True
+            return False
+
+
+    def registrar_exito(self):
+        with self._lock:
+            if self.estado != self.CERRADO:
+                print(f"Circuito de {self.nombre} cerrado: el servicio volvió a responder")
+            self.estado = self.CERRADO
+            self._fallos = 0
+
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self.estado == self.SEMIABIERTO or self._fallos >= self.fallos_maximos:
+                if self.estado != self.ABIERTO:
+                    print(f"Circuito de {self.nombre} abierto tras {self._fallos} fallos seguidos")
+                self.estado = self.ABIERTO
+                self._abierto_desde = time.monotonic()
+
+
+class OSRMBackend(RoutingBackend):
+    """
+    OSRM público o propio (OSRM_URL). Contra el servidor público se respeta
+    un intervalo mínimo entre peticiones para no superar su límite de uso.
+    Las caídas (timeouts, errores de conexión, 5xx, 429) pasan por un
+    cortacircuito; con el circuito abierto las operaciones retornan None
+    sin consultar la red.
+    """
+
+    SERVIDOR_PUBLICO = "router.project-osrm.org"
+    INTERVALO_SERVIDOR_PUBLICO = 0.5
+
+    def __init__(self, url=None, perfil=None, timeout=None):
+        self.url = (url or settings.OSRM_URL).rstrip("/")
+        self.perfil = perfil or settings.OSRM_PERFIL
+        self.timeout = timeout or settings.OSRM_TIMEOUT
+        self.intervalo = self.INTERVALO_SERVIDOR_PUBLICO if self.SERVIDOR_PUBLICO in self.url else 0
+        self._ultima_peticion = 0.0
+        self._lock = threading.Lock()
+        self.circuito = CircuitoEnrutamiento("OSRM")
+
+
+    @staticmethod
+    def _es_caida(error):
+        # Los 4xx (salvo 429) son peticiones inválidas, no una caída del servidor
+        respuesta = getattr(error, "response", None)
+        if respuesta is None:
+            return True
+        return respuesta.status_code >= 500 or respuesta.status_code == 429
+
+
+    def _esperar_turno(self):
+        # Se reserva el turno con el lock y se espera fuera de él, así los
+        # demás hilos pueden reservar los turnos siguientes mientras tanto
+        if not self.intervalo:
+            return
+        with self._lock:
+            turno = max(time.monotonic(), self._ultima_peticion + self.intervalo)
+            self._ultima_peticion = turno
+        espera = turno - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+
+    def _get(self, servicio, coordenadas, params):
+        # Formato OSRM: lng,lat;lng,lat;lng,lat
+        coords_str = ";".join([f"{lng},{lat}" for lat, lng in coordenadas])
+        url = f"{self.url}/{servicio}/v1/{self.perfil}/{coords_str}"
+
+        if not self.circuito.permite():
+            return None
+
+        self._esperar_turno()
+
+        try:
+            response = requests.get(
+                url,
+                params=params,
+                headers={'User-Agent': 'RouteManager/1.0'},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+        except requests.RequestException as e:
+            print(f"Error en OSRM {servicio}: {e}")
+            if self._es_caida(e):
+                self.circuito.registrar_fallo()
+            else:
+                self.circuito.registrar_exito()
+            return None
+
+        self.circuito.registrar_exito()
+
+        if data.get('code') != 'Ok':
+            print(f"Error OSRM {servicio}: {data.get('message')}")
+            return None
+
+        return data
+
+
+    def route(self, coordenadas):
+        if len(coordenadas) < 2:
+            return None
+
+        data = self._get("route", coordenadas, {
+            'overview': 'full',
+            'geometries': 'geojson',
+            'steps': 'false'
+        })
+        if not data or not data.get('routes'):
+            return None
+
+        route = data['routes'][0]
+        return {
+            'geometry': route['geometry'],
+            'distancia_m': route['distance'],
+            'duracion_s': route['duration'],
+            'tramos': [
+                {'distancia_m': leg['distance'], 'duracion_s': leg['duration']}
+                for leg in route.get('legs', [])
+            ]
+        }
+
+
+    def table(self, coordenadas, origenes=None, destinos=None):
+        if len(coordenadas) < 2:
+            return None
+
+        params = {'annotations': 'duration,distance'}
+        if origenes is not None:
+            params['sources'] = ";".join(str(i) for i in origenes)
+        if destinos is not None:
+            params['destinations'] = ";".join(str(i) for i in destinos)
+
+        data = self._get("table", coordenadas, params)
+        if not data:
+            return None
+
+        return {
+            'duraciones': data['durations'],
+            'distancias': data['distances']
+        }
+
+
+    def trip(self, coordenadas):
+        if len(coordenadas) < 2:
+            return None
+
+        data = self._get("trip", coordenadas, {
+            'source': 'first',
+            'roundtrip': 'false',
+            'destination': 'any',
+            'overview': 'full',
+            'geometries': 'geojson'
+        })
+        if not data or not data.get('trips'):
+            return None
+
+        trip = data['trips'][0]
+        posiciones = [w['waypoint_index'] for w in data['waypoints']]
+        return {
+            'orden': [int(i) for i in np.argsort(posiciones)],
+            'geometry': trip['geometry'],
+            'distancia_m': trip['distance'],
+            'duracion_s': trip['duration']
+        }
+
+
+class HaversineBackend(RoutingBackend):
+    """
+    Backend determinista en proceso para pruebas y benchmarks: distancia en
+    línea recta corregida por un factor de circuito y velocidad promedio fija.
+    La geometría es la poligonal que une las coordenadas.
+    """
+
+    def __init__(self, factor_circuito=None, velocidad_kmh=None):
+        self.factor_circuito = factor_circuito or settings.ROUTING_FACTOR_CIRCUITO
+        self.velocidad_kmh = velocidad_kmh or settings.ROUTING_VELOCIDAD_KMH
+
+
+    def _matriz_metros(self, coordenadas, origenes=None, destinos=None):
+        # Solo las filas y columnas pedidas, con las coordenadas preparadas una vez
+        from routes.geodesia import PuntosGeodesicos, matriz_distancias
+
+        coordenadas = np.asarray(coordenadas, dtype=np.float64)
+        puntos = PuntosGeodesicos(coordenadas[:, 0], coordenadas[:, 1])
+        filas = puntos if origenes is None else puntos[list(origenes)]
+        columnas = puntos if destinos is None else puntos[list(destinos)]
+        return matriz_distancias(filas, columnas) * 1000 * self.factor_circuito
+
+
+    def _tramos_metros(self, coordenadas):
+        # Solo los pares consecutivos, sin construir la matriz completa
+        from routes.geodesia import distancias_tramos
+
+        return distancias_tramos(coordenadas) * 1000 * self.factor_circuito
+
+
+    def _segundos(self, metros):
+        return metros / (self.velocidad_kmh / 3.6)
+
+
+    def _geometria(self, coordenadas):
+        return {
+            'type': 'LineString',
+            'coordinates': [[float(lng), float(lat)] for lat, lng in coordenadas]
+        }
+
+
+    def route(self, coordenadas):
+        if len(coordenadas) < 2:
+            return None
+
+        tramos = self._tramos_metros(coordenadas)
+        return {
+            'geometry': self._geometria(coordenadas),
+            'distancia_m': float(tramos.sum()),
+            'duracion_s': float(self._segundos(tramos).sum()),
+            'tramos': [
+                {'distancia_m': float(d), 'duracion_s': float(self._segundos(d))}
+                for d in tramos
+            ]
+        }
+
+
+    def table(self, coordenadas, origenes=None, destinos=None):
+        if len(coordenadas) < 2:
+            return None
+
+        distancias = self._matriz_metros(coordenadas, origenes, destinos)
+        return {
+            'duraciones': self._segundos(distancias).tolist(),
+            'distancias': distancias.tolist()
+        }
+
+
+    def trip(self, coordenadas):
+        from routes.optimizador import optimizar_recorrido
+
+        if len(coordenadas) < 2:
+            return None
+
+        orden = [0] + [int(i) for i in optimizar_recorrido(self._matriz_metros(coordenadas))]
+        ruta = self.route([coordenadas[i] for i in orden])
+        return {
+            'orden': orden,
+            'geometry': ruta['geometry'],
+            'distancia_m': ruta['distancia_m'],
+            'duracion_s': ruta['duracion_s']
+        }
+
+
+class FixtureBackend(RoutingBackend):
+    """
+    Reproduce respuestas grabadas en un archivo JSON (ROUTING_FIXTURE_ARCHIVO).
+    Si se configura un backend de respaldo, las peticiones que no están en el
+    archivo se resuelven con él y se graban, lo que permite capturar un
+    escenario real una vez y repetirlo sin red en pruebas de carga.
+    """
+
+    def __init__(self, archivo=None, respaldo=None):
+        self.archivo = Path(archivo or settings.ROUTING_FIXTURE_ARCHIVO)
+        respaldo = respaldo if respaldo is not None else settings.ROUTING_FIXTURE_RESPALDO
+        self.respaldo = import_string(respaldo)() if isinstance(respaldo, str) and respaldo else respaldo
+        self._lock = threading.Lock()
+        self._respuestas = json.loads(self.archivo.read_text()) if self.archivo.exists() else {}
+
+
+    @staticmethod
+    def clave(operacion, coordenadas, *extra):
+        contenido = json.dumps(
+            [operacion, [[round(float(lat), 6), round(float(lng), 6)] for lat, lng in coordenadas], *extra]
+        )
+        return hashlib.sha1(contenido.encode()).hexdigest()
+
+
+    def _resolver(self, operacion, coordenadas, *extra):
+        clave = self.clave(operacion, coordenadas, *extra)
+
+        if clave in self._respuestas:
+            return self._respuestas[clave]
+
+        if not self.respaldo:
+            print(f"Fixture de enrutamiento sin respuesta para {operacion} ({clave})")
+            return None
+
+        respuesta = getattr(self.respaldo, operacion)(coordenadas, *extra)
+        if respuesta is not None:
+            with self._lock:
+                self._respuestas[clave] = respuesta
+                self.archivo.parent.mkdir(parents=True, exist_ok=True)
+                self.archivo.write_text(json.dumps(self._respuestas))
+
+        return respuesta
+
+
+    def route(self, coordenadas):
+        return self._resolver("route", coordenadas)
+
+    def table(self, coordenadas, origenes=None, destinos=None):
+        return self._resolver(
+            "table", coordenadas,
+            None if origenes is None else list(origenes),
+            None if destinos is None else list(destinos)
+        )
+
+    def trip(self, coordenadas):
+        return self._resolver("trip", coordenadas)
+
+
+@lru_cache(maxsize=None)
+def _abrir_grafo(directorio):
+    from config.grafo_vial import GrafoVial
+
+    return GrafoVial(directorio)
+
+
+class GrafoLocalBackend(RoutingBackend):
+    """
+    Enrutamiento en proceso sobre el grafo vial generado con
+    python manage.py importar_osm (ver config/grafo_vial.py), sin red.
+    El grafo se abre una vez por proceso con mmap; el tramo entre cada
+    coordenada y su nodo más cercano se suma en línea recta.
+    """
+
+    def __init__(self, directorio=None, factor_circuito=None, velocidad_kmh=None):
+        self.directorio = str(directorio or settings.ROUTING_GRAFO_DIRECTORIO)
+        self.factor_circuito = factor_circuito or settings.ROUTING_FACTOR_CIRCUITO
+        self.velocidad_kmh = velocidad_kmh or settings.ROUTING_VELOCIDAD_KMH
+
+
+    @property
+    def grafo(self):
+        return _abrir_grafo(self.directorio)
+
+
+    def _ubicar(self, coordenadas):
+        # (nodo, metros y segundos de acceso) de cada coordenada
+        ubicados = []
+        for lat, lng in coordenadas:
+            nodo, metros = self.grafo.nodo_cercano(float(lat), float(lng))
+            if nodo is None:
+                return None
+            metros *= self.factor_circuito
+            ubicados.append((nodo, metros, metros / (self.velocidad_kmh / 3.6)))
+        return ubicados
+
+
+    def _metros_directos(self, a, b):
+        from routes.geodesia import distancias_tramos
+
+        return float(distancias_tramos([a, b])[0]) * 1000 * self.factor_circuito
+
+
+    def route(self, coordenadas):
+        if len(coordenadas) < 2:
+            return None
+
+        ubicados = self._ubicar(coordenadas)
+        if ubicados is None:
+            return None
+
+        geometria = [[float(coordenadas[0][1]), float(coordenadas[0][0])]]
+        tramos = []
+        for i in range(len(coordenadas) - 1):
+            (origen, metros_a, segundos_a), (destino, metros_b, segundos_b) = ubicados[i], ubicados[i + 1]
+            camino = self.grafo.camino(origen, destino)
+            if camino is None:
+                print(f"Grafo local sin camino entre los nodos {origen} y {destino}")
+                return None
+
+            duracion, distancia, aristas = camino
+            if origen == destino:
+                # Mismo nodo: se va directo en línea recta
+                metros_a, metros_b = self._metros_directos(coordenadas[i], coordenadas[i + 1]), 0.0
+                segundos_a, segundos_b = metros_a / (self.velocidad_kmh / 3.6), 0.0
+            tramos.append({
+                'distancia_m': distancia + metros_a + metros_b,
+                'duracion_s': duracion + segundos_a + segundos_b,
+            })
+            geometria += self.grafo.geometria(aristas, origen)
+            geometria.append([float(coordenadas[i + 1][1]), float(coordenadas[i + 1][0])])
+
+        return {
+            'geometry': {'type': 'LineString', 'coordinates': geometria},
+            'distancia_m': sum(t['distancia_m'] for t in tramos),
+            'duracion_s': sum(t['duracion_s'] for t in tramos),
+            'tramos': tramos
+        }
+
+
+    def table(self, coordenadas, origenes=None, destinos=None):
+        if len(coordenadas) < 2:
+            return None
+
+        ubicados = self._ubicar(coordenadas)
+        if ubicados is None:
+            return None
+
+        filas = list(range(len(coordenadas))) if origenes is None else list(origenes)
+        columnas = list(range(len(coordenadas))) if destinos is None else list(destinos)
+        nodos = np.array([u[0] for u in ubicados])
+        metros = np.array([u[1] for u in ubicados])
+        segundos = np.array([u[2] for u in ubicados])
+
+        duraciones, distancias = self.grafo.matriz(nodos[filas], nodos[columnas])
+        duraciones += segundos[filas][:, None] + segundos[columnas][None, :]
+        distancias += metros[filas][:, None] + metros[columnas][None, :]
+
+        # Coordenadas ubicadas en el mismo nodo: se va directo en línea recta
+        for f, c in zip(*np.nonzero(nodos[filas][:, None] == nodos[columnas][None, :])):
+            directos = self._metros_directos(coordenadas[filas[f]], coordenadas[columnas[c]])
+            distancias[f, c] = directos
+            duraciones[f, c] = directos / (self.velocidad_kmh / 3.6)
+
+        return {
+            'duraciones': duraciones.tolist(),
+            'distancias': distancias.tolist()
+        }
+
+
+    def trip(self, coordenadas):
+        from routes.optimizador import optimizar_recorrido
+
+        tabla = self.table(coordenadas)
+        if tabla is None:
+            return None
+
+        orden = [0] + [int(i) for i in optimizar_recorrido(np.array(tabla['duraciones']))]
+        ruta = self.route([coordenadas[i] for i in orden])
+        if ruta is None:
+            return None
+        return {
+            'orden': orden,
+            'geometry': ruta['geometry'],
+            'distancia_m': ruta['distancia_m'],
+            'duracion_s': ruta['duracion_s']
+        }
+
+
+@lru_cache(maxsize=None)
+def get_routing_backend():
+    """
+    Instancia (una por proceso) del backend configurado en ROUTING_BACKEND.
+    """
+    return import_string(settings.ROUTING_BACKEND)()
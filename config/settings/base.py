@@ -242,6 +242,48 @@ GEOCODING_KEY = env('GEOCODING_KEY')
 # modelo de AI - Groq
 GROQ_API_KEY = env('GROQ_API_KEY')
 
+# Enrutamiento (ver config/routing.py)
+# - config.routing.OSRMBackend: OSRM público o propio
+# - config.routing.HaversineBackend: en proceso, para pruebas y benchmarks
+# - config.routing.FixtureBackend: respuestas grabadas
+# - config.routing.GrafoLocalBackend: grafo vial en proceso (python manage.py importar_osm)
+ROUTING_BACKEND = env('ROUTING_BACKEND', default='config.routing.OSRMBackend')
+OSRM_URL = env('OSRM_URL', default='https://router.project-osrm.org')
+OSRM_PERFIL = env('OSRM_PERFIL', default='driving')
+OSRM_TIMEOUT = env.int('OSRM_TIMEOUT', default=10)
+ROUTING_FACTOR_CIRCUITO = env.float('ROUTING_FACTOR_CIRCUITO', default=1.3)
+ROUTING_VELOCIDAD_KMH = env.float('ROUTING_VELOCIDAD_KMH', default=25)
+ROUTING_FIXTURE_ARCHIVO = env('ROUTING_FIXTURE_ARCHIVO', default=str(BASE_DIR / 'fixtures' / 'routing.json'))
+ROUTING_FIXTURE_RESPALDO = env('ROUTING_FIXTURE_RESPALDO', default='')
+ROUTING_GRAFO_DIRECTORIO = env('ROUTING_GRAFO_DIRECTORIO', default=str(BASE_DIR / 'grafo_vial'))
+# Vigencia (segundos) de las respuestas de ruta guardadas en caché
+ROUTING_CACHE_TTL = env.int('ROUTING_CACHE_TTL', default=7 * 24 * 3600)
+# Rutas con más coordenadas se piden por segmentos en paralelo (límite de URL/coordenadas de OSRM)
+ROUTING_MAX_COORDENADAS = env.int('ROUTING_MAX_COORDENADAS', default=100)
+ROUTING_HILOS = env.int('ROUTING_HILOS', default=4)
+# Distancia en línea recta del optimizador cuando no hay matriz por vía: haversine o equirectangular
+ROUTING_MODO_DISTANCIA = env('ROUTING_MODO_DISTANCIA', default='haversine')
+# Paquetes a menos de estos metros (mismo edificio o torre) se ordenan y enrutan como una sola parada; 0 lo desactiva
+ROUTING_RADIO_PARADA_M = env.float('ROUTING_RADIO_PARADA_M', default=15)
+# Permite al optimizador crear pools de procesos (búsqueda multiarranque, zonas y calcular_lote,
+# que corre dentro de la petición). Desactivado: todo se optimiza en el proceso que atiende
+ROUTING_MULTIPROCESO = env.bool('ROUTING_MULTIPROCESO', default=False)
+# Rutas con al menos estas paradas se optimizan por localidad (partición y unión en paralelo); 0 lo desactiva
+ROUTING_PARADAS_POR_ZONAS = env.int('ROUTING_PARADAS_POR_ZONAS', default=1000)
+# Límites de GET /paquetes/agrupar_pendientes/ (se calcula dentro de la petición)
+ROUTING_AGRUPAMIENTO_MAX_PAQUETES = env.int('ROUTING_AGRUPAMIENTO_MAX_PAQUETES', default=2000)
+ROUTING_AGRUPAMIENTO_MAX_GRUPOS = env.int('ROUTING_AGRUPAMIENTO_MAX_GRUPOS', default=50)
+# Plantillas de ruta (routes/plantillas.py): distancia máxima de un paquete a la parada de la
+# plantilla y fracción mínima de paquetes y de paradas que deben coincidir para reutilizarla
+ROUTING_PLANTILLA_RADIO_M = env.float('ROUTING_PLANTILLA_RADIO_M', default=25)
+ROUTING_PLANTILLA_COINCIDENCIA = env.float('ROUTING_PLANTILLA_COINCIDENCIA', default=0.8)
+# Días que se conservan las filas de telemetria_optimizacion (routes/telemetria.py)
+ROUTING_TELEMETRIA_DIAS = env.int('ROUTING_TELEMETRIA_DIAS', default=90)
+# Cortacircuito de OSRM: fallos seguidos para abrirlo y segundos antes de volver a intentar.
+# Mientras está abierto las rutas se estiman en línea recta (ver routes/estimacion.py)
+ROUTING_CIRCUITO_FALLOS = env.int('ROUTING_CIRCUITO_FALLOS', default=3)
+ROUTING_CIRCUITO_ESPERA_S = env.int('ROUTING_CIRCUITO_ESPERA_S', default=60)
+
 
 
 # No lo usare de momento porque nisiquiera se que es
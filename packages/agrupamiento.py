@@ -0,0 +1,151 @@
+"""
+Agrupamiento geográfico de paquetes para sembrar rutas.
+
+K-means sobre lat/lng proyectadas (equirectangular, suficiente a escala de
+ciudad). Los centroides iniciales son los centros de las localidades con más
+paquetes, de modo que los grupos arrancan alineados con la división que ya
+usan los operadores; si se piden más grupos que localidades, el resto se
+siembra con k-means++.
+
+Se ejecuta dentro de la petición (GET agrupar_pendientes): k-means es
+O(paquetes * k) y el borrador de cada grupo ordena sus paquetes con una
+matriz en línea recta de tamaño (miembros + 1)^2. Por eso se limitan los
+paquetes (ROUTING_AGRUPAMIENTO_MAX_PAQUETES) y los grupos
+(ROUTING_AGRUPAMIENTO_MAX_GRUPOS); con más paquetes hay que filtrar por
+localidad.
+"""
+
+import numpy as np
+
+from django.conf import settings
+
+from routes.geodesia import preparar_puntos
+from routes.optimizador import optimizar_paradas
+
+
+def proyectar(lats, lngs):
+    """
+    Proyecta lat/lng a un plano en km alrededor del centro de los puntos.
+    """
+    return preparar_puntos(lats, lngs).planas().astype(np.float64)
+
+
+def semillas_por_localidad(puntos, localidades, k, rng):
+    """
+    Centroides iniciales: centro de las k localidades con más paquetes,
+    completados con k-means++ si hay menos localidades que grupos.
+    """
+    valores, conteos = np.unique(localidades, return_counts=True)
+    principales = valores[np.argsort(-conteos, kind="stable")][:k]
+    semillas = [puntos[localidades == localidad].mean(axis=0) for localidad in principales]
+
+    while len(semillas) < k:
+        distancias = ((puntos[:, None, :] - np.array(semillas)[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        total = distancias.sum()
+        probabilidades = distancias / total if total > 0 else None
+        semillas.append(puntos[rng.choice(len(puntos), p=probabilidades)])
+
+    return np.array(semillas)
+
+
+def kmeans(puntos, semillas, max_iteraciones=50, tolerancia=1e-4):
+    """
+    K-means (Lloyd) vectorizado.
+
+    Returns:
+        (etiquetas, centroides)
+    """
+    centroides = np.array(semillas, dtype=np.float64)
+
+    for _ in range(max_iteraciones):
+        distancias = ((puntos[:, None, :] - centroides[None, :, :]) ** 2).sum(axis=2)
+        etiquetas = np.argmin(distancias, axis=1)
+
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, etiquetas, puntos)
+        conteos = np.bincount(etiquetas, minlength=len(centroides))
+
+        nuevos = centroides.copy()
+        con_puntos = conteos > 0
+        nuevos[con_puntos] = sumas[con_puntos] / conteos[con_puntos, None]
+
+        movimiento = np.abs(nuevos - centroides).max()
+        centroides = nuevos
+        if movimiento < tolerancia:
+            break
+
+    distancias = ((puntos[:, None, :] - centroides[None, :, :]) ** 2).sum(axis=2)
+    return np.argmin(distancias, axis=1), centroides
+
+
+def agrupar_paquetes(paquetes, k=None, semilla=0):
+    """
+    Agrupa paquetes en k grupos compactos y propone un borrador de ruta por grupo.
+
+    Args:
+        paquetes: queryset de Paquete (solo se usan los que tienen coordenadas)
+        k: número de grupos (por defecto, una por localidad presente)
+
+    Returns:
+        lista de grupos con sus paquetes en orden sugerido, localidades y carga total
+
+    Raises:
+        ValueError si se superan los límites de paquetes o de grupos
+    """
+    if k and k > settings.ROUTING_AGRUPAMIENTO_MAX_GRUPOS:
+        raise ValueError(f"k no puede ser mayor a {settings.ROUTING_AGRUPAMIENTO_MAX_GRUPOS}")
+
+    paquetes = paquetes.filter(lat__isnull=False, lng__isnull=False)
+    total = paquetes.count()
+    if total > settings.ROUTING_AGRUPAMIENTO_MAX_PAQUETES:
+        raise ValueError(
+            f"Hay {total} paquetes por agrupar y el máximo es {settings.ROUTING_AGRUPAMIENTO_MAX_PAQUETES}; "
+            "filtra por localidad"
+        )
+
+    filas = list(
+        paquetes.values_list("id_paquete", "lat", "lng", "localidad__nombre", "peso", "largo", "ancho", "alto", "cantidad")
+    )
+    if not filas:
+        return []
+
+    ids = np.array([f[0] for f in filas], dtype=np.int64)
+    lats = np.array([f[1] for f in filas], dtype=np.float64)
+    lngs = np.array([f[2] for f in filas], dtype=np.float64)
+    localidades = np.array([f[3] for f in filas])
+    medidas = np.array([f[4:] for f in filas], dtype=np.float64)
+
+    cantidad = np.maximum(medidas[:, 4], 1)
+    pesos = medidas[:, 0] * cantidad
+    volumenes = medidas[:, 1] * medidas[:, 2] * medidas[:, 3] * cantidad
+
+    k = min(k or len(np.unique(localidades)), len(filas), settings.ROUTING_AGRUPAMIENTO_MAX_GRUPOS)
+    puntos = proyectar(lats, lngs)
+    rng = np.random.default_rng(semilla)
+
+    etiquetas, _ = kmeans(puntos, semillas_por_localidad(puntos, localidades, k, rng))
+
+    grupos = []
+    for grupo in range(k):
+        miembros = np.flatnonzero(etiquetas == grupo)
+        if len(miembros) == 0:
+            continue
+
+        centro_lat, centro_lng = lats[miembros].mean(), lngs[miembros].mean()
+        orden, distancia_km = optimizar_paradas(
+            centro_lat, centro_lng, lats[miembros], lngs[miembros], modo=settings.ROUTING_MODO_DISTANCIA
+        )
+        nombres, conteos = np.unique(localidades[miembros], return_counts=True)
+
+        grupos.append({
+            "grupo": len(grupos) + 1,
+            "centro": {"lat": round(float(centro_lat), 7), "lng": round(float(centro_lng), 7)},
+            "localidades": {str(nombre): int(conteo) for nombre, conteo in zip(nombres, conteos)},
+            "total_paquetes": int(len(miembros)),
+            "peso_total": round(float(pesos[miembros].sum()), 2),
+            "volumen_total": round(float(volumenes[miembros].sum()), 2),
+            "distancia_estimada_km": round(distancia_km, 2),
+            "paquetes": [int(i) for i in ids[miembros][orden]],
+        })
+
+    return grupos
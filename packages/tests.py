@@ -1,3 +1,67 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .agrupamiento import agrupar_paquetes
+from .models import Cliente, Localidad, Paquete
+
+
+class AgruparPendientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="a", apellido="b", direccion="c", correo="a@b.co", telefono_movil="1")
+        localidades = [Localidad.objects.create(nombre=nombre) for nombre in Localidad.LocalidadChoices.values[:4]]
+
+        rng = np.random.default_rng(0)
+        Paquete.objects.bulk_create([
+            Paquete(
+                largo=30, ancho=20, alto=10, peso=2, valor_declarado=1, cantidad=1, cliente=cliente,
+                localidad=localidades[i % 4],
+                lat=Decimal(str(round(4.6 + rng.random() * 0.15, 7))),
+                lng=Decimal(str(round(-74.15 + rng.random() * 0.1, 7))),
+                direccion_entrega=f"calle {i}", estado_paquete="Pendiente"
+            )
+            for i in range(60)
+        ])
+        cls.ids = sorted(Paquete.objects.values_list("id_paquete", flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_cada_paquete_queda_en_un_grupo(self):
+        grupos = agrupar_paquetes(Paquete.objects.all(), k=5)
+
+        self.assertEqual(len(grupos), 5)
+        self.assertEqual(sorted(p for g in grupos for p in g["paquetes"]), self.ids)
+        self.assertEqual(sum(g["total_paquetes"] for g in grupos), 60)
+
+    def test_por_defecto_un_grupo_por_localidad(self):
+        respuesta = self.client.get("/api/v1/paquetes/agrupar_pendientes/")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data["total_grupos"], 4)
+        self.assertEqual(respuesta.data["total_paquetes"], 60)
+
+    def test_k_invalido(self):
+        for k in ("0", "x"):
+            respuesta = self.client.get("/api/v1/paquetes/agrupar_pendientes/", {"k": k})
+            self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(ROUTING_AGRUPAMIENTO_MAX_GRUPOS=3)
+    def test_limite_de_grupos(self):
+        respuesta = self.client.get("/api/v1/paquetes/agrupar_pendientes/", {"k": 4})
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(ROUTING_AGRUPAMIENTO_MAX_PAQUETES=50)
+    def test_limite_de_paquetes(self):
+        with self.assertRaises(ValueError):
+            agrupar_paquetes(Paquete.objects.all())
+
+        localidad = Paquete.objects.first().localidad_id
+        respuesta = self.client.get("/api/v1/paquetes/agrupar_pendientes/", {"localidad": localidad})
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data["total_paquetes"], 15)
@@ -1,10 +1,12 @@
 from rest_framework import viewsets, status, filters
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from drf_spectacular.utils import extend_schema
 
 from .models import Cliente, Localidad, Paquete
 from .serializer import ClienteSerializer, LocalidadSerializer, PaqueteSerializer
+from .agrupamiento import agrupar_paquetes
 
 
 # Create your views here.
@@ -27,6 +29,43 @@ class PaquetesViewSet(viewsets.ModelViewSet):
         if paquete.estado_paquete != "Pendiente":
             return Response ({"error": f"No se puede editar un paquete en estado {paquete.estado_paquete}"}, status=status.HTTP_400_BAD_REQUEST)
         return super().partial_update(request, *args, **kwargs)
+    
+    
+    @action(detail=False, methods=['get'])
+    def agrupar_pendientes(self, request):
+        """
+        Agrupa los paquetes Pendientes en k grupos compactos (k-means sembrado por localidad)
+        y sugiere un borrador de ruta por grupo, listo para asignar_paquetes.
+        Query Params: k (opcional, por defecto una por localidad), localidad (opcional, id)
+        Límites: ROUTING_AGRUPAMIENTO_MAX_PAQUETES paquetes y ROUTING_AGRUPAMIENTO_MAX_GRUPOS grupos
+        """
+        k = request.query_params.get('k')
+        
+        if k is not None:
+            try:
+                k = int(k)
+            except ValueError:
+                k = 0
+            
+            if k < 1:
+                return Response({"error": "k debe ser un entero mayor a 0"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        paquetes = Paquete.objects.filter(estado_paquete="Pendiente")
+        
+        localidad = request.query_params.get('localidad')
+        if localidad:
+            paquetes = paquetes.filter(localidad_id=localidad)
+        
+        try:
+            grupos = agrupar_paquetes(paquetes, k=k)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "total_grupos": len(grupos),
+            "total_paquetes": sum(g["total_paquetes"] for g in grupos),
+            "grupos": grupos
+        })
 
 
 
@@ -1,7 +1,12 @@
 from django.contrib import admin
-from .models import Ruta, EntregaPaquete
+from .models import Ruta, EntregaPaquete, CostoTramo, RespuestaRuta, TrabajoRuta, PlantillaRuta, TelemetriaOptimizacion
 
 
 # Register your models here.
 admin.site.register(Ruta)
-admin.site.register(EntregaPaquete)
\ No newline at end of file
+admin.site.register(EntregaPaquete)
+admin.site.register(CostoTramo)
+admin.site.register(RespuestaRuta)
+admin.site.register(TrabajoRuta)
+admin.site.register(PlantillaRuta)
+admin.site.register(TelemetriaOptimizacion)
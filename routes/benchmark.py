@@ -0,0 +1,254 @@
+"""
+Benchmark del ordenamiento de paradas con datos sintéticos de Bogotá.
+
+Los paquetes se generan alrededor del centro aproximado de cada localidad,
+repartidos según un peso aproximado de la demanda de cada una, con una
+semilla fija para que cada corrida use exactamente los mismos puntos. La
+longitud de cada recorrido se mide con el backend Haversine en proceso
+(sin red), así tiempos y calidad son comparables entre corridas.
+"""
+
+import json
+import subprocess
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from config.routing import HaversineBackend
+from packages.models import Localidad
+
+from .geodesia import preparar_puntos, distancias_desde
+from .optimizador import (
+    matriz_haversine, vecino_mas_cercano, mejorar_2opt, optimizar_paradas
+)
+
+
+TAMANOS = (10, 100, 1_000, 5_000)
+ARCHIVO_HISTORIAL = settings.BASE_DIR / "benchmarks" / "optimizador.json"
+
+# Umbrales para marcar una regresión frente a la corrida anterior
+TOLERANCIA_TIEMPO = 0.25     # 25 % más lento
+TOLERANCIA_LONGITUD = 0.01   # 1 % más largo
+MINIMO_TIEMPO_MS = 5         # Diferencias menores son ruido de medición
+PRESUPUESTO_MULTIARRANQUE_MS = 1000
+
+# Centro aproximado (lat, lng) y peso relativo de la demanda de cada localidad
+CENTROS_LOCALIDADES = {
+    Localidad.LocalidadChoices.USAQUEN: (4.7100, -74.0330, 5),
+    Localidad.LocalidadChoices.CHAPINERO: (4.6450, -74.0600, 3),
+    Localidad.LocalidadChoices.SANTA_FE: (4.6020, -74.0660, 1),
+    Localidad.LocalidadChoices.SAN_CRISTOBAL: (4.5600, -74.0850, 4),
+    Localidad.LocalidadChoices.USME: (4.4850, -74.1200, 3),
+    Localidad.LocalidadChoices.TUNJUELITO: (4.5750, -74.1350, 2),
+    Localidad.LocalidadChoices.BOSA: (4.6150, -74.1900, 7),
+    Localidad.LocalidadChoices.KENNEDY: (4.6300, -74.1550, 10),
+    Localidad.LocalidadChoices.FONTIBON: (4.6750, -74.1450, 4),
+    Localidad.LocalidadChoices.ENGATIVA: (4.7050, -74.1100, 8),
+    Localidad.LocalidadChoices.SUBA: (4.7400, -74.0850, 12),
+    Localidad.LocalidadChoices.BARRIOS_UNIDOS: (4.6700, -74.0700, 2),
+    Localidad.LocalidadChoices.TEUSAQUILLO: (4.6350, -74.0850, 2),
+    Localidad.LocalidadChoices.MARTIRES: (4.6050, -74.0900, 1),
+    Localidad.LocalidadChoices.ANTONIO_NARINO: (4.5900, -74.1000, 1),
+    Localidad.LocalidadChoices.PUENTE_ARANDA: (4.6150, -74.1150, 3),
+    Localidad.LocalidadChoices.CANDELARIA: (4.5970, -74.0730, 0.3),
+    Localidad.LocalidadChoices.RAFAEL_URIBE: (4.5700, -74.1150, 3),
+    Localidad.LocalidadChoices.CIUDAD_BOLIVAR: (4.5450, -74.1500, 6),
+    Localidad.LocalidadChoices.SUMAPAZ: (4.2600, -74.2100, 0.1),
+}
+DISPERSION_GRADOS = 0.012  # ~1.3 km alrededor del centro de la localidad
+BASE = (4.6280, -74.1000)  # Punto de salida común (zona industrial de Puente Aranda)
+
+
+def generar_paquetes(n, semilla=0):
+    """
+    Paquetes sintéticos reproducibles.
+
+    Returns:
+        (lats, lngs, localidades) como arrays de NumPy
+    """
+    rng = np.random.default_rng(semilla)
+    nombres = list(CENTROS_LOCALIDADES)
+    centros = np.array([CENTROS_LOCALIDADES[nombre][:2] for nombre in nombres])
+    pesos = np.array([CENTROS_LOCALIDADES[nombre][2] for nombre in nombres], dtype=np.float64)
+
+    elegidas = rng.choice(len(nombres), size=n, p=pesos / pesos.sum())
+    puntos = centros[elegidas] + rng.normal(0, DISPERSION_GRADOS, size=(n, 2))
+
+    return puntos[:, 0], puntos[:, 1], np.array([str(nombres[i]) for i in elegidas])
+
+
+def nearest_neighbor_haversine(start_lat, start_lng, paquetes):
+    """
+    Línea base histórica: el Nearest Neighbor con que calcular_ruta ordenaba
+    las paradas antes del optimizador (antes en routes/utils.py). Solo se usa
+    en el benchmark para comparar contra routes/optimizador.py.
+    paquetes: lista de diccionarios con 'lat', 'lng', 'id'
+    """
+    if not paquetes:
+        return []
+
+    ordenados = []
+
+    # Radianes y cosenos se calculan una sola vez; los visitados se marcan en una máscara
+    puntos = preparar_puntos([p['lat'] for p in paquetes], [p['lng'] for p in paquetes])
+    visitados = np.zeros(len(paquetes), dtype=bool)
+
+    # Distancias desde la base a todos los paquetes
+    distancias = distancias_desde((start_lat, start_lng), puntos)
+
+    while len(ordenados) < len(paquetes):
+        # Encontrar índice del más cercano entre los restantes
+        idx_min = int(np.argmin(np.where(visitados, np.inf, distancias)))
+
+        ordenados.append(paquetes[idx_min])
+        visitados[idx_min] = True
+
+        # Distancias desde la posición actual
+        distancias = distancias_desde(idx_min, puntos)
+
+    return ordenados
+
+
+def _nn_utils(start_lat, start_lng, lats, lngs):
+    paquetes = [{"id": i, "lat": lat, "lng": lng} for i, (lat, lng) in enumerate(zip(lats, lngs))]
+    return np.array([p["id"] for p in nearest_neighbor_haversine(start_lat, start_lng, paquetes)])
+
+
+def _nn_matriz(start_lat, start_lng, lats, lngs):
+    matriz = matriz_haversine(np.concatenate(([start_lat], lats)), np.concatenate(([start_lng], lngs)))
+    return vecino_mas_cercano(matriz)[1:] - 1
+
+
+def _nn_2opt(start_lat, start_lng, lats, lngs):
+    n = len(lats) + 1
+    extendida = np.zeros((n + 1, n + 1))
+    extendida[:n, :n] = matriz_haversine(np.concatenate(([start_lat], lats)), np.concatenate(([start_lng], lngs)))
+    recorrido = np.append(vecino_mas_cercano(extendida[:n, :n]), n)
+    return mejorar_2opt(recorrido, extendida)[1:-1] - 1
+
+
+def _optimizador(start_lat, start_lng, lats, lngs):
+    return optimizar_paradas(start_lat, start_lng, lats, lngs)[0]
+
+
+def _optimizador_plano(start_lat, start_lng, lats, lngs):
+    return optimizar_paradas(start_lat, start_lng, lats, lngs, modo="equirectangular")[0]
+
+
+def _multiarranque(start_lat, start_lng, lats, lngs):
+    return optimizar_paradas(start_lat, start_lng, lats, lngs, presupuesto_ms=PRESUPUESTO_MULTIARRANQUE_MS)[0]
+
+
+def _por_zonas(start_lat, start_lng, lats, lngs):
+    # Zona = localidad del centro más cercano (aproxima los límites reales de cada localidad)
+    centros = np.array([valor[:2] for valor in CENTROS_LOCALIDADES.values()])
+    zonas = np.argmin(
+        (lats[:, None] - centros[None, :, 0]) ** 2 + (lngs[:, None] - centros[None, :, 1]) ** 2, axis=1
+    )
+    return optimizar_paradas(start_lat, start_lng, lats, lngs, zonas=zonas)[0]
+
+
+ALGORITMOS = {
+    "nn_utils": _nn_utils,          # Nearest Neighbor original (línea base, nearest_neighbor_haversine)
+    "nn_matriz": _nn_matriz,        # Nearest Neighbor con matriz y máscara de visitados
+    "nn_2opt": _nn_2opt,            # + 2-opt
+    "optimizador": _optimizador,    # + 2-opt + Or-opt (el que usa calcular_ruta)
+    "optimizador_plano": _optimizador_plano,  # el mismo con distancia equirectangular en float32
+    "multiarranque": _multiarranque,  # + arranques aleatorios con presupuesto de tiempo
+    "por_zonas": _por_zonas,        # partición por localidad en paralelo y unión de los recorridos
+}
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def ejecutar_benchmark(tamanos=TAMANOS, algoritmos=None, repeticiones=3, semilla=0):
+    """
+    Mide tiempo y longitud del recorrido de cada algoritmo para cada tamaño.
+
+    Returns:
+        dict con la fecha, el commit y una lista de resultados
+        {tamano, algoritmo, tiempo_ms (mediana), longitud_km, duracion_min}
+    """
+    backend = HaversineBackend()
+    algoritmos = algoritmos or list(ALGORITMOS)
+    resultados = []
+
+    for tamano in tamanos:
+        lats, lngs, _ = generar_paquetes(tamano, semilla=semilla + tamano)
+
+        for nombre in algoritmos:
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                orden = ALGORITMOS[nombre](BASE[0], BASE[1], lats, lngs)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            if sorted(orden.tolist()) != list(range(tamano)):
+                raise ValueError(f"{nombre} no devolvió una permutación válida para {tamano} paradas")
+
+            ruta = backend.route([BASE] + list(zip(lats[orden], lngs[orden])))
+            resultados.append({
+                "tamano": tamano,
+                "algoritmo": nombre,
+                "tiempo_ms": round(float(np.median(tiempos)), 2),
+                "longitud_km": round(ruta["distancia_m"] / 1000, 3),
+                "duracion_min": round(ruta["duracion_s"] / 60, 1),
+            })
+
+    return {
+        "fecha": timezone.now().isoformat(),
+        "commit": _commit_actual(),
+        "semilla": semilla,
+        "repeticiones": repeticiones,
+        "backend": "config.routing.HaversineBackend",
+        "resultados": resultados,
+    }
+
+
+def comparar(anterior, actual):
+    """
+    Regresiones de actual frente a anterior (mismo tamaño y algoritmo).
+    """
+    previos = {(r["tamano"], r["algoritmo"]): r for r in anterior["resultados"]}
+    regresiones = []
+
+    for resultado in actual["resultados"]:
+        previo = previos.get((resultado["tamano"], resultado["algoritmo"]))
+        if not previo:
+            continue
+
+        for campo, tolerancia in (("tiempo_ms", TOLERANCIA_TIEMPO), ("longitud_km", TOLERANCIA_LONGITUD)):
+            if campo == "tiempo_ms" and resultado[campo] - previo[campo] < MINIMO_TIEMPO_MS:
+                continue
+            if previo[campo] > 0 and resultado[campo] > previo[campo] * (1 + tolerancia):
+                regresiones.append({
+                    "tamano": resultado["tamano"],
+                    "algoritmo": resultado["algoritmo"],
+                    "campo": campo,
+                    "anterior": previo[campo],
+                    "actual": resultado[campo],
+                })
+
+    return regresiones
+
+
+def cargar_historial(archivo=ARCHIVO_HISTORIAL):
+    return json.loads(archivo.read_text()) if archivo.exists() else []
+
+
+def guardar_en_historial(corrida, archivo=ARCHIVO_HISTORIAL):
+    historial = cargar_historial(archivo)
+    historial.append(corrida)
+    archivo.parent.mkdir(parents=True, exist_ok=True)
+    archivo.write_text(json.dumps(historial, indent=2, ensure_ascii=False))
+    return historial
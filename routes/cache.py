@@ -0,0 +1,129 @@
+"""
+Cachés de respuestas de enrutamiento.
+
+Las respuestas de route se guardan por el hash de las coordenadas redondeadas
+en orden y del perfil/backend de enrutamiento, en dos niveles: un LRU en
+memoria del proceso y la tabla respuesta_ruta, ambos con vencimiento (TTL).
+Las filas vencidas de respuesta_ruta no se leen y se borran periódicamente
+(python manage.py limpiar_vencidos, que también ejecuta el worker).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import RespuestaRuta
+
+
+DECIMALES_CLAVE = 5  # ~1 metro
+TAMANO_CACHE_RUTAS = 512
+
+
+class CacheLRU:
+    """
+    LRU en memoria, seguro entre hilos, con vencimiento opcional en segundos.
+    """
+
+    def __init__(self, tamano_maximo, ttl=None):
+        self.tamano_maximo = tamano_maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+
+            valor, vence = entrada
+            if vence is not None and vence < time.monotonic():
+                del self._datos[clave]
+                return None
+
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        vence = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, vence)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano_maximo:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+cache_rutas = CacheLRU(TAMANO_CACHE_RUTAS, ttl=settings.ROUTING_CACHE_TTL)
+
+
+def clave_ruta(coordenadas):
+    """
+    Hash de la secuencia ordenada de coordenadas y del perfil de enrutamiento.
+    """
+    contenido = json.dumps([
+        settings.ROUTING_BACKEND,
+        settings.OSRM_PERFIL,
+        [[round(float(lat), DECIMALES_CLAVE), round(float(lng), DECIMALES_CLAVE)] for lat, lng in coordenadas]
+    ])
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def buscar_ruta(coordenadas):
+    """
+    Respuesta de route guardada para la secuencia (LRU y luego respuesta_ruta), o None.
+    """
+    clave = clave_ruta(coordenadas)
+
+    respuesta = cache_rutas.obtener(clave)
+    if respuesta is not None:
+        return respuesta
+
+    guardada = RespuestaRuta.objects.filter(
+        clave=clave, expira__gt=timezone.now()
+    ).values_list("respuesta", flat=True).first()
+    if guardada is not None:
+        cache_rutas.guardar(clave, guardada)
+
+    return guardada
+
+
+def guardar_ruta(coordenadas, respuesta):
+    """
+    Guarda la respuesta de route en el LRU y en respuesta_ruta.
+    """
+    clave = clave_ruta(coordenadas)
+    ahora = timezone.now()
+
+    cache_rutas.guardar(clave, respuesta)
+
+    RespuestaRuta.objects.update_or_create(
+        clave=clave,
+        defaults={
+            "perfil": settings.OSRM_PERFIL,
+            "total_coordenadas": len(coordenadas),
+            "respuesta": respuesta,
+            "fecha_creacion": ahora,
+            "expira": ahora + timedelta(seconds=settings.ROUTING_CACHE_TTL),
+        }
+    )
+
+
+def descartar_vencidas():
+    """
+    Borra de respuesta_ruta las respuestas vencidas (ver limpiar_vencidos).
+
+    Returns:
+        cantidad de filas borradas
+    """
+    borradas, _ = RespuestaRuta.objects.filter(expira__lte=timezone.now()).delete()
+    return borradas
@@ -0,0 +1,217 @@
+"""
+Rutas por vía de secuencias de paradas ya ordenadas.
+
+Envuelve el backend de enrutamiento (config/routing.py) con lo que depende de
+la app de rutas: caché de respuestas, segmentación de rutas largas, estimación
+en línea recta cuando el backend falla y telemetría. El backend solo hace las
+peticiones.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from config.routing import get_routing_backend
+
+from .cache import buscar_ruta, guardar_ruta
+from .estimacion import estimar_ruta
+from .geometria import codificar_polilinea, unir_tramos
+from .optimizador import agrupar_paradas
+from .telemetria import cronometrar, sumar
+
+
+def _segmentos(total, maximo):
+    """
+    Divide una secuencia de total coordenadas en segmentos de a lo sumo
+    maximo coordenadas y tamaño parejo. Segmentos consecutivos comparten la
+    parada de unión, así la ruta completa es la concatenación de sus tramos.
+
+    Returns:
+        lista de (inicio, fin) inclusivos
+    """
+    cantidad = int(np.ceil((total - 1) / (maximo - 1)))
+    cortes = np.linspace(0, total - 1, cantidad + 1).round().astype(int)
+    return list(zip(cortes[:-1].tolist(), cortes[1:].tolist()))
+
+
+def _rutas_segmentadas(secuencias, backend):
+    """
+    Ruta por vía de cada secuencia. Las que superan ROUTING_MAX_COORDENADAS
+    se piden por segmentos (cada uno con su propia entrada de caché); todo
+    lo que no está en caché se consulta en paralelo en un pool de hilos
+    acotado y luego se unen geometría, distancia, duración y tramos.
+
+    Los segmentos que el backend no pudo resolver (OSRM caído o circuito
+    abierto) se estiman en línea recta; sus tramos quedan con
+    "estimado": True y no se guardan en caché.
+
+    Returns:
+        lista con la respuesta de route de cada secuencia (o None si falló)
+    """
+    maximo = max(settings.ROUTING_MAX_COORDENADAS, 2)
+
+    # (secuencia, coordenadas del segmento) de todos los segmentos
+    segmentos = [
+        (k, coordenadas[inicio:fin + 1])
+        for k, coordenadas in enumerate(secuencias)
+        for inicio, fin in _segmentos(len(coordenadas), maximo)
+    ]
+    partes = [buscar_ruta(coordenadas) for _, coordenadas in segmentos]
+    faltantes = [i for i, parte in enumerate(partes) if parte is None]
+    sumar("aciertos_cache", len(segmentos) - len(faltantes))
+    sumar("consultas_backend", len(faltantes))
+
+    # Solo las peticiones de red van a los hilos; la caché se escribe en este hilo
+    with cronometrar("tiempo_enrutamiento_ms"):
+        if len(faltantes) == 1:
+            obtenidas = [backend.route(segmentos[faltantes[0]][1])]
+        elif faltantes:
+            with ThreadPoolExecutor(max_workers=min(settings.ROUTING_HILOS, len(faltantes))) as executor:
+                obtenidas = list(executor.map(backend.route, [segmentos[i][1] for i in faltantes]))
+        else:
+            obtenidas = []
+
+    for i, respuesta in zip(faltantes, obtenidas):
+        if respuesta is not None:
+            guardar_ruta(segmentos[i][1], respuesta)
+        else:
+            respuesta = estimar_ruta(segmentos[i][1])
+        partes[i] = respuesta
+
+    rutas = []
+    for k in range(len(secuencias)):
+        propias = [parte for (secuencia, _), parte in zip(segmentos, partes) if secuencia == k]
+
+        if any(parte is None for parte in propias):
+            print(f"Error de enrutamiento en {sum(p is None for p in propias)} de {len(propias)} segmentos")
+            rutas.append(None)
+            continue
+
+        estimados = sum(bool(parte.get('estimado')) for parte in propias)
+        if estimados:
+            print(f"Ruta estimada en línea recta en {estimados} de {len(propias)} segmentos")
+
+        if len(propias) == 1:
+            rutas.append(propias[0])
+        else:
+            coordinates, _ = unir_tramos([parte['geometry']['coordinates'] for parte in propias])
+            rutas.append({
+                'geometry': {'type': 'LineString', 'coordinates': coordinates},
+                'distancia_m': sum(parte['distancia_m'] for parte in propias),
+                'duracion_s': sum(parte['duracion_s'] for parte in propias),
+                'tramos': [tramo for parte in propias for tramo in parte['tramos']],
+                'estimado': estimados > 0
+            })
+
+    return rutas
+
+
+def calcular_ruta_optimizada(coordenadas):
+    """
+    Calcula la ruta por vía con el backend de enrutamiento configurado.
+
+    Args:
+        coordenadas: Lista de tuplas [(lat1, lng1), (lat2, lng2), ...]
+
+    Returns:
+        dict: {
+            'polyline': str,
+            'distancia_km': float,
+            'duracion_minutos': int,
+            'orden': [0, 1, 2, ...],  # Índices en el orden original
+            'estimado': bool  # True si algún tramo se estimó en línea recta
+        }
+        o None si falla
+    """
+    return calcular_rutas_optimizadas([coordenadas])[0]
+
+
+def _colapsar_paradas(coordenadas, radio_m):
+    """
+    Une las coordenadas consecutivas de la misma parada (ver
+    agrupar_paradas), para no enviarlas repetidas al backend. Una parada que
+    se vuelve a visitar más adelante en la secuencia no se une.
+
+    Returns:
+        (unicas, posiciones) donde posiciones[j] es el índice en unicas de
+        la coordenada j
+    """
+    if radio_m <= 0 or len(coordenadas) < 2:
+        return list(coordenadas), list(range(len(coordenadas)))
+
+    lats, lngs = zip(*coordenadas)
+    grupos, _ = agrupar_paradas(lats, lngs, radio_m)
+    nuevas = np.concatenate(([True], grupos[1:] != grupos[:-1]))
+
+    unicas = [coordenada for coordenada, nueva in zip(coordenadas, nuevas) if nueva]
+    return unicas, (np.cumsum(nuevas) - 1).tolist()
+
+
+def calcular_rutas_optimizadas(lista_coordenadas):
+    """
+    Igual que calcular_ruta_optimizada para varias rutas a la vez; las
+    consultas al backend de todas las rutas comparten el pool de hilos.
+
+    Las coordenadas consecutivas dentro de ROUTING_RADIO_PARADA_M se piden
+    una sola vez; los tramos entre ellas se devuelven con distancia y
+    duración 0, así sigue habiendo un tramo por coordenada.
+
+    Returns:
+        lista con el resultado de cada ruta (o None si falló)
+    """
+    colapsadas = [
+        _colapsar_paradas(coordenadas, settings.ROUTING_RADIO_PARADA_M)
+        for coordenadas in lista_coordenadas
+    ]
+    validas = [k for k, (unicas, _) in enumerate(colapsadas) if len(unicas) >= 2]
+
+    # Caché en memoria y en base de datos por la secuencia de coordenadas;
+    # las rutas largas se piden por segmentos
+    rutas = _rutas_segmentadas([colapsadas[k][0] for k in validas], get_routing_backend())
+    rutas_por_indice = dict(zip(validas, rutas))
+
+    resultados = [None] * len(lista_coordenadas)
+    for k, coordenadas in enumerate(lista_coordenadas):
+        unicas, posiciones = colapsadas[k]
+        if len(coordenadas) < 2:
+            continue
+
+        if len(unicas) < 2:
+            # Todas las coordenadas en la misma parada
+            lat, lng = unicas[0]
+            route = {
+                'geometry': {'type': 'LineString', 'coordinates': [[lng, lat], [lng, lat]]},
+                'distancia_m': 0.0,
+                'duracion_s': 0.0,
+                'tramos': []
+            }
+        else:
+            route = rutas_por_indice[k]
+            if route is None:
+                continue
+
+        # Un tramo por coordenada: los de la misma parada con costo 0
+        if len(unicas) < len(coordenadas):
+            route = dict(route, tramos=[
+                route['tramos'][posiciones[j] - 1] if posiciones[j] != posiciones[j - 1]
+                else {'distancia_m': 0.0, 'duracion_s': 0.0}
+                for j in range(1, len(coordenadas))
+            ])
+
+        # Extraer geometría (GeoJSON) y su polilínea codificada
+        geometry = route['geometry']
+        polyline = codificar_polilinea(geometry['coordinates'])
+
+        resultados[k] = {
+            'polyline': polyline,
+            'geometry': geometry,  # GeoJSON completo para el frontend
+            'distancia_km': round(route['distancia_m'] / 1000, 2),  # metros → km
+            'duracion_minutos': round(route['duracion_s'] / 60),  # segundos → minutos
+            'tramos': route['tramos'],
+            # El backend no reordena, mantiene el orden dado
+            'orden': list(range(len(coordenadas))),
+            'estimado': bool(route.get('estimado'))
+        }
+
+    return resultados
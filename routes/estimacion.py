@@ -0,0 +1,104 @@
+"""
+Estimación de rutas en modo degradado (OSRM caído o circuito abierto).
+
+La distancia es la línea recta (Haversine) corregida por un factor de
+circuito y la duración sale de una velocidad promedio. Ambos se calibran con
+los costos reales por vía ya guardados en costo_tramo:
+
+    factor_circuito = mediana(distancia por vía / distancia en línea recta)
+    velocidad_kmh   = distancia total / duración total
+
+Si aún no hay suficientes tramos se usan ROUTING_FACTOR_CIRCUITO y
+ROUTING_VELOCIDAD_KMH. Cada tramo estimado se marca con "estimado": True
+para poder refrescarlo cuando el servicio vuelva (ver refrescar_estimadas).
+"""
+
+import numpy as np
+from django.conf import settings
+
+from config.routing import HaversineBackend
+
+from .cache import CacheLRU
+from .geodesia import distancias_tramos
+from .models import CostoTramo
+
+
+MUESTRA_CALIBRACION = 5_000     # Tramos más recientes usados para calibrar
+MINIMO_MUESTRAS = 30
+DISTANCIA_MINIMA_M = 300        # En tramos más cortos domina el error de cuantización
+LIMITES_FACTOR = (1.0, 3.0)
+LIMITES_VELOCIDAD_KMH = (5.0, 80.0)
+VIGENCIA_CALIBRACION_S = 3600
+
+cache_calibracion = CacheLRU(1, ttl=VIGENCIA_CALIBRACION_S)
+
+
+def calibrar():
+    """
+    Factor de circuito y velocidad promedio observados en costo_tramo.
+
+    Returns:
+        dict {factor_circuito, velocidad_kmh, muestras}; muestras es 0 cuando
+        se usan los valores por defecto de la configuración
+    """
+    calibracion = cache_calibracion.obtener("calibracion")
+    if calibracion is not None:
+        return calibracion
+
+    from .matriz import PRECISION
+
+    calibracion = {
+        "factor_circuito": settings.ROUTING_FACTOR_CIRCUITO,
+        "velocidad_kmh": settings.ROUTING_VELOCIDAD_KMH,
+        "muestras": 0,
+    }
+
+    registros = np.array(
+        CostoTramo.objects.filter(distancia_m__gt=0, duracion_s__gt=0)
+        .order_by("-fecha_actualizacion")
+        .values_list("origen_lat", "origen_lng", "destino_lat", "destino_lng", "distancia_m", "duracion_s")
+        [:MUESTRA_CALIBRACION],
+        dtype=np.float64
+    ).reshape(-1, 6)
+
+    if len(registros):
+        # Origen y destino intercalados: los tramos pares son cada origen -> destino
+        puntos = registros[:, :4].reshape(-1, 2) / 10 ** PRECISION
+        rectas = distancias_tramos(puntos)[::2] * 1000
+
+        validos = rectas >= DISTANCIA_MINIMA_M
+        if validos.sum() >= MINIMO_MUESTRAS:
+            distancias = registros[validos, 4]
+            duraciones = registros[validos, 5]
+            calibracion = {
+                "factor_circuito": round(float(np.clip(
+                    np.median(distancias / rectas[validos]), *LIMITES_FACTOR
+                )), 3),
+                "velocidad_kmh": round(float(np.clip(
+                    distancias.sum() / duraciones.sum() * 3.6, *LIMITES_VELOCIDAD_KMH
+                )), 2),
+                "muestras": int(validos.sum()),
+            }
+
+    cache_calibracion.guardar("calibracion", calibracion)
+    return calibracion
+
+
+def estimar_ruta(coordenadas):
+    """
+    Respuesta con el mismo formato de RoutingBackend.route, estimada en línea
+    recta con la calibración vigente. La geometría es la poligonal entre las
+    coordenadas. Nunca se guarda en la caché de rutas.
+    """
+    calibracion = calibrar()
+    respuesta = HaversineBackend(
+        factor_circuito=calibracion["factor_circuito"],
+        velocidad_kmh=calibracion["velocidad_kmh"]
+    ).route(coordenadas)
+    if respuesta is None:
+        return None
+
+    for tramo in respuesta["tramos"]:
+        tramo["estimado"] = True
+    respuesta["estimado"] = True
+    return respuesta
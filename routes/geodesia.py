@@ -0,0 +1,201 @@
+"""
+Distancias geodésicas vectorizadas.
+
+Todo el cálculo espacial (optimizador, ETAs, backend Haversine, agrupamiento)
+pasa por estos kernels. Las coordenadas se preparan una sola vez con
+preparar_puntos (radianes y coseno de la latitud) y luego se reutilizan en:
+
+    distancias_desde     uno contra muchos
+    matriz_distancias    muchos contra muchos
+    distancias_tramos    pares consecutivos de un recorrido
+
+Modos:
+    "haversine"        exacto sobre la esfera, float64.
+    "equirectangular"  proyección plana alrededor de una latitud de referencia,
+                       en float32. Sin funciones trigonométricas por par; la
+                       matriz completa es ~10 veces más barata y ocupa la
+                       mitad de memoria.
+
+Cotas de error del modo equirectangular frente a Haversine a escala de ciudad:
+    - Por la latitud: la escala este-oeste se toma en la latitud de referencia.
+      Con la referencia en la latitud media de los puntos, el error relativo es
+      a lo sumo tan(lat_ref) * |Δlat| (radianes), más un término de segundo
+      orden Δlat² / 2. En Bogotá (lat ≈ 4.6°, tan ≈ 0.08) y puntos dentro de
+      ±0.5° de la referencia (≈ 55 km), el primero es ≈ 0.07 % y en total
+      queda por debajo de 0.1 %.
+    - Por la curvatura: del orden de (d / R)² / 8 en relativo, < 0.001 % para d < 50 km.
+    - Por float32: las coordenadas se guardan en km relativas a la referencia
+      (no en grados absolutos), así el redondeo es de milímetros.
+    Para toda la ciudad incluida Sumapaz (≈ 1° de extensión) el error queda
+    por debajo de 0.2 %, suficiente para ordenar paradas pero no para
+    reportar distancias, que se siguen calculando con Haversine.
+"""
+
+import numpy as np
+
+
+RADIO_TIERRA_KM = 6371
+MODOS = ("haversine", "equirectangular")
+
+
+class PuntosGeodesicos:
+    """
+    Coordenadas preparadas para los kernels: radianes, coseno de la latitud
+    y, solo si se piden, las coordenadas planas en float32.
+    """
+
+    __slots__ = ("lat", "lng", "cos_lat", "referencia", "_planas")
+
+    def __init__(self, lats, lngs, referencia=None):
+        self.lat = np.radians(np.asarray(lats, dtype=np.float64).reshape(-1))
+        self.lng = np.radians(np.asarray(lngs, dtype=np.float64).reshape(-1))
+        self.cos_lat = np.cos(self.lat)
+        if referencia is not None:
+            self.referencia = (float(np.radians(referencia[0])), float(np.radians(referencia[1])))
+        elif len(self.lat):
+            self.referencia = (float(self.lat.mean()), float(self.lng.mean()))
+        else:
+            self.referencia = (0.0, 0.0)
+        self._planas = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __getitem__(self, indices):
+        """
+        Subconjunto de los puntos sin recalcular radianes ni cosenos. Conserva
+        la referencia para que sus distancias planas sean comparables con las
+        del conjunto completo.
+        """
+        subconjunto = PuntosGeodesicos.__new__(PuntosGeodesicos)
+        subconjunto.lat = np.atleast_1d(self.lat[indices])
+        subconjunto.lng = np.atleast_1d(self.lng[indices])
+        subconjunto.cos_lat = np.atleast_1d(self.cos_lat[indices])
+        subconjunto.referencia = self.referencia
+        subconjunto._planas = None if self._planas is None else self._planas[indices].reshape(-1, 2)
+        return subconjunto
+
+    def planas(self, referencia=None):
+        """
+        Coordenadas (x, y) en km, float32, relativas a la referencia
+        (la propia si no se envía otra, en radianes).
+        """
+        if referencia is not None and referencia != self.referencia:
+            return _proyectar(self.lat, self.lng, referencia)
+        if self._planas is None:
+            self._planas = _proyectar(self.lat, self.lng, self.referencia)
+        return self._planas
+
+
+def _proyectar(lat, lng, referencia):
+    lat_referencia, lng_referencia = referencia
+    x = (lng - lng_referencia) * (np.cos(lat_referencia) * RADIO_TIERRA_KM)
+    y = (lat - lat_referencia) * RADIO_TIERRA_KM
+    return np.column_stack((x, y)).astype(np.float32)
+
+
+def preparar_puntos(lats, lngs, referencia=None):
+    """
+    Args:
+        lats, lngs: coordenadas en grados
+        referencia: (lat, lng) en grados del origen de la proyección
+                    equirectangular; por defecto, el centro de los puntos
+    """
+    return PuntosGeodesicos(lats, lngs, referencia=referencia)
+
+
+def _como_puntos(puntos):
+    if isinstance(puntos, PuntosGeodesicos):
+        return puntos
+    coordenadas = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+    return PuntosGeodesicos(coordenadas[:, 0], coordenadas[:, 1])
+
+
+def _validar_modo(modo):
+    if modo not in MODOS:
+        raise ValueError(f"Modo de distancia desconocido: {modo}. Opciones: {', '.join(MODOS)}")
+
+
+def _haversine(lat1, lng1, cos1, lat2, lng2, cos2):
+    a = np.sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _euclidiana(a, b):
+    dx = a[..., 0] - b[..., 0]
+    dy = a[..., 1] - b[..., 1]
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def distancias_desde(origen, puntos, modo="haversine"):
+    """
+    Distancias (km) desde un origen a cada punto.
+
+    Args:
+        origen: (lat, lng) en grados o índice dentro de puntos
+        puntos: PuntosGeodesicos o array (n, 2) de lat/lng
+
+    Returns:
+        array de n distancias
+    """
+    _validar_modo(modo)
+    puntos = _como_puntos(puntos)
+
+    if isinstance(origen, (int, np.integer)):
+        o = puntos[int(origen)]
+    else:
+        o = PuntosGeodesicos([origen[0]], [origen[1]])
+
+    if modo == "equirectangular":
+        return _euclidiana(puntos.planas(), o.planas(puntos.referencia)[0])
+
+    return _haversine(o.lat[0], o.lng[0], o.cos_lat[0], puntos.lat, puntos.lng, puntos.cos_lat)
+
+
+def matriz_distancias(origenes, destinos=None, modo="haversine"):
+    """
+    Matriz de distancias (km) entre origenes y destinos (por defecto, los mismos).
+
+    Returns:
+        array (len(origenes), len(destinos)); float32 en modo equirectangular
+    """
+    _validar_modo(modo)
+    origenes = _como_puntos(origenes)
+    destinos = origenes if destinos is None else _como_puntos(destinos)
+
+    if modo == "equirectangular":
+        a = origenes.planas()
+        b = destinos.planas(origenes.referencia)
+        # Operaciones en sitio: a este tamaño el costo es el tráfico de memoria
+        dx = np.subtract.outer(a[:, 0], b[:, 0])
+        dy = np.subtract.outer(a[:, 1], b[:, 1])
+        dx *= dx
+        dy *= dy
+        dx += dy
+        return np.sqrt(dx, out=dx)
+
+    return _haversine(
+        origenes.lat[:, None], origenes.lng[:, None], origenes.cos_lat[:, None],
+        destinos.lat[None, :], destinos.lng[None, :], destinos.cos_lat[None, :]
+    )
+
+
+def distancias_tramos(puntos, modo="haversine"):
+    """
+    Distancia (km) de cada tramo consecutivo de un recorrido, sin construir
+    la matriz completa.
+
+    Returns:
+        array de n-1 distancias
+    """
+    _validar_modo(modo)
+    puntos = _como_puntos(puntos)
+
+    if modo == "equirectangular":
+        planas = puntos.planas()
+        return _euclidiana(planas[1:], planas[:-1])
+
+    return _haversine(
+        puntos.lat[:-1], puntos.lng[:-1], puntos.cos_lat[:-1],
+        puntos.lat[1:], puntos.lng[1:], puntos.cos_lat[1:]
+    )
@@ -0,0 +1,336 @@
+"""
+Utilidades sobre la geometría de una ruta.
+
+En Ruta.ruta_optimizada la geometría se guarda como polilínea codificada
+(formato de Google) en "polyline" junto con su "precision"; en memoria y en
+las respuestas GeoJSON se maneja como coordinates [[lng, lat], ...].
+"""
+
+import numpy as np
+
+
+PRECISION_POLILINEA = 5  # ~1 metro
+FORMATOS_GEOMETRIA = ("geojson", "polyline")
+
+# Niveles de simplificación (Douglas-Peucker) que se guardan con cada ruta, en metros.
+# Van en la tabla simplificacion_ruta, no en ruta_optimizada
+TOLERANCIAS_SIMPLIFICACION = (5, 20, 80, 300)
+METROS_POR_GRADO = 111_320
+METROS_POR_PIXEL_ZOOM_0 = 156_543.03  # Teselas web mercator de 256 px en el ecuador
+LAT_REFERENCIA = 4.65  # Bogotá
+
+
+def codificar_polilinea(coordinates, precision=PRECISION_POLILINEA):
+    """
+    Codifica [[lng, lat], ...] como polilínea de Google (pares lat,lng).
+    """
+    if not coordinates:
+        return ""
+
+    factor = 10 ** precision
+    puntos = np.round(np.asarray(coordinates, dtype=np.float64)[:, ::-1] * factor).astype(np.int64)
+    deltas = np.diff(puntos, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    valores = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    caracteres = []
+    for valor in valores.tolist():
+        while valor >= 0x20:
+            caracteres.append(chr((0x20 | (valor & 0x1f)) + 63))
+            valor >>= 5
+        caracteres.append(chr(valor + 63))
+
+    return "".join(caracteres)
+
+
+def decodificar_polilinea(texto, precision=PRECISION_POLILINEA):
+    """
+    Decodifica una polilínea de Google a [[lng, lat], ...].
+    """
+    if not texto:
+        return []
+
+    valores = []
+    actual = 0
+    desplazamiento = 0
+    for caracter in texto:
+        byte = ord(caracter) - 63
+        actual |= (byte & 0x1f) << desplazamiento
+        desplazamiento += 5
+        if byte < 0x20:
+            valores.append(~(actual >> 1) if actual & 1 else actual >> 1)
+            actual = 0
+            desplazamiento = 0
+
+    puntos = np.cumsum(np.array(valores, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return puntos[:, ::-1].tolist()
+
+
+def coordenadas_ruta(datos):
+    """
+    Coordenadas [[lng, lat], ...] de un ruta_optimizada, o None si no tiene geometría.
+    Acepta también el formato anterior con el GeoJSON completo en "geometry".
+    """
+    if not datos:
+        return None
+
+    if datos.get("polyline"):
+        return decodificar_polilinea(datos["polyline"], datos.get("precision", PRECISION_POLILINEA))
+
+    geometry = datos.get("geometry")
+    if geometry:
+        return geometry["coordinates"]
+
+    return None
+
+
+def douglas_peucker(puntos, tolerancia):
+    """
+    Douglas-Peucker iterativo sobre puntos proyectados en metros.
+
+    Returns:
+        máscara booleana con los vértices que se conservan
+    """
+    n = len(puntos)
+    conservar = np.zeros(n, dtype=bool)
+    if n == 0:
+        return conservar
+
+    conservar[0] = conservar[-1] = True
+    pendientes = [(0, n - 1)]
+
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        if fin - inicio < 2:
+            continue
+
+        a = puntos[inicio]
+        ab = puntos[fin] - a
+        relativos = puntos[inicio + 1:fin] - a
+        largo2 = ab @ ab
+
+        # Distancia de cada vértice intermedio al segmento a-b
+        t = np.clip(relativos @ ab / largo2, 0, 1) if largo2 > 0 else np.zeros(len(relativos))
+        distancias = np.hypot(*(relativos - t[:, None] * ab).T)
+
+        k = int(np.argmax(distancias))
+        if distancias[k] > tolerancia:
+            medio = inicio + 1 + k
+            conservar[medio] = True
+            pendientes += [(inicio, medio), (medio, fin)]
+
+    return conservar
+
+
+def simplificar(coordinates, indices, tolerancia):
+    """
+    Simplifica la geometría tramo por tramo, conservando el vértice de cada
+    parada para que indices_geometria siga siendo válido.
+
+    Returns:
+        (coordinates, indices) simplificados
+    """
+    vertices = np.asarray(coordinates, dtype=np.float64)
+    cos_lat = np.cos(np.radians(vertices[:, 1].mean()))
+    puntos = np.column_stack((vertices[:, 0] * cos_lat, vertices[:, 1])) * METROS_POR_GRADO
+
+    indices = indices or [0, len(vertices) - 1]
+    tramos = [
+        vertices[inicio:fin + 1][douglas_peucker(puntos[inicio:fin + 1], tolerancia)].tolist()
+        for inicio, fin in zip(indices[:-1], indices[1:])
+    ]
+    return unir_tramos(tramos)
+
+
+def simplificaciones_ruta(coordinates, indices):
+    """
+    Versiones simplificadas de la geometría para cada nivel de
+    TOLERANCIAS_SIMPLIFICACION, codificadas como polilínea.
+
+    Returns:
+        dict {tolerancia: {"polyline", "indices_geometria"}}
+    """
+    niveles = {}
+    for tolerancia in TOLERANCIAS_SIMPLIFICACION:
+        simplificada, indices_simplificados = simplificar(coordinates, indices, tolerancia)
+        niveles[tolerancia] = {
+            "polyline": codificar_polilinea(simplificada),
+            "indices_geometria": indices_simplificados,
+        }
+    return niveles
+
+
+def tolerancia_solicitada(params, lat=LAT_REFERENCIA):
+    """
+    Tolerancia en metros pedida con ?tolerance= (metros) o ?zoom= (nivel del
+    mapa, se toma un píxel de tolerancia). None si no se pidió o no es válida.
+    """
+    try:
+        if params.get("tolerance") not in (None, ""):
+            return max(float(params["tolerance"]), 0.0)
+        if params.get("zoom") not in (None, ""):
+            zoom = min(max(float(params["zoom"]), 0.0), 22.0)
+            return METROS_POR_PIXEL_ZOOM_0 * np.cos(np.radians(lat)) / 2 ** zoom
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def simplificacion_solicitada(ruta, params):
+    """
+    Nivel guardado de la ruta (ruta.simplificaciones) más grueso que no supera
+    la tolerancia pedida con ?tolerance= o ?zoom=. None si no se pidió o no
+    aplica ningún nivel; solo consulta los niveles cuando se pide uno.
+    """
+    tolerancia = tolerancia_solicitada(params)
+    if tolerancia is None:
+        return None
+
+    aplicables = [s for s in ruta.simplificaciones.all() if s.tolerancia_m <= tolerancia]
+    return max(aplicables, key=lambda s: s.tolerancia_m, default=None)
+
+
+def representar_ruta_optimizada(datos, formato="polyline", simplificacion=None):
+    """
+    Prepara ruta_optimizada para la API: con formato "geojson" la polilínea se
+    expande a "geometry" (GeoJSON); con "polyline" se entrega codificada.
+    Con simplificacion (ver simplificacion_solicitada) se entrega ese nivel;
+    sin ella, la geometría completa.
+    """
+    if not datos:
+        return datos
+
+    datos = dict(datos)
+
+    if simplificacion:
+        datos.pop("geometry", None)
+        datos["polyline"] = simplificacion.polyline
+        datos["precision"] = PRECISION_POLILINEA
+        datos["indices_geometria"] = simplificacion.indices_geometria
+        datos["tolerancia_m"] = float(simplificacion.tolerancia_m)
+
+    if formato == "polyline":
+        if not datos.get("polyline") and datos.get("geometry"):
+            datos["polyline"] = codificar_polilinea(datos["geometry"]["coordinates"])
+            datos["precision"] = PRECISION_POLILINEA
+        datos.pop("geometry", None)
+        return datos
+
+    coordinates = coordenadas_ruta(datos)
+    datos.pop("polyline", None)
+    datos.pop("precision", None)
+    datos["geometry"] = {"type": "LineString", "coordinates": coordinates} if coordinates is not None else None
+    return datos
+
+
+def indices_paradas(coordinates, paradas):
+    """
+    Índice del vértice de la geometría más cercano a cada parada, buscando
+    siempre hacia adelante para respetar el orden del recorrido.
+
+    Args:
+        coordinates: lista [[lng, lat], ...] de la geometría
+        paradas: lista [(lat, lng), ...] en orden de visita (incluye el punto de inicio)
+
+    Returns:
+        lista de índices, uno por parada (no decreciente)
+    """
+    if not coordinates or not paradas:
+        return []
+
+    vertices = np.asarray(coordinates, dtype=np.float64)
+    cos_lat = np.cos(np.radians(vertices[:, 1].mean()))
+
+    indices = []
+    desde = 0
+    for lat, lng in paradas:
+        resto = vertices[desde:]
+        distancias = (resto[:, 1] - lat) ** 2 + ((resto[:, 0] - lng) * cos_lat) ** 2
+        desde += int(np.argmin(distancias))
+        indices.append(desde)
+
+    # La primera y la última parada coinciden con los extremos de la geometría
+    indices[0] = 0
+    indices[-1] = len(vertices) - 1
+    return indices
+
+
+def dividir_por_tramos(coordinates, indices):
+    """
+    Parte la geometría en un tramo por cada par de paradas consecutivas.
+    """
+    return [coordinates[inicio:fin + 1] for inicio, fin in zip(indices[:-1], indices[1:])]
+
+
+def tramos_restantes(datos, desde, formato="polyline", simplificacion=None):
+    """
+    Tramos del recorrido desde el que llega a la parada con orden_entrega
+    desde hasta el final, para dibujar lo que le falta al conductor sin
+    volver a descargar y recortar la geometría completa.
+
+    La geometría completa (o el nivel guardado en simplificacion) se parte
+    por indices_geometria; solo se codifican los tramos que se entregan.
+
+    Returns:
+        lista de {orden_entrega, id_paquete, indice_geometria, distancia_m,
+        duracion_s, estimado, polyline | coordinates}
+    """
+    if not datos:
+        return []
+
+    paquetes = datos.get("paquetes") or []
+    tramos = datos.get("tramos") or []
+    primero = max(int(desde), 1) - 1
+    if primero >= len(paquetes):
+        return []
+
+    if simplificacion:
+        indices = simplificacion.indices_geometria or []
+        coordinates = decodificar_polilinea(simplificacion.polyline)
+    else:
+        indices = datos.get("indices_geometria") or []
+        coordinates = coordenadas_ruta(datos)
+
+    geometrias = dividir_por_tramos(coordinates, indices) if coordinates else []
+    if len(geometrias) != len(paquetes):
+        geometrias = [None] * len(paquetes)
+
+    restantes = []
+    for k in range(primero, len(paquetes)):
+        tramo = tramos[k] if len(tramos) == len(paquetes) else {}
+        restante = {
+            "orden_entrega": k + 1,
+            "id_paquete": paquetes[k]["id"],
+            "indice_geometria": indices[k] if len(indices) == len(paquetes) + 1 else None,
+            "distancia_m": tramo.get("distancia_m"),
+            "duracion_s": tramo.get("duracion_s"),
+            "estimado": bool(tramo.get("estimado")),
+        }
+
+        if formato == "geojson":
+            restante["coordinates"] = geometrias[k]
+        else:
+            restante["polyline"] = codificar_polilinea(geometrias[k]) if geometrias[k] else None
+        restantes.append(restante)
+
+    return restantes
+
+
+def unir_tramos(tramos):
+    """
+    Une las geometrías de varios tramos consecutivos en una sola.
+
+    Returns:
+        (coordinates, indices) donde indices es la posición de cada parada
+    """
+    coordinates = []
+    indices = [0]
+
+    for tramo in tramos:
+        if not tramo:
+            indices.append(len(coordinates) - 1 if coordinates else 0)
+            continue
+        # El primer punto de cada tramo repite el último del anterior
+        coordinates.extend(tramo[1:] if coordinates else tramo)
+        indices.append(len(coordinates) - 1)
+
+    return coordinates, indices
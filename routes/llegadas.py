@@ -0,0 +1,105 @@
+"""
+Tiempos estimados de llegada (ETA) a las paradas pendientes de una ruta.
+
+Se calculan solo con lo guardado al calcular la ruta (distancia y duración
+acumuladas por parada en ruta_optimizada) y la última ubicación reportada
+por el conductor, sin llamadas al backend de enrutamiento. El tramo en curso
+se estima con el ritmo (segundos por km en línea recta) de ese mismo tramo.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .geodesia import preparar_puntos, distancias_desde
+
+
+ESTADOS_PENDIENTES = ("Pendiente", "Asignado", "En ruta")
+
+
+def estimar_llegadas(ruta, ahora=None):
+    """
+    Args:
+        ruta: instancia de Ruta con ruta_optimizada calculada
+        ahora: instante de referencia (por defecto, ahora)
+
+    Returns:
+        dict con el tiempo y la distancia restantes y la llegada estimada a
+        cada parada pendiente (en orden de entrega), o None si la ruta no
+        tiene tiempos por tramo guardados o no le quedan paradas
+    """
+    datos = ruta.ruta_optimizada
+    if not datos or not datos.get("paquetes") or not datos.get("punto_inicio"):
+        return None
+
+    paradas = datos["paquetes"]
+    if any(p.get("duracion_acumulada_s") is None for p in paradas):
+        return None
+
+    pendientes = set(
+        ruta.paquetes.filter(estado_paquete__in=ESTADOS_PENDIENTES).values_list("id_paquete", flat=True)
+    )
+    posiciones = [k for k, p in enumerate(paradas, 1) if p["id"] in pendientes]
+    if not posiciones:
+        return None
+
+    # Secuencia con el punto de inicio en la posición 0
+    inicio = datos["punto_inicio"]
+    lats = np.array([inicio["lat"]] + [p["lat"] for p in paradas], dtype=np.float64)
+    lngs = np.array([inicio["lng"]] + [p["lng"] for p in paradas], dtype=np.float64)
+    duraciones = np.array([0.0] + [p["duracion_acumulada_s"] for p in paradas])
+    distancias = np.array([0.0] + [p["distancia_acumulada_m"] for p in paradas])
+
+    # Tramo en curso: de la parada anterior a la próxima pendiente
+    proxima = posiciones[0]
+    anterior = proxima - 1
+
+    conductor = ruta.conductor
+    con_ubicacion = bool(
+        conductor and conductor.ubicacion_actual_lat is not None and conductor.ubicacion_actual_lng is not None
+    )
+    if con_ubicacion:
+        actual = (float(conductor.ubicacion_actual_lat), float(conductor.ubicacion_actual_lng))
+    else:
+        actual = (lats[anterior], lngs[anterior])
+
+    largo_tramo_km, restante_km = distancias_desde(
+        (lats[proxima], lngs[proxima]),
+        preparar_puntos([lats[anterior], actual[0]], [lngs[anterior], actual[1]])
+    )
+
+    duracion_tramo = duraciones[proxima] - duraciones[anterior]
+    distancia_tramo = distancias[proxima] - distancias[anterior]
+    if largo_tramo_km > 0:
+        # Un conductor desviado puede estar más lejos que el largo del tramo: la
+        # estimación de la próxima parada no supera la del tramo completo
+        fraccion = min(max(restante_km / largo_tramo_km, 0.0), 1.0)
+        segundos_proxima = duracion_tramo * fraccion
+        metros_proxima = distancia_tramo * fraccion
+    else:
+        # Tramo de largo cero: se usa el factor de circuito y la velocidad promedio configurados
+        metros_proxima = restante_km * 1000 * settings.ROUTING_FACTOR_CIRCUITO
+        segundos_proxima = metros_proxima / (settings.ROUTING_VELOCIDAD_KMH / 3.6)
+
+    ahora = ahora or timezone.now()
+    llegadas = []
+    for k in posiciones:
+        segundos = segundos_proxima + duraciones[k] - duraciones[proxima]
+        metros = metros_proxima + distancias[k] - distancias[proxima]
+        llegadas.append({
+            "id": paradas[k - 1]["id"],
+            "orden_entrega": paradas[k - 1]["orden_entrega"],
+            "segundos_restantes": round(float(segundos)),
+            "distancia_restante_m": round(float(metros)),
+            "llegada_estimada": ahora + timedelta(seconds=float(segundos)),
+        })
+
+    return {
+        "desde_ubicacion_conductor": con_ubicacion,
+        "tiempo_restante_min": round(llegadas[-1]["segundos_restantes"] / 60),
+        "distancia_restante_km": round(llegadas[-1]["distancia_restante_m"] / 1000, 2),
+        "llegada_estimada_final": llegadas[-1]["llegada_estimada"],
+        "paradas": llegadas,
+    }
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from routes.benchmark import (
+    ALGORITMOS, ARCHIVO_HISTORIAL, TAMANOS,
+    ejecutar_benchmark, comparar, cargar_historial, guardar_en_historial
+)
+
+
+class Command(BaseCommand):
+    help = "Mide tiempo y longitud de recorrido de los algoritmos de ordenamiento con datos sintéticos de Bogotá"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tamanos",
+            type=int,
+            nargs="+",
+            default=list(TAMANOS),
+            help="Cantidades de paradas a medir"
+        )
+        parser.add_argument(
+            "--algoritmos",
+            nargs="+",
+            choices=list(ALGORITMOS),
+            default=list(ALGORITMOS),
+            help="Algoritmos a medir"
+        )
+        parser.add_argument("--repeticiones", type=int, default=3)
+        parser.add_argument("--semilla", type=int, default=0)
+        parser.add_argument(
+            "--salida",
+            default=str(ARCHIVO_HISTORIAL),
+            help="Archivo JSON con el historial de corridas"
+        )
+        parser.add_argument(
+            "--no-guardar",
+            action="store_true",
+            help="Solo muestra los resultados, no los agrega al historial"
+        )
+        parser.add_argument(
+            "--fallar-en-regresion",
+            action="store_true",
+            help="Termina con error si hay regresiones frente a la corrida anterior"
+        )
+
+    def handle(self, *args, **options):
+        archivo = Path(options["salida"])
+
+        corrida = ejecutar_benchmark(
+            tamanos=options["tamanos"],
+            algoritmos=options["algoritmos"],
+            repeticiones=max(options["repeticiones"], 1),
+            semilla=options["semilla"],
+        )
+
+        for r in corrida["resultados"]:
+            self.stdout.write(
+                f"{r['tamano']:>6} paradas | {r['algoritmo']:<17} | {r['tiempo_ms']:>10.2f} ms | "
+                f"{r['longitud_km']:>10.3f} km | {r['duracion_min']:>8.1f} min"
+            )
+
+        historial = cargar_historial(archivo)
+        regresiones = comparar(historial[-1], corrida) if historial else []
+        corrida["regresiones"] = regresiones
+
+        if not options["no_guardar"]:
+            guardar_en_historial(corrida, archivo)
+            self.stdout.write(f"Resultados agregados a {archivo}")
+
+        for r in regresiones:
+            self.stdout.write(self.style.WARNING(
+                f"Regresión en {r['algoritmo']} ({r['tamano']} paradas): "
+                f"{r['campo']} {r['anterior']} -> {r['actual']}"
+            ))
+
+        if regresiones and options["fallar_en_regresion"]:
+            raise CommandError(f"{len(regresiones)} regresiones frente a la corrida anterior")
+
+        if not regresiones:
+            self.stdout.write(self.style.SUCCESS("Sin regresiones frente a la corrida anterior"))
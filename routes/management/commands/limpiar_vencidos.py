@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from routes.trabajos import limpiar_vencidos
+
+
+class Command(BaseCommand):
+    help = "Borra las respuestas de ruta vencidas (respuesta_ruta) y la telemetría más vieja que ROUTING_TELEMETRIA_DIAS"
+
+    def handle(self, *args, **options):
+        respuestas, telemetria = limpiar_vencidos()
+        self.stdout.write(self.style.SUCCESS(
+            f"{respuestas} respuestas de ruta vencidas y {telemetria} filas de telemetría borradas"
+        ))
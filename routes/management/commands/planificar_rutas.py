@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from routes.planificador import planificar_rutas
+
+
+class Command(BaseCommand):
+    help = "Reparte los paquetes Pendientes entre los conductores Disponibles y crea sus rutas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Solo muestra el plan, no crea rutas ni modifica paquetes"
+        )
+        parser.add_argument(
+            "--presupuesto-ms",
+            type=int,
+            default=None,
+            help="Tiempo (ms) de búsqueda multiarranque para el orden de cada ruta"
+        )
+
+    def handle(self, *args, **options):
+        plan = planificar_rutas(simular=options["simular"], presupuesto_ms=options["presupuesto_ms"])
+
+        if not plan["rutas"]:
+            self.stdout.write(self.style.WARNING("No hay paquetes pendientes o conductores disponibles"))
+            return
+
+        for ruta in plan["rutas"]:
+            self.stdout.write(
+                f"{ruta.get('codigo_manifiesto', 'Simulada')} | conductor {ruta['conductor']} "
+                f"({ruta['tipo_vehiculo']} {ruta['vehiculo']}) | {len(ruta['paquetes'])} paquetes | "
+                f"{ruta['peso']} kg | {ruta['distancia_km']} km"
+            )
+
+        if plan["no_asignados"]:
+            self.stdout.write(self.style.WARNING(
+                f"{len(plan['no_asignados'])} paquetes no caben en la flota disponible: {plan['no_asignados']}"
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(plan['rutas'])} rutas, {plan['distancia_total_km']} km en total"
+            + (" (simulación)" if options["simular"] else "")
+        ))
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from routes.trabajos import (
+    tomar_siguiente, procesar_trabajo, recuperar_abandonados, limpiar_vencidos, admite_varios_workers,
+    INTERVALO_LIMPIEZA
+)
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de trabajos de ruta (cálculos encolados por calcular_ruta)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=1.0,
+            help="Segundos de espera cuando la cola está vacía"
+        )
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Procesa los trabajos pendientes y termina"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker de rutas iniciado")
+        if not admite_varios_workers():
+            self.stdout.write(self.style.WARNING(
+                "La base de datos no soporta SKIP LOCKED (requiere MySQL 8.0.1+ o MariaDB 10.6+): ejecuta un solo worker"
+            ))
+        ultima_limpieza = None
+
+        while True:
+            close_old_connections()
+
+            # Mantenimiento periódico: respuestas de ruta vencidas y telemetría antigua
+            if ultima_limpieza is None or time.monotonic() - ultima_limpieza >= INTERVALO_LIMPIEZA.total_seconds():
+                respuestas, telemetria = limpiar_vencidos()
+                ultima_limpieza = time.monotonic()
+                if respuestas or telemetria:
+                    self.stdout.write(f"Limpieza: {respuestas} respuestas de ruta vencidas y {telemetria} filas de telemetría borradas")
+
+            recuperados = recuperar_abandonados()
+            if recuperados:
+                self.stdout.write(self.style.WARNING(f"{recuperados} trabajos abandonados devueltos a la cola"))
+
+            trabajo = tomar_siguiente()
+            if trabajo is None:
+                if options["una_vez"]:
+                    return
+                time.sleep(options["intervalo"])
+                continue
+
+            inicio = time.perf_counter()
+            trabajo = procesar_trabajo(trabajo)
+            mensaje = (
+                f"Trabajo {trabajo.pk} ({trabajo.tipo}, ruta {trabajo.ruta_id}) "
+                f"{trabajo.estado} en {time.perf_counter() - inicio:.2f} s"
+            )
+
+            if trabajo.estado == trabajo.EstadoTrabajo.COMPLETADO:
+                self.stdout.write(self.style.SUCCESS(mensaje))
+            else:
+                self.stdout.write(self.style.ERROR(f"{mensaje}: {trabajo.error}"))
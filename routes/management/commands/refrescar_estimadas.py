@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from routes.trabajos import encolar_estimadas
+
+
+class Command(BaseCommand):
+    help = "Encola de nuevo el cálculo de las rutas estimadas en línea recta mientras OSRM no estaba disponible"
+
+    def handle(self, *args, **options):
+        trabajos = encolar_estimadas()
+
+        if not trabajos:
+            self.stdout.write(self.style.SUCCESS("No hay rutas estimadas por refrescar"))
+            return
+
+        for trabajo in trabajos:
+            self.stdout.write(f"Ruta {trabajo.ruta.codigo_manifiesto} | trabajo {trabajo.id_trabajo}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(trabajos)} rutas encoladas; las procesa python manage.py procesar_trabajos"
+        ))
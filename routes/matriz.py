@@ -0,0 +1,340 @@
+"""
+Matriz de costos reales por vía entre paradas.
+
+Los costos se buscan en tres niveles: un LRU en memoria del proceso, la tabla
+costo_tramo y, solo para los pares que falten, el servicio table de OSRM en
+bloques. Las coordenadas se cuantizan para que entregas repetidas al mismo
+edificio o base no vuelvan a consultar la red.
+
+Cada punto cuantizado se codifica como un entero y el LRU guarda una fila por
+origen (destinos ordenados y sus costos), así la búsqueda es una operación
+vectorizada por fila en lugar de una por par. Con más de MAX_PUNTOS_BD puntos
+se omite costo_tramo (tanto la lectura como la escritura) y los pares
+faltantes se piden directamente por bloques.
+
+matrices_costos resuelve varias rutas a la vez: la caché y la base de datos
+se consultan en el hilo principal y solo las peticiones table de todas las
+rutas van a un pool de hilos acotado (ROUTING_HILOS).
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from config.osm_service import OSMService
+
+from .cache import CacheLRU
+from .models import CostoTramo
+from .telemetria import cronometrar, sumar
+
+
+PRECISION = 4  # 4 decimales ~ 11 metros
+TAMANO_CACHE = 20_000  # Orígenes (filas) en memoria
+MAX_COORDENADAS_TABLE = 100  # Límite de coordenadas por petición del servidor público
+MAX_PUNTOS_BD = 300  # Con más puntos no se consulta ni se llena costo_tramo: se piden bloques table directamente
+ORIGENES_POR_CONSULTA = 200
+DESPLAZAMIENTO = 4_000_000  # Para codificar un punto cuantizado en un solo entero (|lng| < 180 * 10^4)
+
+
+def cuantizar(lat, lng):
+    factor = 10 ** PRECISION
+    return int(round(float(lat) * factor)), int(round(float(lng) * factor))
+
+
+def _codificar(claves):
+    """
+    Un int64 por punto cuantizado (lat, lng), para buscar pares con searchsorted.
+    """
+    claves = np.asarray(claves, dtype=np.int64).reshape(-1, 2)
+    return claves[:, 0] * DESPLAZAMIENTO + claves[:, 1] + DESPLAZAMIENTO // 2
+
+
+# LRU en memoria por origen: (códigos de destino ordenados, duraciones_s, distancias_m)
+cache_tramos = CacheLRU(TAMANO_CACHE)
+
+
+def _leer_cache(estado):
+    codigos, duraciones, distancias = estado["codigos"], estado["duraciones"], estado["distancias"]
+
+    for i, codigo in enumerate(codigos.tolist()):
+        fila = cache_tramos.obtener(codigo)
+        if fila is None:
+            continue
+
+        destinos, fila_duraciones, fila_distancias = fila
+        posiciones = np.minimum(np.searchsorted(destinos, codigos), len(destinos) - 1)
+        hay = destinos[posiciones] == codigos
+        hay[i] = False
+        duraciones[i, hay] = fila_duraciones[posiciones[hay]]
+        distancias[i, hay] = fila_distancias[posiciones[hay]]
+
+
+def _guardar_en_cache(estado, nuevos):
+    """
+    Agrega al LRU los pares marcados en nuevos (matriz booleana n x n).
+    """
+    codigos, duraciones, distancias = estado["codigos"], estado["duraciones"], estado["distancias"]
+
+    for i in np.flatnonzero(nuevos.any(axis=1)):
+        columnas = nuevos[i]
+        destinos = codigos[columnas]
+        fila_duraciones, fila_distancias = duraciones[i, columnas], distancias[i, columnas]
+
+        anterior = cache_tramos.obtener(int(codigos[i]))
+        if anterior is not None:
+            destinos = np.concatenate((destinos, anterior[0]))
+            fila_duraciones = np.concatenate((fila_duraciones, anterior[1]))
+            fila_distancias = np.concatenate((fila_distancias, anterior[2]))
+
+        # unique conserva la primera aparición: los valores nuevos reemplazan a los anteriores
+        destinos, primeros = np.unique(destinos, return_index=True)
+        cache_tramos.guardar(int(codigos[i]), (destinos, fila_duraciones[primeros], fila_distancias[primeros]))
+
+
+def _posiciones(estado, buscados):
+    """
+    Índice en la matriz de cada código buscado (-1 si no es uno de sus puntos).
+    """
+    codigos = estado["codigos"]
+    orden = np.argsort(codigos)
+    posiciones = np.minimum(np.searchsorted(codigos[orden], buscados), len(codigos) - 1)
+    return np.where(codigos[orden][posiciones] == buscados, orden[posiciones], -1)
+
+
+def _buscar_en_bd(estado):
+    """
+    Busca en costo_tramo los pares que faltan, por grupos de orígenes (usa el
+    índice único de la tabla), y los sube al LRU. Retorna cuántos encontró.
+    """
+    puntos, duraciones, distancias = estado["puntos"], estado["duraciones"], estado["distancias"]
+    faltan = np.isnan(duraciones)
+    origenes = np.flatnonzero(faltan.any(axis=1))
+    destinos_lat = {puntos[j][0] for j in np.flatnonzero(faltan.any(axis=0))}
+
+    encontrados = np.zeros_like(faltan)
+    for inicio in range(0, len(origenes), ORIGENES_POR_CONSULTA):
+        condicion = Q()
+        for i in origenes[inicio:inicio + ORIGENES_POR_CONSULTA]:
+            condicion |= Q(origen_lat=puntos[i][0], origen_lng=puntos[i][1])
+
+        registros = list(
+            CostoTramo.objects.filter(condicion, destino_lat__in=destinos_lat)
+            .values_list("origen_lat", "origen_lng", "destino_lat", "destino_lng", "duracion_s", "distancia_m")
+        )
+        if not registros:
+            continue
+
+        claves = np.array([r[:4] for r in registros], dtype=np.int64)
+        costos = np.array([r[4:] for r in registros], dtype=np.float64)
+        o = _posiciones(estado, _codificar(claves[:, :2]))
+        d = _posiciones(estado, _codificar(claves[:, 2:]))
+
+        validos = (o >= 0) & (d >= 0)
+        validos[validos] = faltan[o[validos], d[validos]]
+        o, d, costos = o[validos], d[validos], costos[validos]
+        duraciones[o, d], distancias[o, d] = costos[:, 0], costos[:, 1]
+        encontrados[o, d] = True
+
+    _guardar_en_cache(estado, encontrados)
+    return int(encontrados.sum())
+
+
+def _consultar_osrm(puntos, faltan):
+    """
+    Pide al servicio table los pares que faltan, por bloques de orígenes x
+    destinos. Solo hace peticiones de red (no toca la caché ni la base de
+    datos), así que puede ejecutarse en otro hilo.
+
+    Returns:
+        (duraciones, distancias) n x n con NaN en los pares no obtenidos
+    """
+    n = len(puntos)
+    duraciones = np.full((n, n), np.nan)
+    distancias = np.full((n, n), np.nan)
+    origenes = np.flatnonzero(faltan.any(axis=1))
+    destinos = np.flatnonzero(faltan.any(axis=0))
+
+    mitad = MAX_COORDENADAS_TABLE // 2
+    factor = 10 ** PRECISION
+
+    for i in range(0, len(origenes), mitad):
+        bloque_origenes = origenes[i:i + mitad]
+
+        for j in range(0, len(destinos), mitad):
+            bloque_destinos = destinos[j:j + mitad]
+            if not faltan[np.ix_(bloque_origenes, bloque_destinos)].any():
+                continue
+
+            # Coordenadas del bloque: origenes seguidos de destinos (sin repetir)
+            locales = list(dict.fromkeys(bloque_origenes.tolist() + bloque_destinos.tolist()))
+            posicion = {global_: local for local, global_ in enumerate(locales)}
+
+            resultado = OSMService.calcular_matriz(
+                [(puntos[k][0] / factor, puntos[k][1] / factor) for k in locales],
+                origenes=[posicion[o] for o in bloque_origenes.tolist()],
+                destinos=[posicion[d] for d in bloque_destinos.tolist()],
+            )
+            if resultado is None:
+                continue
+
+            # None (par sin ruta) queda como NaN
+            bloque = np.ix_(bloque_origenes, bloque_destinos)
+            duraciones[bloque] = np.array(resultado["duraciones"], dtype=np.float64)
+            distancias[bloque] = np.array(resultado["distancias"], dtype=np.float64)
+
+    return duraciones, distancias
+
+
+def _preparar(lats, lngs):
+    """
+    Matrices de los puntos únicos con lo que ya está en caché (LRU y, si no
+    son demasiados puntos, costo_tramo); NaN en los pares que faltan.
+    Se ejecuta en el hilo principal.
+    """
+    claves = [cuantizar(lat, lng) for lat, lng in zip(lats, lngs)]
+    puntos = list(dict.fromkeys(claves))
+    indice = {p: i for i, p in enumerate(puntos)}
+    n = len(puntos)
+
+    estado = {
+        "puntos": puntos,
+        "codigos": _codificar(puntos),
+        "posiciones": np.array([indice[c] for c in claves], dtype=np.int64),
+        "duraciones": np.full((n, n), np.nan),
+        "distancias": np.full((n, n), np.nan),
+    }
+    np.fill_diagonal(estado["duraciones"], 0.0)
+    np.fill_diagonal(estado["distancias"], 0.0)
+
+    # Pares resueltos desde la caché en memoria; luego costo_tramo y por último OSRM
+    _leer_cache(estado)
+    sumar("aciertos_cache", n * (n - 1) - int(np.isnan(estado["duraciones"]).sum()))
+
+    if n <= MAX_PUNTOS_BD and np.isnan(estado["duraciones"]).any():
+        sumar("aciertos_cache", _buscar_en_bd(estado))
+
+    return estado
+
+
+def _faltantes(estado):
+    return np.isnan(estado["duraciones"]) | np.isnan(estado["distancias"])
+
+
+def _integrar(estado, obtenidas):
+    """
+    Copia los pares obtenidos de OSRM a la matriz, al LRU y (si no son
+    demasiados puntos) a costo_tramo. Se ejecuta en el hilo principal.
+    """
+    duraciones, distancias = obtenidas
+    nuevos = _faltantes(estado) & ~np.isnan(duraciones) & ~np.isnan(distancias)
+    if not nuevos.any():
+        return
+
+    estado["duraciones"][nuevos] = duraciones[nuevos]
+    estado["distancias"][nuevos] = distancias[nuevos]
+    _guardar_en_cache(estado, nuevos)
+
+    if len(estado["puntos"]) <= MAX_PUNTOS_BD:
+        puntos = estado["puntos"]
+        CostoTramo.objects.bulk_create(
+            [
+                CostoTramo(
+                    origen_lat=puntos[i][0], origen_lng=puntos[i][1],
+                    destino_lat=puntos[j][0], destino_lng=puntos[j][1],
+                    duracion_s=float(duraciones[i, j]), distancia_m=float(distancias[i, j])
+                )
+                for i, j in zip(*np.nonzero(nuevos))
+            ],
+            ignore_conflicts=True,
+            batch_size=1000
+        )
+
+
+def _resultado(estado):
+    if _faltantes(estado).any():
+        return None
+
+    # Expandir a una fila/columna por punto original (puntos repetidos cuestan 0 entre sí)
+    posiciones = estado["posiciones"]
+    return (
+        estado["duraciones"][np.ix_(posiciones, posiciones)],
+        estado["distancias"][np.ix_(posiciones, posiciones)]
+    )
+
+
+def matriz_costos(lats, lngs):
+    """
+    Construye las matrices de duración (s) y distancia (m) por vía entre todos los puntos.
+
+    Args:
+        lats, lngs: arrays con las coordenadas (el orden se conserva en la matriz)
+
+    Returns:
+        (duraciones, distancias) como arrays (n x n) de NumPy,
+        o None si OSRM no pudo completar algún par
+    """
+    estado = _preparar(lats, lngs)
+
+    faltan = _faltantes(estado)
+    if faltan.any():
+        sumar("consultas_backend", int(faltan.sum()))
+        with cronometrar("tiempo_enrutamiento_ms"):
+            obtenidas = _consultar_osrm(estado["puntos"], faltan)
+        _integrar(estado, obtenidas)
+
+    return _resultado(estado)
+
+
+def _consultar_cronometrado(puntos, faltan):
+    inicio = time.perf_counter()
+    obtenidas = _consultar_osrm(puntos, faltan)
+    return obtenidas, (time.perf_counter() - inicio) * 1000
+
+
+def matrices_costos(puntos, mediciones=None):
+    """
+    matriz_costos de varias rutas. Las peticiones table que falten de todas
+    las rutas se hacen en paralelo en un pool de hilos acotado
+    (ROUTING_HILOS); la caché y costo_tramo se leen y escriben en este hilo.
+
+    Args:
+        puntos: lista de (lats, lngs) de cada ruta
+        mediciones: Medicion de cada ruta (opcional), donde se suman sus
+            aciertos de caché, consultas y tiempos de matriz y enrutamiento
+
+    Returns:
+        lista con (duraciones, distancias) o None de cada ruta
+    """
+    mediciones = mediciones or [nullcontext() for _ in puntos]
+
+    estados = []
+    for (lats, lngs), medicion in zip(puntos, mediciones):
+        with medicion, cronometrar("tiempo_matriz_ms"):
+            estados.append(_preparar(lats, lngs))
+
+    faltantes = [_faltantes(estado) for estado in estados]
+    pendientes = [k for k, faltan in enumerate(faltantes) if faltan.any()]
+
+    if pendientes:
+        # Solo peticiones de red en los hilos
+        with ThreadPoolExecutor(max_workers=min(settings.ROUTING_HILOS, len(pendientes))) as executor:
+            consultas = list(executor.map(
+                _consultar_cronometrado,
+                [estados[k]["puntos"] for k in pendientes],
+                [faltantes[k] for k in pendientes]
+            ))
+
+        for k, (obtenidas, ms) in zip(pendientes, consultas):
+            with mediciones[k]:
+                sumar("consultas_backend", int(faltantes[k].sum()))
+                sumar("tiempo_enrutamiento_ms", ms)
+                sumar("tiempo_matriz_ms", ms)
+                with cronometrar("tiempo_matriz_ms"):
+                    _integrar(estados[k], obtenidas)
+
+    return [_resultado(estado) for estado in estados]
+
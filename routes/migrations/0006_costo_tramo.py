@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0005_ruta_vehiculo_usado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostoTramo',
+            fields=[
+                ('id_costo', models.BigAutoField(primary_key=True, serialize=False)),
+                ('origen_lat', models.IntegerField()),
+                ('origen_lng', models.IntegerField()),
+                ('destino_lat', models.IntegerField()),
+                ('destino_lng', models.IntegerField()),
+                ('distancia_m', models.FloatField()),
+                ('duracion_s', models.FloatField()),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'costo_tramo',
+                'constraints': [models.UniqueConstraint(fields=('origen_lat', 'origen_lng', 'destino_lat', 'destino_lng'), name='costo_tramo_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0006_costo_tramo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespuestaRuta',
+            fields=[
+                ('clave', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('perfil', models.CharField(max_length=100)),
+                ('total_coordenadas', models.IntegerField()),
+                ('respuesta', models.JSONField()),
+                ('fecha_creacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expira', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'respuesta_ruta',
+            },
+        ),
+    ]
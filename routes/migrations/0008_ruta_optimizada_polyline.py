@@ -0,0 +1,100 @@
+# Convierte la geometría GeoJSON guardada en Ruta.ruta_optimizada a polilínea codificada
+
+from django.db import migrations
+
+
+PRECISION = 5
+
+
+# Copias fijas del codificador de routes.geometria para que la migración no
+# dependa de cambios futuros en ese módulo
+def codificar(coordinates, precision=PRECISION):
+    factor = 10 ** precision
+    caracteres = []
+    lat_previa = lng_previa = 0
+
+    for lng, lat in coordinates:
+        lat_actual = int(round(lat * factor))
+        lng_actual = int(round(lng * factor))
+
+        for delta in (lat_actual - lat_previa, lng_actual - lng_previa):
+            valor = ~(delta << 1) if delta < 0 else delta << 1
+            while valor >= 0x20:
+                caracteres.append(chr((0x20 | (valor & 0x1f)) + 63))
+                valor >>= 5
+            caracteres.append(chr(valor + 63))
+
+        lat_previa, lng_previa = lat_actual, lng_actual
+
+    return "".join(caracteres)
+
+
+def decodificar(texto, precision=PRECISION):
+    factor = 10 ** precision
+    valores = []
+    actual = desplazamiento = 0
+
+    for caracter in texto:
+        byte = ord(caracter) - 63
+        actual |= (byte & 0x1f) << desplazamiento
+        desplazamiento += 5
+        if byte < 0x20:
+            valores.append(~(actual >> 1) if actual & 1 else actual >> 1)
+            actual = desplazamiento = 0
+
+    coordinates = []
+    lat = lng = 0
+    for i in range(0, len(valores) - 1, 2):
+        lat += valores[i]
+        lng += valores[i + 1]
+        coordinates.append([lng / factor, lat / factor])
+
+    return coordinates
+
+
+def geojson_a_polyline(apps, schema_editor):
+    Ruta = apps.get_model("routes", "Ruta")
+
+    actualizadas = []
+    for ruta in Ruta.objects.exclude(ruta_optimizada__isnull=True).iterator():
+        datos = ruta.ruta_optimizada
+        if not isinstance(datos, dict) or "geometry" not in datos:
+            continue
+
+        geometry = datos.pop("geometry")
+        coordinates = geometry.get("coordinates") if geometry else None
+        datos["polyline"] = codificar(coordinates) if coordinates else None
+        datos["precision"] = PRECISION
+        actualizadas.append(ruta)
+
+    Ruta.objects.bulk_update(actualizadas, ["ruta_optimizada"], batch_size=500)
+
+
+def polyline_a_geojson(apps, schema_editor):
+    Ruta = apps.get_model("routes", "Ruta")
+
+    actualizadas = []
+    for ruta in Ruta.objects.exclude(ruta_optimizada__isnull=True).iterator():
+        datos = ruta.ruta_optimizada
+        if not isinstance(datos, dict) or "precision" not in datos:
+            continue
+
+        polyline = datos.pop("polyline", None)
+        precision = datos.pop("precision")
+        datos["geometry"] = (
+            {"type": "LineString", "coordinates": decodificar(polyline, precision)} if polyline else None
+        )
+        actualizadas.append(ruta)
+
+    Ruta.objects.bulk_update(actualizadas, ["ruta_optimizada"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0007_respuesta_ruta'),
+    ]
+
+    operations = [
+        migrations.RunPython(geojson_a_polyline, polyline_a_geojson),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0008_ruta_optimizada_polyline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoRuta',
+            fields=[
+                ('id_trabajo', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(default='calcular_ruta', max_length=30)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('En proceso', 'En proceso'), ('Completado', 'Completado'), ('Fallido', 'Fallido')], default='Pendiente', max_length=15)),
+                ('progreso', models.IntegerField(default=0)),
+                ('intentos', models.IntegerField(default=0)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('ruta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos', to='routes.ruta')),
+            ],
+            options={
+                'db_table': 'trabajo_ruta',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='trabajo_ruta_cola')],
+            },
+        ),
+    ]
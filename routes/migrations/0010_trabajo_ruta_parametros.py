@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0009_trabajo_ruta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoruta',
+            name='parametros',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0010_trabajo_ruta_parametros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantillaRuta',
+            fields=[
+                ('id_plantilla', models.AutoField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('inicio_lat', models.IntegerField()),
+                ('inicio_lng', models.IntegerField()),
+                ('punto_inicio', models.JSONField()),
+                ('paradas', models.JSONField()),
+                ('tramos', models.JSONField()),
+                ('geometria_tramos', models.JSONField()),
+                ('veces_usada', models.IntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fecha_ultimo_uso', models.DateTimeField(blank=True, null=True)),
+                ('ruta_origen', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='plantillas', to='routes.ruta')),
+            ],
+            options={
+                'db_table': 'plantilla_ruta',
+                'ordering': ['nombre'],
+                'indexes': [models.Index(fields=['inicio_lat', 'inicio_lng'], name='plantilla_ruta_inicio')],
+            },
+        ),
+    ]
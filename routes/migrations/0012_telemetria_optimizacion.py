@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0011_plantilla_ruta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelemetriaOptimizacion',
+            fields=[
+                ('id_telemetria', models.BigAutoField(primary_key=True, serialize=False)),
+                ('operacion', models.CharField(choices=[('calcular_ruta', 'Calcular ruta'), ('calcular_lote', 'Calcular lote')], default='calcular_ruta', max_length=15)),
+                ('algoritmo', models.CharField(blank=True, max_length=15)),
+                ('paradas', models.IntegerField(default=0)),
+                ('exito', models.BooleanField(default=True)),
+                ('estimado', models.BooleanField(default=False)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('tiempo_total_ms', models.IntegerField(blank=True, null=True)),
+                ('tiempo_matriz_ms', models.IntegerField(blank=True, null=True)),
+                ('tiempo_optimizacion_ms', models.IntegerField(blank=True, null=True)),
+                ('tiempo_enrutamiento_ms', models.IntegerField(blank=True, null=True)),
+                ('aciertos_cache', models.IntegerField(default=0)),
+                ('consultas_backend', models.IntegerField(default=0)),
+                ('distancia_recta_km', models.FloatField(blank=True, null=True)),
+                ('distancia_via_km', models.FloatField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('ruta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='telemetrias', to='routes.ruta')),
+            ],
+            options={
+                'db_table': 'telemetria_optimizacion',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mover_simplificaciones(apps, schema_editor):
+    """
+    Pasa las versiones simplificadas que las rutas guardaban dentro de
+    ruta_optimizada ("simplificaciones") a simplificacion_ruta, y quita
+    también "geometria_tramos", que ahora se deriva de indices_geometria.
+    """
+    Ruta = apps.get_model("routes", "Ruta")
+    SimplificacionRuta = apps.get_model("routes", "SimplificacionRuta")
+
+    actualizadas = []
+    nuevas = []
+    for ruta in Ruta.objects.exclude(ruta_optimizada__isnull=True).iterator():
+        datos = ruta.ruta_optimizada
+        if not isinstance(datos, dict) or not ({"simplificaciones", "geometria_tramos"} & datos.keys()):
+            continue
+
+        datos.pop("geometria_tramos", None)
+        for tolerancia, nivel in (datos.pop("simplificaciones", None) or {}).items():
+            nuevas.append(SimplificacionRuta(
+                ruta=ruta, tolerancia_m=int(float(tolerancia)),
+                polyline=nivel["polyline"], indices_geometria=nivel["indices_geometria"]
+            ))
+        actualizadas.append(ruta)
+
+    SimplificacionRuta.objects.bulk_create(nuevas, batch_size=500)
+    Ruta.objects.bulk_update(actualizadas, ["ruta_optimizada"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0012_telemetria_optimizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimplificacionRuta',
+            fields=[
+                ('id_simplificacion', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tolerancia_m', models.IntegerField()),
+                ('polyline', models.TextField()),
+                ('indices_geometria', models.JSONField(default=list)),
+                ('ruta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simplificaciones', to='routes.ruta')),
+            ],
+            options={
+                'db_table': 'simplificacion_ruta',
+                'ordering': ['tolerancia_m'],
+                'constraints': [models.UniqueConstraint(fields=('ruta', 'tolerancia_m'), name='simplificacion_ruta_unica')],
+            },
+        ),
+        migrations.RunPython(mover_simplificaciones, migrations.RunPython.noop),
+    ]
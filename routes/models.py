@@ -69,4 +69,198 @@ class EntregaPaquete(models.Model):
     lng_entrega = models.DecimalField(max_digits=11, decimal_places=8)
     
     class Meta:
-        db_table = "entrega_paquete"
\ No newline at end of file
+        db_table = "entrega_paquete"
+
+class CostoTramo(models.Model):
+    """
+    Costo real por vía (OSRM) entre dos puntos cuantizados.
+    Las coordenadas se guardan como enteros (grados * 10^PRECISION) para que
+    entregas repetidas al mismo edificio o base reutilicen el mismo registro.
+    """
+    id_costo = models.BigAutoField(primary_key=True)
+
+    origen_lat = models.IntegerField()
+    origen_lng = models.IntegerField()
+    destino_lat = models.IntegerField()
+    destino_lng = models.IntegerField()
+
+    distancia_m = models.FloatField()
+    duracion_s = models.FloatField()
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"({self.origen_lat}, {self.origen_lng}) -> ({self.destino_lat}, {self.destino_lng})"
+
+    class Meta:
+        db_table = "costo_tramo"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["origen_lat", "origen_lng", "destino_lat", "destino_lng"],
+                name="costo_tramo_unico"
+            )
+        ]
+
+
+class RespuestaRuta(models.Model):
+    """
+    Respuesta de ruta (geometría, distancia, duración y tramos) guardada por
+    el hash de la secuencia ordenada de coordenadas redondeadas y el perfil.
+    """
+    clave = models.CharField(max_length=64, primary_key=True)
+    perfil = models.CharField(max_length=100)
+    total_coordenadas = models.IntegerField()
+
+    respuesta = models.JSONField()
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    expira = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.perfil} ({self.total_coordenadas} puntos) {self.clave[:12]}"
+
+    class Meta:
+        db_table = "respuesta_ruta"
+
+
+class SimplificacionRuta(models.Model):
+    """
+    Versión simplificada (Douglas-Peucker) de la geometría de una ruta para
+    mapas con poco zoom. Se generan al guardar ruta_optimizada, una por nivel
+    de TOLERANCIAS_SIMPLIFICACION (ver routes/geometria.py), y se eligen con
+    ?tolerance= o ?zoom=.
+    """
+    id_simplificacion = models.BigAutoField(primary_key=True)
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name="simplificaciones")
+    tolerancia_m = models.IntegerField()
+
+    polyline = models.TextField()
+    indices_geometria = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"{self.ruta_id} ({self.tolerancia_m} m)"
+
+    class Meta:
+        db_table = "simplificacion_ruta"
+        ordering = ['tolerancia_m']
+        constraints = [
+            models.UniqueConstraint(fields=["ruta", "tolerancia_m"], name="simplificacion_ruta_unica")
+        ]
+
+
+class TrabajoRuta(models.Model):
+    """
+    Trabajo en cola para calcular una ruta fuera del ciclo de la petición.
+    Lo procesa el comando procesar_trabajos (proceso worker).
+    """
+    class EstadoTrabajo(models.TextChoices):
+        PENDIENTE = "Pendiente", "Pendiente"
+        EN_PROCESO = "En proceso", "En proceso"
+        COMPLETADO = "Completado", "Completado"
+        FALLIDO = "Fallido", "Fallido"
+
+
+    id_trabajo = models.BigAutoField(primary_key=True)
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name="trabajos")
+    tipo = models.CharField(max_length=30, default="calcular_ruta")
+    parametros = models.JSONField(default=dict, blank=True)
+
+    estado = models.CharField(choices=EstadoTrabajo, default=EstadoTrabajo.PENDIENTE, max_length=15)
+    progreso = models.IntegerField(default=0)
+    intentos = models.IntegerField(default=0)
+
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id_trabajo} ({self.ruta_id}) {self.estado}"
+
+    class Meta:
+        db_table = "trabajo_ruta"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=["estado", "fecha_creacion"], name="trabajo_ruta_cola")
+        ]
+
+
+class PlantillaRuta(models.Model):
+    """
+    Secuencia de paradas con nombre guardada desde una ruta ya calculada,
+    con sus tramos y geometría por tramo. Rutas nuevas desde el mismo punto
+    de inicio y con casi las mismas direcciones reutilizan el orden y la
+    geometría en lugar de optimizar y enrutar desde cero (ver routes/plantillas.py).
+    """
+    id_plantilla = models.AutoField(primary_key=True)
+    nombre = models.CharField(max_length=100, unique=True)
+
+    # Punto de inicio cuantizado como en costo_tramo, para buscar candidatas por índice
+    inicio_lat = models.IntegerField()
+    inicio_lng = models.IntegerField()
+    punto_inicio = models.JSONField()
+
+    # [{"lat", "lng", "direccion"}] en orden de visita, y para cada parada el
+    # tramo que llega a ella (distancia/duración y polilínea)
+    paradas = models.JSONField()
+    tramos = models.JSONField()
+    geometria_tramos = models.JSONField()
+
+    ruta_origen = models.ForeignKey(Ruta, on_delete=models.SET_NULL, null=True, blank=True, related_name="plantillas")
+    veces_usada = models.IntegerField(default=0)
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    fecha_ultimo_uso = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.nombre} ({len(self.paradas)} paradas)"
+
+    class Meta:
+        db_table = "plantilla_ruta"
+        ordering = ['nombre']
+        indexes = [
+            models.Index(fields=["inicio_lat", "inicio_lng"], name="plantilla_ruta_inicio")
+        ]
+
+
+class TelemetriaOptimizacion(models.Model):
+    """
+    Una fila por cada optimización de ruta (calcular_ruta, lote o trabajo
+    fallido): tamaño, algoritmo, tiempos, uso de caché y distancias, para ver
+    percentiles de tiempo y calidad en producción (ver routes/telemetria.py).
+    Los tiempos están en ms; los que no aplican quedan en null.
+    """
+    class Operacion(models.TextChoices):
+        CALCULAR_RUTA = "calcular_ruta", "Calcular ruta"
+        CALCULAR_LOTE = "calcular_lote", "Calcular lote"
+
+
+    id_telemetria = models.BigAutoField(primary_key=True)
+    ruta = models.ForeignKey(Ruta, on_delete=models.SET_NULL, null=True, blank=True, related_name="telemetrias")
+    operacion = models.CharField(choices=Operacion, default=Operacion.CALCULAR_RUTA, max_length=15)
+    algoritmo = models.CharField(max_length=15, blank=True)
+    paradas = models.IntegerField(default=0)
+
+    exito = models.BooleanField(default=True)
+    estimado = models.BooleanField(default=False)
+    error = models.CharField(max_length=255, blank=True)
+
+    tiempo_total_ms = models.IntegerField(null=True, blank=True)
+    tiempo_matriz_ms = models.IntegerField(null=True, blank=True)
+    tiempo_optimizacion_ms = models.IntegerField(null=True, blank=True)
+    tiempo_enrutamiento_ms = models.IntegerField(null=True, blank=True)
+
+    # Segmentos de ruta y pares de la matriz resueltos desde caché frente a los pedidos al backend
+    aciertos_cache = models.IntegerField(default=0)
+    consultas_backend = models.IntegerField(default=0)
+
+    distancia_recta_km = models.FloatField(null=True, blank=True)
+    distancia_via_km = models.FloatField(null=True, blank=True)
+
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.operacion} {self.algoritmo} ({self.paradas} paradas) {self.tiempo_total_ms} ms"
+
+    class Meta:
+        db_table = "telemetria_optimizacion"
+        ordering = ['-fecha']
@@ -0,0 +1,654 @@
+"""
+Motor de optimización del orden de entrega.
+
+El recorrido siempre sale de la base del conductor (nodo 0) y termina en la
+última entrega, es decir, es un camino abierto. Para poder usar los movimientos
+clásicos de mejora sin casos especiales se agrega un nodo ficticio al final con
+costo 0 hacia y desde cualquier nodo: así el recorrido queda con ambos extremos
+fijos (base y ficticio) y cualquier parada puede ser la última sin penalización.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .geodesia import preparar_puntos, matriz_distancias, distancias_tramos
+
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-9
+
+MIN_PARADAS_MULTIARRANQUE = 8  # Con menos paradas la búsqueda local ya es exacta en la práctica
+MARGEN_PRESUPUESTO_S = 0.05     # Espera extra por los procesos al vencer el presupuesto
+MAX_PRESUPUESTO_MS = 60_000
+
+
+def cargar_coordenadas(paquetes):
+    """
+    Carga los paquetes de un queryset directamente en arrays de NumPy.
+    Evita instanciar los modelos completos usando values_list.
+
+    Returns:
+        (ids, lats, lngs) como arrays de NumPy
+    """
+    filas = list(paquetes.values_list("id_paquete", "lat", "lng"))
+
+    if not filas:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+    ids = np.fromiter((fila[0] for fila in filas), dtype=np.int64, count=len(filas))
+    coordenadas = np.array([(fila[1], fila[2]) for fila in filas], dtype=np.float64)
+
+    return ids, coordenadas[:, 0], coordenadas[:, 1]
+
+
+def matriz_haversine(lats, lngs, modo="haversine"):
+    """
+    Matriz de distancias (km) entre todos los puntos (ver routes/geodesia.py).
+    """
+    return matriz_distancias(preparar_puntos(lats, lngs), modo=modo)
+
+
+def longitud_recorrido(recorrido, matriz):
+    """
+    Costo total de recorrer los nodos en el orden dado.
+    """
+    recorrido = np.asarray(recorrido)
+    if len(recorrido) < 2:
+        return 0.0
+    return float(matriz[recorrido[:-1], recorrido[1:]].sum())
+
+
+def vecino_mas_cercano(matriz, inicio=0):
+    """
+    Construye un recorrido con Nearest Neighbor usando una máscara de visitados,
+    sin copiar ni reconstruir listas en cada paso.
+    """
+    n = len(matriz)
+    visitados = np.zeros(n, dtype=bool)
+    recorrido = np.empty(n, dtype=np.int64)
+
+    actual = inicio
+    visitados[actual] = True
+    recorrido[0] = actual
+
+    for paso in range(1, n):
+        distancias = np.where(visitados, np.inf, matriz[actual])
+        actual = int(np.argmin(distancias))
+        visitados[actual] = True
+        recorrido[paso] = actual
+
+    return recorrido
+
+
+def _vencido(limite):
+    return limite is not None and time.monotonic() >= limite
+
+
+def mejorar_2opt(recorrido, matriz, max_iteraciones=50, limite=None):
+    """
+    Mejora 2-opt con los extremos del recorrido fijos.
+
+    Para cada posición i se evalúan de forma vectorizada todas las inversiones
+    del tramo [i, j] y se aplica la mejor. Las sumas acumuladas de los arcos en
+    ambos sentidos permiten que el cálculo sea correcto también con matrices
+    asimétricas (tiempos o distancias reales por vía).
+    Si se da limite (time.monotonic) se detiene al vencer y devuelve lo mejorado.
+    """
+    recorrido = np.array(recorrido, dtype=np.int64)
+    m = len(recorrido)
+    if m < 4:
+        return recorrido
+
+    def acumulados(recorrido):
+        ida = matriz[recorrido[:-1], recorrido[1:]]
+        vuelta = matriz[recorrido[1:], recorrido[:-1]]
+        return (
+            np.concatenate(([0.0], np.cumsum(ida))),
+            np.concatenate(([0.0], np.cumsum(vuelta))),
+        )
+
+    for _ in range(max_iteraciones):
+        mejorado = False
+        acumulado_ida, acumulado_vuelta = acumulados(recorrido)
+
+        for i in range(1, m - 2):
+            if _vencido(limite):
+                return recorrido
+
+            j = np.arange(i + 1, m - 1)
+            anterior = recorrido[i - 1]
+            primero = recorrido[i]
+            ultimos = recorrido[j]
+            siguientes = recorrido[j + 1]
+
+            delta = (
+                matriz[anterior, ultimos] + matriz[primero, siguientes]
+                - matriz[anterior, primero] - matriz[ultimos, siguientes]
+                + (acumulado_vuelta[j] - acumulado_vuelta[i])
+                - (acumulado_ida[j] - acumulado_ida[i])
+            )
+
+            mejor = int(np.argmin(delta))
+            if delta[mejor] < -EPSILON:
+                fin = j[mejor]
+                recorrido[i:fin + 1] = recorrido[i:fin + 1][::-1]
+                acumulado_ida, acumulado_vuelta = acumulados(recorrido)
+                mejorado = True
+
+        if not mejorado:
+            break
+
+    return recorrido
+
+
+def mejorar_or_opt(recorrido, matriz, max_segmento=3, max_iteraciones=50, limite=None):
+    """
+    Mejora Or-opt: reubica segmentos de 1 a max_segmento paradas consecutivas
+    en la posición más barata del recorrido (en su sentido original o invertido).
+    Todas las posiciones de inserción de un segmento se evalúan vectorizadas.
+    Si se da limite (time.monotonic) se detiene al vencer y devuelve lo mejorado.
+    """
+    recorrido = np.array(recorrido, dtype=np.int64)
+    m = len(recorrido)
+    if m < 4:
+        return recorrido
+
+    for _ in range(max_iteraciones):
+        mejorado = False
+
+        for largo in range(1, max_segmento + 1):
+            a = recorrido[:-1]
+            b = recorrido[1:]
+            costo_arcos = matriz[a, b]
+            posiciones = np.arange(m - 1)
+
+            i = 1
+            while i + largo <= m - 1:
+                if _vencido(limite):
+                    return recorrido
+
+                segmento = recorrido[i:i + largo]
+                anterior = recorrido[i - 1]
+                siguiente = recorrido[i + largo]
+                primero, ultimo = segmento[0], segmento[-1]
+
+                ahorro = (
+                    matriz[anterior, primero] + matriz[ultimo, siguiente]
+                    - matriz[anterior, siguiente]
+                )
+
+                interno_ida = matriz[segmento[:-1], segmento[1:]].sum()
+                interno_vuelta = matriz[segmento[1:], segmento[:-1]].sum()
+
+                # Solo son candidatos los arcos (a, b) que no tocan el segmento
+                validos = (posiciones < i - 1) | (posiciones > i + largo - 1)
+
+                costo_directo = matriz[a, primero] + matriz[ultimo, b] - costo_arcos
+                costo_invertido = (
+                    matriz[a, ultimo] + matriz[primero, b] - costo_arcos
+                    + interno_vuelta - interno_ida
+                )
+                costo = np.where(validos, np.minimum(costo_directo, costo_invertido), np.inf)
+
+                mejor = int(np.argmin(costo))
+                if costo[mejor] - ahorro < -EPSILON:
+                    if costo_invertido[mejor] < costo_directo[mejor]:
+                        segmento = segmento[::-1]
+
+                    if mejor < i:
+                        recorrido = np.concatenate((
+                            recorrido[:mejor + 1], segmento,
+                            recorrido[mejor + 1:i], recorrido[i + largo:]
+                        ))
+                    else:
+                        recorrido = np.concatenate((
+                            recorrido[:i], recorrido[i + largo:mejor + 1],
+                            segmento, recorrido[mejor + 1:]
+                        ))
+
+                    a = recorrido[:-1]
+                    b = recorrido[1:]
+                    costo_arcos = matriz[a, b]
+                    mejorado = True
+
+                i += 1
+
+        if not mejorado:
+            break
+
+    return recorrido
+
+
+def optimizar_recorrido(matriz, max_iteraciones=50):
+    """
+    Calcula el orden de visita de un camino abierto que inicia en el nodo 0.
+
+    Args:
+        matriz: matriz (n x n) de costos donde el nodo 0 es el punto de partida
+
+    Returns:
+        array con los índices de las paradas (1..n-1) en orden de visita
+    """
+    n = len(matriz)
+    if n <= 2:
+        return np.arange(1, n, dtype=np.int64)
+
+    # Nodo ficticio de cierre con costo 0 (camino abierto)
+    extendida = np.zeros((n + 1, n + 1), dtype=np.float64)
+    extendida[:n, :n] = matriz
+
+    recorrido = vecino_mas_cercano(matriz, inicio=0)
+    recorrido = np.append(recorrido, n)
+
+    recorrido = mejorar_2opt(recorrido, extendida, max_iteraciones=max_iteraciones)
+    recorrido = mejorar_or_opt(recorrido, extendida, max_iteraciones=max_iteraciones)
+
+    return recorrido[1:-1]
+
+
+# Matriz de costos compartida con los procesos de la búsqueda multiarranque
+_matriz_compartida = None
+_memoria_compartida = None
+
+
+def _iniciar_proceso(nombre, forma):
+    global _matriz_compartida, _memoria_compartida
+    _memoria_compartida = shared_memory.SharedMemory(name=nombre)
+    _matriz_compartida = np.ndarray(forma, dtype=np.float64, buffer=_memoria_compartida.buf)
+
+
+def _vecino_aleatorio(matriz, rng, candidatos=3):
+    """
+    Nearest Neighbor aleatorizado sobre la matriz extendida (último nodo
+    ficticio): en cada paso se elige al azar entre los candidatos más cercanos.
+    """
+    n = len(matriz) - 1
+    visitados = np.zeros(n, dtype=bool)
+    recorrido = np.empty(n + 1, dtype=np.int64)
+
+    actual = 0
+    visitados[0] = True
+    recorrido[0] = 0
+
+    for paso in range(1, n):
+        distancias = np.where(visitados, np.inf, matriz[actual, :n])
+        k = min(candidatos, n - paso)
+        actual = int(rng.choice(np.argpartition(distancias, k - 1)[:k]))
+        visitados[actual] = True
+        recorrido[paso] = actual
+
+    recorrido[n] = n
+    return recorrido
+
+
+def _doble_puente(recorrido, rng):
+    """
+    Perturbación double-bridge sobre las posiciones internas (extremos fijos).
+    """
+    p1, p2, p3 = np.sort(rng.choice(np.arange(1, len(recorrido) - 1), size=3, replace=False))
+    return np.concatenate((recorrido[:p1], recorrido[p2:p3], recorrido[p1:p2], recorrido[p3:]))
+
+
+def _busqueda_aleatoria(semilla, limite, inicial, matriz=None):
+    """
+    Búsqueda local iterada hasta el límite de tiempo: un arranque con Nearest
+    Neighbor aleatorizado y luego perturbaciones double-bridge de la mejor
+    solución propia, cada una mejorada con 2-opt y Or-opt.
+
+    Returns:
+        (mejor recorrido, costo)
+    """
+    matriz = _matriz_compartida if matriz is None else matriz
+    rng = np.random.default_rng(semilla)
+
+    mejor = np.asarray(inicial, dtype=np.int64)
+    mejor_costo = longitud_recorrido(mejor, matriz)
+    candidato = _vecino_aleatorio(matriz, rng)
+
+    while not _vencido(limite):
+        candidato = mejorar_2opt(candidato, matriz, limite=limite)
+        candidato = mejorar_or_opt(candidato, matriz, limite=limite)
+
+        costo = longitud_recorrido(candidato, matriz)
+        if costo < mejor_costo - EPSILON:
+            mejor, mejor_costo = candidato, costo
+
+        candidato = _doble_puente(mejor, rng)
+
+    return mejor, mejor_costo
+
+
+def optimizar_multiarranque(matriz, presupuesto_ms, procesos=None, semilla=0):
+    """
+    Igual que optimizar_recorrido pero usando un presupuesto de tiempo: tras
+    la solución determinista, varios procesos (memoria compartida con la
+    matriz) prueban arranques aleatorios y se queda el mejor recorrido.
+    Siempre retorna la mejor solución encontrada al vencer el presupuesto.
+
+    Args:
+        matriz: matriz (n x n) de costos donde el nodo 0 es el punto de partida
+        presupuesto_ms: tiempo total disponible en milisegundos
+        procesos: procesos a usar (por defecto, todos los núcleos; 1 = en este proceso)
+
+    Returns:
+        array con los índices de las paradas (1..n-1) en orden de visita
+    """
+    limite = time.monotonic() + presupuesto_ms / 1000
+    n = len(matriz)
+    if n <= 2:
+        return np.arange(1, n, dtype=np.int64)
+
+    extendida = np.zeros((n + 1, n + 1), dtype=np.float64)
+    extendida[:n, :n] = matriz
+
+    # Solución determinista: es el resultado si no alcanza el tiempo para más
+    mejor = np.append(vecino_mas_cercano(matriz, inicio=0), n)
+    mejor = mejorar_2opt(mejor, extendida, limite=limite)
+    mejor = mejorar_or_opt(mejor, extendida, limite=limite)
+
+    procesos = procesos or os.cpu_count() or 1
+    if n < MIN_PARADAS_MULTIARRANQUE or _vencido(limite):
+        return mejor[1:-1]
+
+    if procesos == 1:
+        return _busqueda_aleatoria(semilla, limite, mejor, matriz=extendida)[0][1:-1]
+
+    mejor_costo = longitud_recorrido(mejor, extendida)
+    memoria = shared_memory.SharedMemory(create=True, size=extendida.nbytes)
+    executor = None
+    try:
+        np.ndarray(extendida.shape, dtype=np.float64, buffer=memoria.buf)[:] = extendida
+
+        executor = ProcessPoolExecutor(
+            max_workers=procesos,
+            initializer=_iniciar_proceso,
+            initargs=(memoria.name, extendida.shape)
+        )
+        futuros = [executor.submit(_busqueda_aleatoria, semilla + k, limite, mejor) for k in range(procesos)]
+        terminados, _ = wait(futuros, timeout=max(limite - time.monotonic(), 0) + MARGEN_PRESUPUESTO_S)
+
+        for futuro in terminados:
+            try:
+                recorrido, costo = futuro.result()
+            except Exception:
+                logger.exception("Error en arranque del optimizador")
+                continue
+            if costo < mejor_costo - EPSILON:
+                mejor, mejor_costo = recorrido, costo
+    finally:
+        # Los procesos que no terminaron a tiempo se descartan (también si hubo un error)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        memoria.close()
+        memoria.unlink()
+
+    return mejor[1:-1]
+
+
+def _optimizar_zona(argumentos):
+    """
+    Orden de las paradas de una zona. Se ejecuta en un proceso del pool.
+
+    Args:
+        argumentos: (matriz, fin_fijo) donde el nodo 0 es la entrada a la zona
+                    y, si fin_fijo, el último nodo es la salida hacia la siguiente
+
+    Returns:
+        array con los nodos de la zona en orden de visita (empieza en 0)
+    """
+    matriz, fin_fijo = argumentos
+    n = len(matriz)
+    if not fin_fijo:
+        return np.concatenate(([0], optimizar_recorrido(matriz)))
+    if n <= 3:
+        return np.arange(n, dtype=np.int64)
+
+    # Nearest Neighbor sin la salida y luego mejoras con ambos extremos fijos
+    recorrido = np.append(vecino_mas_cercano(matriz[:-1, :-1], inicio=0), n - 1)
+    recorrido = mejorar_2opt(recorrido, matriz)
+    return mejorar_or_opt(recorrido, matriz)
+
+
+def optimizar_por_zonas(puntos, zonas, matriz=None, modo="haversine", procesos=None, matriz_bloque=None):
+    """
+    Partición y unión por zonas (localidades) para rutas muy grandes.
+
+    1. Las zonas se ordenan como un recorrido abierto sobre sus centros,
+       saliendo de la base.
+    2. Entre cada zona y la siguiente se unen los dos puntos más cercanos: el
+       de la zona actual es su salida y el de la siguiente su entrada. La
+       entrada de la primera zona es su punto más cercano a la base.
+    3. Cada zona se optimiza por separado con la entrada y la salida fijas
+       (la última solo con la entrada) en un pool de procesos.
+
+    Cada subproblema es cuadrático solo en el tamaño de su zona y nunca se
+    construye la matriz completa, a cambio de no cruzar una zona dos veces.
+
+    Args:
+        puntos: PuntosGeodesicos con la base en la posición 0
+        zonas: etiqueta de zona de cada parada (len(puntos) - 1)
+        matriz: matriz de costos opcional (len(puntos) x len(puntos)); si no
+                se envía se usa la distancia en línea recta
+        procesos: procesos del pool (por defecto, todos los núcleos)
+        matriz_bloque: en lugar de matriz, función (lats, lngs) -> matrices
+                (duraciones, distancias) o None, como matriz_costos; se pide
+                solo el bloque de cada zona (con la base para la primera) y el
+                de cada par de zonas consecutivas. Un bloque que no se obtiene
+                usa la distancia en línea recta: cada decisión compara costos
+                de un solo bloque, así que no se mezclan unidades
+
+    Returns:
+        array con los índices de las paradas (1..n) en orden de visita
+    """
+    zonas = np.asarray(zonas)
+
+    def costos(filas, columnas):
+        if matriz is not None:
+            return np.asarray(matriz, dtype=np.float64)[np.ix_(filas, columnas)]
+        if matriz_bloque is not None:
+            nodos, posiciones = np.unique(np.concatenate((filas, columnas)), return_inverse=True)
+            bloque = matriz_bloque(np.degrees(puntos.lat[nodos]), np.degrees(puntos.lng[nodos]))
+            if bloque is not None:
+                return bloque[0][np.ix_(posiciones[:len(filas)], posiciones[len(filas):])]
+        return matriz_distancias(puntos[filas], puntos[columnas], modo=modo).astype(np.float64)
+
+    etiquetas, por_nodo = np.unique(zonas, return_inverse=True)
+    miembros = [np.flatnonzero(por_nodo == z) + 1 for z in range(len(etiquetas))]
+
+    # 1. Orden de las zonas por sus centros
+    centros = np.array([[puntos.lat[m].mean(), puntos.lng[m].mean()] for m in miembros])
+    centros = np.degrees(np.vstack(([[puntos.lat[0], puntos.lng[0]]], centros)))
+    orden_zonas = optimizar_recorrido(matriz_distancias(preparar_puntos(centros[:, 0], centros[:, 1]))) - 1
+
+    # 2. Entrada y salida de cada zona
+    entradas = {}
+    salidas = {}
+    anterior = np.array([0])
+    for k, zona in enumerate(orden_zonas):
+        nodos = miembros[zona]
+        if k == 0:
+            entradas[zona] = int(nodos[np.argmin(costos(anterior, nodos)[0])])
+        if k == len(orden_zonas) - 1:
+            break
+
+        siguiente = miembros[orden_zonas[k + 1]]
+        candidatos = nodos[nodos != entradas[zona]] if len(nodos) > 1 else nodos
+        bloque = costos(candidatos, siguiente)
+        fila, columna = np.unravel_index(int(np.argmin(bloque)), bloque.shape)
+        salidas[zona] = int(candidatos[fila])
+        entradas[orden_zonas[k + 1]] = int(siguiente[columna])
+
+    # 3. Cada zona con sus extremos fijos, en paralelo
+    nodos_por_zona = []
+    for zona in orden_zonas:
+        interiores = [int(i) for i in miembros[zona] if i != entradas[zona] and i != salidas.get(zona)]
+        nodos_por_zona.append(np.array(
+            [entradas[zona]] + interiores + ([salidas[zona]] if zona in salidas and salidas[zona] != entradas[zona] else []),
+            dtype=np.int64
+        ))
+    tareas = [
+        (costos(nodos, nodos), zona in salidas and len(nodos) > 1)
+        for zona, nodos in zip(orden_zonas, nodos_por_zona)
+    ]
+
+    procesos = min(procesos or os.cpu_count() or 1, len(tareas))
+    if procesos > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            locales = list(executor.map(_optimizar_zona, tareas))
+    else:
+        locales = [_optimizar_zona(tarea) for tarea in tareas]
+
+    return np.concatenate([nodos[local] for nodos, local in zip(nodos_por_zona, locales)])
+
+
+def agrupar_paradas(lats, lngs, radio_m):
+    """
+    Agrupa en una sola parada los paquetes que están a lo sumo a radio_m
+    metros del primer paquete de la parada (mismo edificio o torre). Los
+    puntos se ubican en una rejilla de celdas del tamaño del radio, así cada
+    paquete solo se compara con las paradas de las celdas vecinas.
+
+    Es la única regla de "misma parada": la usan el optimizador, las rutas
+    por vía (routes/enrutamiento.py) y las plantillas (routes/plantillas.py).
+
+    Returns:
+        (grupos, lideres): grupos[i] es la parada del paquete i y lideres[p]
+        el índice del paquete que representa la parada p (el primero)
+    """
+    n = len(lats)
+    if radio_m <= 0 or n < 2:
+        return np.arange(n, dtype=np.int64), np.arange(n, dtype=np.int64)
+
+    planas = preparar_puntos(lats, lngs).planas().astype(np.float64) * 1000
+    celdas = np.floor(planas / radio_m).astype(np.int64).tolist()
+    radio2 = radio_m * radio_m
+
+    grupos = np.empty(n, dtype=np.int64)
+    lideres = []
+    por_celda = {}
+    for i, (cx, cy) in enumerate(celdas):
+        x, y = planas[i]
+        parada = next(
+            (
+                p
+                for vecina in ((cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+                for p in por_celda.get(vecina, ())
+                if (planas[lideres[p], 0] - x) ** 2 + (planas[lideres[p], 1] - y) ** 2 <= radio2
+            ),
+            None
+        )
+        if parada is None:
+            parada = len(lideres)
+            lideres.append(i)
+            por_celda.setdefault((cx, cy), []).append(parada)
+        grupos[i] = parada
+
+    return grupos, np.array(lideres, dtype=np.int64)
+
+
+def optimizar_paradas(start_lat, start_lng, lats, lngs, matriz=None, presupuesto_ms=None, procesos=None,
+                      modo="haversine", radio_parada_m=0, zonas=None, paradas=None, matriz_bloque=None):
+    """
+    Ordena las paradas partiendo desde (start_lat, start_lng).
+
+    Args:
+        lats, lngs: arrays con las coordenadas de las paradas
+        matriz: matriz de costos opcional (n+1 x n+1, con la base en la posición 0),
+                o solo de la base y los líderes de cada parada (p+1 x p+1).
+                Si no se envía se usa la distancia en línea recta.
+        presupuesto_ms: si se envía, se usa la búsqueda multiarranque con ese tiempo
+        procesos: procesos de la búsqueda multiarranque (por defecto, todos los núcleos)
+        modo: kernel de distancia cuando no se envía matriz ("haversine" o "equirectangular")
+        radio_parada_m: si es mayor que 0, los paquetes a esa distancia se
+                        optimizan como una sola parada (ver agrupar_paradas) y
+                        quedan consecutivos en el orden resultante
+        paradas: (grupos, lideres) de agrupar_paradas si ya se calcularon
+                 (p. ej. para pedir la matriz solo de los líderes); reemplaza
+                 a radio_parada_m
+        zonas: etiqueta de zona (p. ej. localidad) de cada parada; si hay más
+               de una, se optimiza por partición y unión (ver optimizar_por_zonas)
+               y presupuesto_ms no se usa
+        matriz_bloque: con zonas y sin matriz, función que entrega la matriz de
+               costos de un grupo de puntos (ver optimizar_por_zonas), para no
+               construir la matriz completa
+
+    Returns:
+        (orden, distancia_km) donde orden son los índices de las paradas
+        y distancia_km la longitud en línea recta del recorrido resultante
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+
+    puntos = preparar_puntos(np.concatenate(([start_lat], lats)), np.concatenate(([start_lng], lngs)))
+
+    # Nodos que entran a la optimización: la base y el primer paquete de cada parada
+    grupos, lideres = paradas if paradas is not None else agrupar_paradas(lats, lngs, radio_parada_m)
+    nodos = np.concatenate(([0], lideres + 1))
+
+    zonas_nodos = None if zonas is None else np.asarray(zonas)[lideres]
+
+    if zonas_nodos is not None and len(np.unique(zonas_nodos)) > 1:
+        submatriz = None
+        if matriz is not None:
+            submatriz = np.asarray(matriz, dtype=np.float64)
+            submatriz = submatriz[np.ix_(nodos, nodos)] if len(nodos) < len(submatriz) else submatriz
+        orden = optimizar_por_zonas(
+            puntos if len(nodos) == len(puntos) else puntos[nodos], zonas_nodos,
+            matriz=submatriz, modo=modo, procesos=procesos, matriz_bloque=matriz_bloque
+        )
+    else:
+        if matriz is None:
+            costos = matriz_distancias(puntos if len(nodos) == len(puntos) else puntos[nodos], modo=modo)
+        else:
+            costos = np.asarray(matriz, dtype=np.float64)
+            if len(nodos) < len(costos):
+                costos = costos[np.ix_(nodos, nodos)]
+
+        if presupuesto_ms:
+            orden = optimizar_multiarranque(costos, presupuesto_ms, procesos=procesos)
+        else:
+            orden = optimizar_recorrido(costos)
+
+    if len(lideres) < len(lats):
+        # Cada parada se expande en sus paquetes, consecutivos y en su orden original
+        posicion = np.empty(len(lideres), dtype=np.int64)
+        posicion[orden - 1] = np.arange(len(orden))
+        orden = np.argsort(posicion[grupos], kind="stable") + 1
+
+    # La distancia reportada siempre es Haversine, solo sobre los tramos del recorrido
+    distancia_km = float(distancias_tramos(puntos[np.concatenate(([0], orden))]).sum())
+
+    return orden - 1, distancia_km
+
+
+def insercion_mas_barata(matriz, recorrido, nuevos):
+    """
+    Inserta cada nodo nuevo en la posición más barata de un recorrido abierto
+    ya optimizado (que inicia en recorrido[0]), sin reordenar el resto.
+    Cada inserción es O(n) y se evalúa vectorizada.
+
+    Returns:
+        array con el recorrido resultante
+    """
+    n = len(matriz)
+
+    # Nodo ficticio de cierre: insertar al final cuesta solo el arco de llegada
+    extendida = np.zeros((n + 1, n + 1), dtype=np.float64)
+    extendida[:n, :n] = matriz
+
+    recorrido = np.append(np.asarray(recorrido, dtype=np.int64), n)
+
+    for nodo in nuevos:
+        a = recorrido[:-1]
+        b = recorrido[1:]
+        costos = extendida[a, nodo] + extendida[nodo, b] - extendida[a, b]
+        posicion = int(np.argmin(costos))
+        recorrido = np.insert(recorrido, posicion + 1, nodo)
+
+    return recorrido[:-1]
@@ -0,0 +1,822 @@
+"""
+Planificador de flota (VRP capacitado con múltiples bases).
+
+Cada conductor disponible aporta una ruta que sale de su base y tiene la
+capacidad (peso y volumen) de su tipo de vehículo. El plan se construye en
+tres pasos:
+
+1. Asignación por arrepentimiento (regret): los paquetes cuya base más
+   cercana es mucho mejor que la segunda se asignan primero.
+2. Orden de cada ruta con el optimizador (Nearest Neighbor + 2-opt + Or-opt).
+3. Búsqueda local entre rutas: se mueve un paquete a la posición más barata
+   de otra ruta si baja el total de km y cabe en el vehículo.
+
+Sobre rutas Pendientes ya armadas, planificar_reentregas inserta los paquetes
+fallidos y rebalancear_rutas reubica o intercambia paquetes entre ellas.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from drivers.models import Driver
+from packages.models import Paquete
+from vehicles.models import Vehiculo
+
+from .models import Ruta, SimplificacionRuta
+from .geodesia import distancias_tramos
+from .optimizador import (
+    matriz_haversine, optimizar_recorrido, optimizar_multiarranque, EPSILON
+)
+
+
+def _demandas(medidas):
+    """
+    [peso, volumen] de cada paquete a partir de filas (peso, largo, ancho, alto, cantidad).
+    """
+    medidas = np.asarray(medidas, dtype=np.float64).reshape(-1, 5)
+    cantidad = np.maximum(medidas[:, 4], 1)
+    return np.column_stack((
+        medidas[:, 0] * cantidad,
+        medidas[:, 1] * medidas[:, 2] * medidas[:, 3] * cantidad
+    ))
+
+
+def _costos_insercion(matriz, secuencia, nodo):
+    """
+    Costo de insertar nodo en cada arco de la secuencia (base ... ficticio).
+    """
+    a = secuencia[:-1]
+    b = secuencia[1:]
+    return matriz[a, nodo] + matriz[nodo, b] - matriz[a, b]
+
+
+def _secuencia(base, nodos, ficticio):
+    return np.concatenate(([base], nodos, [ficticio])).astype(np.int64)
+
+
+def reubicar_entre_rutas(matriz, bases, rutas, cargas, capacidades, demandas, max_pasadas=10):
+    """
+    Mueve paquetes de una ruta a la posición más barata de otra mientras
+    disminuya la distancia total y se respeten las capacidades.
+
+    Args:
+        matriz: matriz de costos con un nodo ficticio de costo 0 en la última posición
+        bases: nodo de inicio de cada ruta
+        rutas: lista de arrays con los nodos (sin base) de cada ruta, en orden
+        cargas: array (rutas x 2) con la carga actual; se actualiza en el lugar
+        capacidades: array (rutas x 2)
+        demandas: dict nodo -> array [peso, volumen]
+
+    Returns:
+        (rutas, conjunto de índices de rutas modificadas)
+    """
+    ficticio = len(matriz) - 1
+    tocadas = set()
+
+    for _ in range(max_pasadas):
+        mejorado = False
+
+        for origen in range(len(rutas)):
+            posicion = 0
+            while posicion < len(rutas[origen]):
+                secuencia = _secuencia(bases[origen], rutas[origen], ficticio)
+                nodo = secuencia[posicion + 1]
+                anterior, siguiente = secuencia[posicion], secuencia[posicion + 2]
+                ahorro = matriz[anterior, nodo] + matriz[nodo, siguiente] - matriz[anterior, siguiente]
+
+                mejor_costo, mejor_destino, mejor_arco = ahorro - EPSILON, None, None
+                for destino in range(len(rutas)):
+                    if destino == origen:
+                        continue
+                    if np.any(cargas[destino] + demandas[nodo] > capacidades[destino]):
+                        continue
+
+                    costos = _costos_insercion(matriz, _secuencia(bases[destino], rutas[destino], ficticio), nodo)
+                    arco = int(np.argmin(costos))
+                    if costos[arco] < mejor_costo:
+                        mejor_costo, mejor_destino, mejor_arco = costos[arco], destino, arco
+
+                if mejor_destino is None:
+                    posicion += 1
+                    continue
+
+                rutas[origen] = np.delete(rutas[origen], posicion)
+                rutas[mejor_destino] = np.insert(rutas[mejor_destino], mejor_arco, nodo)
+                cargas[origen] -= demandas[nodo]
+                cargas[mejor_destino] += demandas[nodo]
+                tocadas.update((origen, mejor_destino))
+                mejorado = True
+
+        if not mejorado:
+            break
+
+    return rutas, tocadas
+
+
+def ordenar_ruta(matriz, base, nodos, presupuesto_ms=None):
+    """
+    Optimiza el orden de los nodos de una ruta que parte de base
+    (con búsqueda multiarranque si se da presupuesto_ms).
+    """
+    if len(nodos) < 2:
+        return np.asarray(nodos, dtype=np.int64)
+
+    indices = np.concatenate(([base], nodos)).astype(np.int64)
+    submatriz = matriz[np.ix_(indices, indices)]
+    if presupuesto_ms:
+        orden = optimizar_multiarranque(submatriz, presupuesto_ms)
+    else:
+        orden = optimizar_recorrido(submatriz)
+    return indices[orden]
+
+
+def resolver_cvrp(bases, capacidades, puntos, demandas, max_pasadas=10, presupuesto_ms=None, modo="haversine"):
+    """
+    Reparte los puntos entre los vehículos respetando capacidad y minimizando km.
+
+    Args:
+        bases: array (V x 2) con lat/lng de la base de cada vehículo
+        capacidades: array (V x 2) con [peso, volumen] máximos
+        puntos: array (N x 2) con lat/lng de cada paquete
+        demandas: array (N x 2) con [peso, volumen] de cada paquete
+        presupuesto_ms: tiempo de búsqueda multiarranque para el orden final de cada ruta
+        modo: kernel de distancia ("haversine" o "equirectangular", ver routes/geodesia.py)
+
+    Returns:
+        (rutas, no_asignados) donde rutas es una lista (V) de arrays con los
+        índices de los puntos en orden de visita y no_asignados los índices
+        que no cupieron en ningún vehículo
+    """
+    bases = np.asarray(bases, dtype=np.float64).reshape(-1, 2)
+    puntos = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+    capacidades = np.asarray(capacidades, dtype=np.float64).reshape(-1, 2)
+    demandas = np.asarray(demandas, dtype=np.float64).reshape(-1, 2)
+
+    v, n = len(bases), len(puntos)
+    if v == 0 or n == 0:
+        return [np.empty(0, dtype=np.int64) for _ in range(v)], np.arange(n)
+
+    # Nodos: 0..V-1 bases, V..V+N-1 paquetes y un nodo ficticio de cierre (camino abierto)
+    coordenadas = np.vstack((bases, puntos))
+    matriz = np.zeros((v + n + 1, v + n + 1))
+    matriz[:-1, :-1] = matriz_haversine(coordenadas[:, 0], coordenadas[:, 1], modo=modo)
+
+    # 1. Asignación por arrepentimiento respecto a la base más cercana
+    distancia_bases = matriz[v:v + n, :v]
+    ordenadas = np.sort(distancia_bases, axis=1)
+    arrepentimiento = ordenadas[:, 1] - ordenadas[:, 0] if v > 1 else -ordenadas[:, 0]
+
+    cargas = np.zeros((v, 2))
+    asignacion = np.full(n, -1, dtype=np.int64)
+    for i in np.argsort(-arrepentimiento, kind="stable"):
+        caben = np.all(cargas + demandas[i] <= capacidades, axis=1)
+        if not caben.any():
+            continue
+        vehiculo = int(np.argmin(np.where(caben, distancia_bases[i], np.inf)))
+        asignacion[i] = vehiculo
+        cargas[vehiculo] += demandas[i]
+
+    # 2. Orden inicial de cada ruta
+    rutas = [
+        ordenar_ruta(matriz, k, v + np.flatnonzero(asignacion == k))
+        for k in range(v)
+    ]
+
+    # 3. Reubicación entre rutas y reoptimización de las rutas modificadas
+    demandas_nodo = {v + i: demandas[i] for i in range(n)}
+    rutas, tocadas = reubicar_entre_rutas(
+        matriz, np.arange(v), rutas, cargas, capacidades, demandas_nodo, max_pasadas=max_pasadas
+    )
+    for k in range(v) if presupuesto_ms else tocadas:
+        rutas[k] = ordenar_ruta(matriz, k, rutas[k], presupuesto_ms=presupuesto_ms)
+
+    return [ruta - v for ruta in rutas], np.flatnonzero(asignacion == -1)
+
+
+def distancia_ruta_km(base, puntos):
+    """
+    Longitud en línea recta (km) de una ruta abierta desde base.
+    """
+    coordenadas = np.vstack(([base], np.asarray(puntos, dtype=np.float64).reshape(-1, 2)))
+    return float(distancias_tramos(coordenadas).sum())
+
+
+def planificar_rutas(simular=False, presupuesto_ms=None):
+    """
+    Reparte todos los paquetes Pendientes entre los conductores Disponibles
+    (con vehículo y base) y crea una Ruta Asignada por conductor usado.
+
+    Args:
+        simular: si es True solo calcula el plan, no guarda nada
+        presupuesto_ms: tiempo de búsqueda multiarranque por ruta (None = una sola búsqueda)
+
+    Returns:
+        dict con las rutas planificadas, los paquetes sin asignar y la distancia total
+    """
+    with transaction.atomic():
+        paquetes = list(
+            Paquete.objects.select_for_update()
+            .filter(estado_paquete="Pendiente", lat__isnull=False, lng__isnull=False)
+            .values_list("id_paquete", "lat", "lng", "peso", "largo", "ancho", "alto", "cantidad")
+        )
+
+        conductores = list(
+            Driver.objects.select_for_update()
+            .filter(
+                estado="Disponible",
+                vehiculo__isnull=False,
+                base_lat__isnull=False,
+                base_lng__isnull=False
+            )
+            .exclude(rutas__estado__in=["Asignada", "En ruta"])
+            .values_list("id_conductor", "base_lat", "base_lng", "vehiculo__tipo", "vehiculo__placa")
+        )
+
+        if not paquetes or not conductores:
+            return {
+                "rutas": [],
+                "no_asignados": [p[0] for p in paquetes],
+                "distancia_total_km": 0
+            }
+
+        datos = np.array([p[1:] for p in paquetes], dtype=np.float64)
+        ids_paquetes = [p[0] for p in paquetes]
+        puntos = datos[:, 0:2]
+        demandas = _demandas(datos[:, 2:])
+
+        bases = np.array([c[1:3] for c in conductores], dtype=np.float64)
+        capacidades = np.array([
+            [Vehiculo.CAPACIDAD_POR_TIPO[c[3]]["peso"], Vehiculo.CAPACIDAD_POR_TIPO[c[3]]["volumen"]]
+            for c in conductores
+        ], dtype=np.float64)
+
+        rutas, no_asignados = resolver_cvrp(
+            bases, capacidades, puntos, demandas,
+            presupuesto_ms=presupuesto_ms, modo=settings.ROUTING_MODO_DISTANCIA
+        )
+
+        plan = []
+        for k, orden in enumerate(rutas):
+            if len(orden) == 0:
+                continue
+            plan.append({
+                "conductor": conductores[k][0],
+                "vehiculo": conductores[k][4],
+                "tipo_vehiculo": conductores[k][3],
+                "paquetes": [ids_paquetes[i] for i in orden],
+                "peso": round(float(demandas[orden, 0].sum()), 2),
+                "volumen": round(float(demandas[orden, 1].sum()), 2),
+                "distancia_km": round(distancia_ruta_km(bases[k], puntos[orden]), 2),
+            })
+
+        if not simular:
+            paquetes_actualizados = []
+            for item in plan:
+                ruta = Ruta.objects.create(
+                    conductor_id=item["conductor"],
+                    estado="Asignada",
+                    total_paquetes=len(item["paquetes"])
+                )
+                item["id_ruta"] = ruta.id_ruta
+                item["codigo_manifiesto"] = ruta.codigo_manifiesto
+
+                paquetes_actualizados += [
+                    Paquete(id_paquete=id_paquete, ruta=ruta, estado_paquete="Asignado", orden_entrega=idx)
+                    for idx, id_paquete in enumerate(item["paquetes"], 1)
+                ]
+
+            Paquete.objects.bulk_update(
+                paquetes_actualizados, ["ruta", "estado_paquete", "orden_entrega"], batch_size=500
+            )
+            Driver.objects.filter(id_conductor__in=[item["conductor"] for item in plan]).update(estado="Asignado")
+
+    return {
+        "rutas": plan,
+        "no_asignados": [ids_paquetes[i] for i in no_asignados],
+        "distancia_total_km": round(sum(item["distancia_km"] for item in plan), 2)
+    }
+
+
+def _capacidad_ruta(ruta):
+    """
+    [peso, volumen] máximos del vehículo de la ruta (el usado o el del
+    conductor); infinito si la ruta aún no tiene vehículo.
+    """
+    vehiculo = ruta.vehiculo_usado or (ruta.conductor.vehiculo if ruta.conductor else None)
+    if vehiculo is None:
+        return np.array([np.inf, np.inf])
+    capacidad = Vehiculo.CAPACIDAD_POR_TIPO[vehiculo.tipo]
+    return np.array([capacidad["peso"], capacidad["volumen"]], dtype=np.float64)
+
+
+def asignar_por_insercion(matriz, secuencias, cargas, capacidades, nodos, demandas):
+    """
+    Asigna cada nodo a la ruta donde su inserción cuesta menos, respetando
+    capacidades. Los nodos con más arrepentimiento (mayor diferencia entre su
+    mejor y su segunda mejor ruta) se asignan primero, y tras cada asignación
+    solo se recalculan los costos de la ruta que cambió. Entre rutas con el
+    mismo costo se prefiere la de más capacidad restante.
+
+    Args:
+        matriz: matriz de costos con un nodo ficticio de costo 0 en la última posición
+        secuencias: lista de arrays (inicio ... ficticio) de cada ruta; se actualiza en el lugar
+        cargas: array (rutas x 2); se actualiza en el lugar
+        capacidades: array (rutas x 2)
+        nodos: nodos a asignar
+        demandas: array (len(nodos) x 2)
+
+    Returns:
+        (asignaciones, sin_ruta) donde asignaciones es una lista de
+        (indice_nodo, ruta, costo) en orden de asignación y sin_ruta los
+        índices de los nodos que no caben en ninguna ruta
+    """
+    nodos = np.asarray(nodos, dtype=np.int64)
+    n, r = len(nodos), len(secuencias)
+
+    costos = np.full((n, r), np.inf)
+    arcos = np.zeros((n, r), dtype=np.int64)
+
+    def evaluar(ruta, pendientes):
+        secuencia = secuencias[ruta]
+        a, b = secuencia[:-1], secuencia[1:]
+        insercion = matriz[a[None, :], nodos[pendientes, None]] + matriz[nodos[pendientes, None], b[None, :]] \
+            - matriz[a, b][None, :]
+        arcos[pendientes, ruta] = np.argmin(insercion, axis=1)
+        costos[pendientes, ruta] = insercion[np.arange(len(pendientes)), arcos[pendientes, ruta]]
+
+    pendientes = np.arange(n)
+    for ruta in range(r):
+        evaluar(ruta, pendientes)
+
+    asignaciones, sin_ruta = [], []
+    while len(pendientes):
+        caben = np.all(cargas[None, :, :] + demandas[pendientes, None, :] <= capacidades[None, :, :], axis=2)
+        factibles = np.where(caben, costos[pendientes], np.inf)
+
+        sin_opcion = ~np.isfinite(factibles).any(axis=1)
+        if sin_opcion.any():
+            sin_ruta += pendientes[sin_opcion].tolist()
+            pendientes, factibles = pendientes[~sin_opcion], factibles[~sin_opcion]
+            if not len(pendientes):
+                break
+
+        ordenados = np.sort(factibles, axis=1)
+        segundo = ordenados[:, 1] if r > 1 else np.full(len(pendientes), np.inf)
+        arrepentimiento = np.where(np.isfinite(segundo), segundo - ordenados[:, 0], np.inf)
+        elegido = int(np.lexsort((ordenados[:, 0], -arrepentimiento))[0])
+        i = int(pendientes[elegido])
+
+        restante = np.min((capacidades - cargas) / np.where(np.isfinite(capacidades), capacidades, 1), axis=1)
+        empatadas = np.flatnonzero(factibles[elegido] <= ordenados[elegido, 0] + EPSILON)
+        ruta = int(empatadas[np.argmax(restante[empatadas])])
+
+        asignaciones.append((i, ruta, float(costos[i, ruta])))
+        secuencias[ruta] = np.insert(secuencias[ruta], arcos[i, ruta] + 1, nodos[i])
+        cargas[ruta] += demandas[i]
+
+        pendientes = np.delete(pendientes, elegido)
+        if len(pendientes):
+            evaluar(ruta, pendientes)
+
+    return asignaciones, sin_ruta
+
+
+def _cargar_pendientes():
+    """
+    Rutas Pendientes (bloqueadas para actualizar) con sus paquetes con
+    coordenadas. Las rutas sin paquetes ni base no tienen ubicación y se
+    descartan.
+
+    Returns:
+        (rutas, paradas, con_base) donde paradas[id_ruta] son filas
+        (id_paquete, lat, lng, orden_entrega, peso, largo, ancho, alto, cantidad)
+        y con_base[id_ruta] indica si el conductor tiene base
+    """
+    # Las rutas se bloquean en una consulta sin joins: FOR UPDATE OF no existe en MariaDB
+    bloqueadas = list(
+        Ruta.objects.select_for_update().filter(estado="Pendiente").order_by("id_ruta")
+        .values_list("id_ruta", flat=True)
+    )
+    rutas = list(
+        Ruta.objects.filter(id_ruta__in=bloqueadas)
+        .select_related("conductor__vehiculo", "vehiculo_usado")
+        .order_by("id_ruta")
+    )
+
+    paradas = {ruta.id_ruta: [] for ruta in rutas}
+    for fila in Paquete.objects.filter(ruta__in=rutas, lat__isnull=False, lng__isnull=False).values_list(
+        "ruta_id", "id_paquete", "lat", "lng", "orden_entrega", "peso", "largo", "ancho", "alto", "cantidad"
+    ):
+        paradas[fila[0]].append(fila[1:])
+
+    con_base = {
+        ruta.id_ruta: ruta.conductor is not None
+        and ruta.conductor.base_lat is not None and ruta.conductor.base_lng is not None
+        for ruta in rutas
+    }
+    rutas = [ruta for ruta in rutas if paradas[ruta.id_ruta] or con_base[ruta.id_ruta]]
+    return rutas, paradas, con_base
+
+
+def _modelar_pendientes(rutas, paradas, con_base, extras=()):
+    """
+    Matriz de costos y secuencia actual de cada ruta Pendiente.
+
+    Nodos: las paradas de cada ruta (en el orden de rutas y de paradas), las
+    bases, las coordenadas extras y un ficticio de costo 0 al final. Cada ruta
+    se evalúa con su orden de entrega calculado o, si aún no lo tiene, con un
+    orden estimado por el optimizador; parte de la base del conductor si lo
+    tiene y si no, del ficticio (ambos extremos libres).
+
+    Returns:
+        (matriz, secuencias, cargas, capacidades, nodos_extra)
+    """
+    coordenadas, secuencias_nodos = [], []
+    for ruta in rutas:
+        inicio = len(coordenadas)
+        coordenadas += [(p[1], p[2]) for p in paradas[ruta.id_ruta]]
+        secuencias_nodos.append(np.arange(inicio, len(coordenadas)))
+    bases = {}
+    for k, ruta in enumerate(rutas):
+        if con_base[ruta.id_ruta]:
+            bases[k] = len(coordenadas)
+            coordenadas.append((ruta.conductor.base_lat, ruta.conductor.base_lng))
+    nodos_extra = np.arange(len(coordenadas), len(coordenadas) + len(extras))
+    coordenadas += list(extras)
+
+    coordenadas = np.array(coordenadas, dtype=np.float64).reshape(-1, 2)
+    matriz = np.zeros((len(coordenadas) + 1, len(coordenadas) + 1))
+    matriz[:-1, :-1] = matriz_haversine(coordenadas[:, 0], coordenadas[:, 1], modo=settings.ROUTING_MODO_DISTANCIA)
+    ficticio = len(matriz) - 1
+
+    secuencias = []
+    for k, ruta in enumerate(rutas):
+        nodos = secuencias_nodos[k]
+        ordenes = [p[3] for p in paradas[ruta.id_ruta]]
+        inicio = bases.get(k, ficticio)
+        if all(orden is not None for orden in ordenes):
+            nodos = nodos[np.argsort(ordenes, kind="stable")]
+        else:
+            nodos = ordenar_ruta(matriz, inicio, nodos)
+        # Sin base el primer arco sale del ficticio: insertar al inicio cuesta solo el arco de salida
+        secuencias.append(_secuencia(inicio, nodos, ficticio))
+
+    cargas = np.array([
+        _demandas([p[4:] for p in paradas[ruta.id_ruta]]).sum(axis=0) for ruta in rutas
+    ]).reshape(-1, 2)
+    capacidades = np.array([_capacidad_ruta(ruta) for ruta in rutas]).reshape(-1, 2)
+    return matriz, secuencias, cargas, capacidades, nodos_extra
+
+
+def _costo_secuencia(matriz, secuencia):
+    return float(matriz[secuencia[:-1], secuencia[1:]].sum())
+
+
+def _mejor_reubicacion(matriz, origen, destino, carga_destino, capacidad_destino, demandas):
+    """
+    Mejor paquete de la secuencia origen para mover a su posición más barata
+    de la secuencia destino, evaluando todos a la vez.
+
+    Returns:
+        (delta, posicion, arco) o None si origen no puede ceder paquetes
+    """
+    nodos = origen[1:-1]
+    # No se vacían rutas: una ruta sin paquetes ni base quedaría sin ubicación
+    if len(nodos) < 2:
+        return None
+
+    anteriores, siguientes = origen[:-2], origen[2:]
+    ahorro = matriz[anteriores, nodos] + matriz[nodos, siguientes] - matriz[anteriores, siguientes]
+
+    a, b = destino[:-1], destino[1:]
+    insercion = matriz[a[None, :], nodos[:, None]] + matriz[nodos[:, None], b[None, :]] - matriz[a, b][None, :]
+    arcos = np.argmin(insercion, axis=1)
+
+    delta = insercion[np.arange(len(nodos)), arcos] - ahorro
+    demandas_nodos = demandas[nodos]
+    # Solo se revisa paquete por paquete si el más grande no cabe
+    if np.any(carga_destino + demandas_nodos.max(axis=0) > capacidad_destino):
+        caben = np.all(carga_destino + demandas_nodos <= capacidad_destino, axis=1)
+        delta = np.where(caben, delta, np.inf)
+
+    posicion = int(np.argmin(delta))
+    return float(delta[posicion]), posicion, int(arcos[posicion])
+
+
+def _mejor_intercambio(matriz, secuencia_a, secuencia_b, cargas, capacidades, demandas):
+    """
+    Mejor par (paquete de a, paquete de b) para intercambiar de ruta, cada uno
+    en la posición del otro, evaluando todos los pares a la vez.
+
+    Args:
+        cargas, capacidades: arrays (2 x 2) de las rutas a y b
+
+    Returns:
+        (delta, posicion_a, posicion_b) o None si alguna ruta está vacía
+    """
+    nodos_a, nodos_b = secuencia_a[1:-1], secuencia_b[1:-1]
+    if not len(nodos_a) or not len(nodos_b):
+        return None
+
+    pa, qa = secuencia_a[:-2], secuencia_a[2:]
+    pb, qb = secuencia_b[:-2], secuencia_b[2:]
+
+    # delta[i, j]: nodos_b[j] ocupa el lugar de nodos_a[i] y viceversa
+    delta = (
+        matriz[pa[:, None], nodos_b[None, :]] + matriz[nodos_b[None, :], qa[:, None]]
+        - (matriz[pa, nodos_a] + matriz[nodos_a, qa])[:, None]
+        + matriz[pb[None, :], nodos_a[:, None]] + matriz[nodos_a[:, None], qb[None, :]]
+        - (matriz[pb, nodos_b] + matriz[nodos_b, qb])[None, :]
+    )
+
+    demandas_a, demandas_b = demandas[nodos_a], demandas[nodos_b]
+    # Solo se revisa par por par si el peor intercambio no cabe en alguna de las dos rutas
+    if np.any(cargas[0] + demandas_b.max(axis=0) - demandas_a.min(axis=0) > capacidades[0]) \
+            or np.any(cargas[1] + demandas_a.max(axis=0) - demandas_b.min(axis=0) > capacidades[1]):
+        diferencia = demandas_b[None, :, :] - demandas_a[:, None, :]
+        caben = np.all(cargas[0] + diferencia <= capacidades[0], axis=2) \
+            & np.all(cargas[1] - diferencia <= capacidades[1], axis=2)
+        delta = np.where(caben, delta, np.inf)
+
+    i, j = np.unravel_index(int(np.argmin(delta)), delta.shape)
+    return float(delta[i, j]), int(i), int(j)
+
+
+def mejorar_entre_rutas(matriz, secuencias, cargas, capacidades, demandas, max_movimientos=1000):
+    """
+    Búsqueda local entre rutas con movimientos de reubicación (un paquete
+    pasa a la posición más barata de otra ruta) e intercambio (dos paquetes
+    de rutas distintas cambian de lugar). En cada paso se aplica el
+    movimiento que más km ahorra entre todos los pares de rutas, respetando
+    capacidades; tras aplicarlo solo se reevalúan los pares que incluyen las
+    dos rutas que cambiaron.
+
+    Args:
+        matriz: matriz de costos con un nodo ficticio de costo 0 en la última posición
+        secuencias: lista de arrays (inicio ... ficticio) de cada ruta; se actualiza en el lugar
+        cargas: array (rutas x 2); se actualiza en el lugar
+        capacidades: array (rutas x 2)
+        demandas: array (nodos x 2) con [peso, volumen] de cada nodo
+        max_movimientos: límite de movimientos aplicados
+
+    Returns:
+        lista de movimientos (tipo, ruta_a, ruta_b, nodos, ahorro) en orden de
+        aplicación; tipo es "reubicar" (nodos = (nodo,), de a hacia b) o
+        "intercambiar" (nodos = (nodo_de_a, nodo_de_b))
+    """
+    r = len(secuencias)
+    mejores = {}
+
+    def evaluar(a, b):
+        if a == b:
+            return
+        mejores[("reubicar", a, b)] = _mejor_reubicacion(
+            matriz, secuencias[a], secuencias[b], cargas[b], capacidades[b], demandas
+        )
+        if a < b:
+            mejores[("intercambiar", a, b)] = _mejor_intercambio(
+                matriz, secuencias[a], secuencias[b], cargas[[a, b]], capacidades[[a, b]], demandas
+            )
+
+    for a in range(r):
+        for b in range(r):
+            evaluar(a, b)
+
+    movimientos = []
+    while len(movimientos) < max_movimientos:
+        candidatos = [(valor[0], clave) for clave, valor in mejores.items() if valor is not None]
+        if not candidatos:
+            break
+        delta, (tipo, a, b) = min(candidatos)
+        if delta >= -EPSILON:
+            break
+
+        if tipo == "reubicar":
+            _, posicion, arco = mejores[(tipo, a, b)]
+            nodo = int(secuencias[a][posicion + 1])
+            secuencias[a] = np.delete(secuencias[a], posicion + 1)
+            secuencias[b] = np.insert(secuencias[b], arco + 1, nodo)
+            cargas[a] -= demandas[nodo]
+            cargas[b] += demandas[nodo]
+            movimientos.append((tipo, a, b, (nodo,), -delta))
+        else:
+            _, i, j = mejores[(tipo, a, b)]
+            x, y = int(secuencias[a][i + 1]), int(secuencias[b][j + 1])
+            secuencias[a][i + 1], secuencias[b][j + 1] = y, x
+            cargas[a] += demandas[y] - demandas[x]
+            cargas[b] += demandas[x] - demandas[y]
+            movimientos.append((tipo, a, b, (x, y), -delta))
+
+        for c in range(r):
+            for u, v in {(a, c), (c, a), (b, c), (c, b)}:
+                evaluar(u, v)
+
+    return movimientos
+
+
+def planificar_reentregas(simular=False):
+    """
+    Reasigna todos los paquetes Fallidos de rutas Completadas o Fallidas a la
+    ruta Pendiente donde su inserción cuesta menos km, sin exceder la
+    capacidad del vehículo de la ruta.
+
+    Cada ruta Pendiente se evalúa con su orden actual (ver _modelar_pendientes).
+
+    Args:
+        simular: si es True solo calcula las asignaciones, no guarda nada
+
+    Returns:
+        dict con los paquetes asignados, los que no tienen ruta y el resumen por ruta
+    """
+    with transaction.atomic():
+        fallidos = list(
+            Paquete.objects.select_for_update()
+            .filter(estado_paquete="Fallido", ruta__estado__in=["Completada", "Fallida"])
+            .values_list(
+                "id_paquete", "lat", "lng", "peso", "largo", "ancho", "alto", "cantidad", "ruta__codigo_manifiesto"
+            )
+        )
+        rutas, paradas, con_base = _cargar_pendientes()
+
+        sin_ruta = [
+            {"paquete": f[0], "error": "El paquete no tiene coordenadas"}
+            for f in fallidos if f[1] is None or f[2] is None
+        ]
+        fallidos = [f for f in fallidos if f[1] is not None and f[2] is not None]
+
+        if not fallidos or not rutas:
+            return {
+                "asignados": [],
+                "sin_ruta": sin_ruta + [
+                    {"paquete": f[0], "error": "No hay rutas Pendientes disponibles"} for f in fallidos
+                ],
+                "rutas": []
+            }
+
+        matriz, secuencias, cargas, capacidades, nodos_fallidos = _modelar_pendientes(
+            rutas, paradas, con_base, [(f[1], f[2]) for f in fallidos]
+        )
+        demandas = _demandas([f[3:8] for f in fallidos])
+
+        asignaciones, no_caben = asignar_por_insercion(
+            matriz, secuencias, cargas, capacidades, nodos_fallidos, demandas
+        )
+
+        asignados = [
+            {
+                "paquete": fallidos[i][0],
+                "ruta_origen": fallidos[i][8],
+                "id_ruta_destino": rutas[k].id_ruta,
+                "ruta_destino": rutas[k].codigo_manifiesto,
+                "costo_km": round(costo, 3),
+            }
+            for i, k, costo in asignaciones
+        ]
+        sin_ruta += [
+            {"paquete": fallidos[i][0], "error": "No cabe en ninguna ruta Pendiente"} for i in no_caben
+        ]
+
+        nuevos_por_ruta = {}
+        for i, k, _ in asignaciones:
+            nuevos_por_ruta.setdefault(k, []).append(fallidos[i][0])
+
+        resumen = []
+        for k, nuevos in sorted(nuevos_por_ruta.items()):
+            ruta = rutas[k]
+            ruta.total_paquetes += len(nuevos)
+            restante = capacidades[k] - cargas[k]
+            resumen.append({
+                "id_ruta": ruta.id_ruta,
+                "codigo_manifiesto": ruta.codigo_manifiesto,
+                "paquetes_nuevos": nuevos,
+                "total_paquetes": ruta.total_paquetes,
+                "peso_restante": round(float(restante[0]), 2) if np.isfinite(restante[0]) else None,
+                "volumen_restante": round(float(restante[1]), 2) if np.isfinite(restante[1]) else None,
+            })
+
+        if not simular and asignados:
+            Paquete.objects.bulk_update(
+                [
+                    Paquete(
+                        id_paquete=a["paquete"], ruta_id=a["id_ruta_destino"],
+                        estado_paquete="Asignado", orden_entrega=None
+                    )
+                    for a in asignados
+                ],
+                ["ruta", "estado_paquete", "orden_entrega"], batch_size=500
+            )
+            Ruta.objects.bulk_update([rutas[k] for k in nuevos_por_ruta], ["total_paquetes"])
+
+    return {"asignados": asignados, "sin_ruta": sin_ruta, "rutas": resumen}
+
+
+def rebalancear_rutas(simular=False, max_movimientos=1000):
+    """
+    Mueve paquetes entre las rutas Pendientes mientras baje el total de km
+    de la flota: reubica un paquete en la posición más barata de otra ruta o
+    intercambia dos paquetes de rutas distintas, sin exceder la capacidad del
+    vehículo de la ruta que los recibe (ver mejorar_entre_rutas). Corrige
+    asignaciones manuales poco eficientes antes de despachar.
+
+    Los paquetes de las rutas modificadas quedan con el orden de entrega del
+    rebalanceo y su cálculo de recorrido (ruta_optimizada) se borra; las que
+    ya lo tenían se marcan con "recalcular" para calcularlas de nuevo.
+
+    Args:
+        simular: si es True solo calcula los movimientos, no guarda nada
+        max_movimientos: límite de movimientos aplicados
+
+    Returns:
+        dict con los movimientos, el resumen por ruta modificada y la
+        distancia en línea recta antes y después
+    """
+    with transaction.atomic():
+        rutas, paradas, con_base = _cargar_pendientes()
+
+        if len(rutas) < 2:
+            return {
+                "rutas_evaluadas": len(rutas),
+                "movimientos": [],
+                "rutas": [],
+                "distancia_antes_km": None,
+                "distancia_despues_km": None,
+                "ahorro_km": 0
+            }
+
+        matriz, secuencias, cargas, capacidades, _ = _modelar_pendientes(rutas, paradas, con_base)
+
+        filas = [p for ruta in rutas for p in paradas[ruta.id_ruta]]
+        ids_nodo = [p[0] for p in filas]
+        demandas = np.zeros((len(matriz), 2))
+        demandas[:len(filas)] = _demandas([p[4:] for p in filas])
+
+        antes = [_costo_secuencia(matriz, secuencia) for secuencia in secuencias]
+        originales = {ruta.id_ruta: {p[0] for p in paradas[ruta.id_ruta]} for ruta in rutas}
+
+        movimientos = mejorar_entre_rutas(
+            matriz, secuencias, cargas, capacidades, demandas, max_movimientos=max_movimientos
+        )
+
+        detalle = []
+        tocadas = set()
+        for tipo, a, b, nodos, ahorro in movimientos:
+            tocadas.update((a, b))
+            detalle.append({
+                "tipo": tipo,
+                "paquetes": [ids_nodo[n] for n in nodos],
+                "id_ruta_a": rutas[a].id_ruta,
+                "id_ruta_b": rutas[b].id_ruta,
+                "ahorro_km": round(ahorro, 3),
+            })
+
+        resumen = []
+        for k in sorted(tocadas):
+            ruta = rutas[k]
+            actuales = [ids_nodo[n] for n in secuencias[k][1:-1]]
+            entrantes = [p for p in actuales if p not in originales[ruta.id_ruta]]
+            salientes = sorted(originales[ruta.id_ruta] - set(actuales))
+            restante = capacidades[k] - cargas[k]
+            ruta.total_paquetes += len(entrantes) - len(salientes)
+            resumen.append({
+                "id_ruta": ruta.id_ruta,
+                "codigo_manifiesto": ruta.codigo_manifiesto,
+                "paquetes_entrantes": entrantes,
+                "paquetes_salientes": salientes,
+                "total_paquetes": ruta.total_paquetes,
+                "distancia_antes_km": round(antes[k], 2),
+                "distancia_despues_km": round(_costo_secuencia(matriz, secuencias[k]), 2),
+                "peso_restante": round(float(restante[0]), 2) if np.isfinite(restante[0]) else None,
+                "volumen_restante": round(float(restante[1]), 2) if np.isfinite(restante[1]) else None,
+                "recalcular": ruta.ruta_optimizada is not None,
+            })
+
+        if not simular and tocadas:
+            Paquete.objects.bulk_update(
+                [
+                    Paquete(id_paquete=ids_nodo[n], ruta_id=rutas[k].id_ruta, orden_entrega=idx)
+                    for k in tocadas
+                    for idx, n in enumerate(secuencias[k][1:-1], 1)
+                ],
+                ["ruta", "orden_entrega"], batch_size=500
+            )
+            for k in tocadas:
+                rutas[k].ruta_optimizada = None
+                rutas[k].distancia_total_km = None
+                rutas[k].tiempo_estimado_minutos = None
+            Ruta.objects.bulk_update(
+                [rutas[k] for k in tocadas],
+                ["total_paquetes", "ruta_optimizada", "distancia_total_km", "tiempo_estimado_minutos"]
+            )
+            SimplificacionRuta.objects.filter(ruta__in=[rutas[k] for k in tocadas]).delete()
+
+    distancia_antes = sum(antes)
+    distancia_despues = sum(_costo_secuencia(matriz, secuencia) for secuencia in secuencias)
+    return {
+        "rutas_evaluadas": len(rutas),
+        "movimientos": detalle,
+        "rutas": resumen,
+        "distancia_antes_km": round(distancia_antes, 2),
+        "distancia_despues_km": round(distancia_despues, 2),
+        "ahorro_km": round(distancia_antes - distancia_despues, 2)
+    }
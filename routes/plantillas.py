@@ -0,0 +1,213 @@
+"""
+Plantillas de ruta para recorridos que se repiten (mismos clientes cada semana).
+
+Una plantilla guarda, desde una ruta ya calculada, la secuencia de paradas
+(paquetes de la misma dirección unidos en una sola) con el tramo por vía y la
+geometría que llega a cada una. Al calcular una ruta nueva desde el mismo
+punto de inicio se asigna cada paquete a la parada de la plantilla más
+cercana (a lo sumo ROUTING_PLANTILLA_RADIO_M); si la coincidencia es
+suficiente (ROUTING_PLANTILLA_COINCIDENCIA, tanto de paquetes asignados como
+de paradas usadas) se reutiliza el orden de la plantilla, los paquetes nuevos
+se insertan en su posición más barata y solo se consultan al backend de
+enrutamiento los tramos que no existían en la plantilla.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .geodesia import preparar_puntos, matriz_distancias
+from .geometria import decodificar_polilinea, dividir_por_tramos, coordenadas_ruta, codificar_polilinea
+from .matriz import cuantizar
+from .models import PlantillaRuta
+from .optimizador import matriz_haversine, insercion_mas_barata, agrupar_paradas
+
+
+def _clave_parada(k):
+    return f"parada-{k}"
+
+
+def crear_plantilla(ruta, nombre):
+    """
+    Crea (o reemplaza, si ya existe con ese nombre) una plantilla a partir del
+    cálculo guardado de la ruta.
+
+    Raises:
+        ValueError si la ruta no tiene un cálculo por vía completo
+    """
+    datos = ruta.ruta_optimizada
+    if not datos or not datos.get("paquetes"):
+        raise ValueError("La ruta no tiene un cálculo de recorrido")
+    if datos.get("estimado"):
+        raise ValueError("La ruta tiene tramos estimados en línea recta; recalcúlala antes de guardarla")
+
+    paquetes = datos["paquetes"]
+    tramos = datos.get("tramos") or []
+    if len(tramos) != len(paquetes):
+        raise ValueError("La ruta no tiene los tramos por vía de cada parada")
+
+    coordinates = coordenadas_ruta(datos)
+    indices = datos.get("indices_geometria") or []
+    if not coordinates or len(indices) != len(paquetes) + 1:
+        raise ValueError("La ruta no tiene geometría por tramo")
+    geometrias = dividir_por_tramos(coordinates, indices)
+
+    # Paquetes consecutivos de la misma parada (ver agrupar_paradas) forman una
+    # sola; se guarda el tramo que llega a la parada (los internos son de pocos metros)
+    grupos, _ = agrupar_paradas(
+        [p["lat"] for p in paquetes], [p["lng"] for p in paquetes], settings.ROUTING_PLANTILLA_RADIO_M
+    )
+    nuevas = np.concatenate(([True], grupos[1:] != grupos[:-1]))
+    paradas, tramos_plantilla, geometria_tramos = [], [], []
+    for paquete, tramo, geometria, nueva in zip(paquetes, tramos, geometrias, nuevas):
+        if not nueva:
+            continue
+        paradas.append({"lat": paquete["lat"], "lng": paquete["lng"], "direccion": paquete.get("direccion")})
+        tramos_plantilla.append({"distancia_m": tramo["distancia_m"], "duracion_s": tramo["duracion_s"]})
+        geometria_tramos.append(codificar_polilinea(geometria))
+
+    inicio = datos["punto_inicio"]
+    inicio_lat, inicio_lng = cuantizar(inicio["lat"], inicio["lng"])
+    plantilla, _ = PlantillaRuta.objects.update_or_create(
+        nombre=nombre,
+        defaults={
+            "inicio_lat": inicio_lat,
+            "inicio_lng": inicio_lng,
+            "punto_inicio": inicio,
+            "paradas": paradas,
+            "tramos": tramos_plantilla,
+            "geometria_tramos": geometria_tramos,
+            "ruta_origen": ruta,
+            "fecha_creacion": timezone.now(),
+        }
+    )
+    return plantilla
+
+
+def buscar_plantilla(start_lat, start_lng, lats, lngs):
+    """
+    Plantilla con el mismo punto de inicio que mejor cubre los paquetes.
+
+    Returns:
+        (plantilla, asignacion) donde asignacion[i] es la parada de la
+        plantilla del paquete i (-1 si es nuevo), o (None, None)
+    """
+    if len(lats) == 0:
+        return None, None
+
+    inicio_lat, inicio_lng = cuantizar(start_lat, start_lng)
+    candidatas = PlantillaRuta.objects.filter(
+        inicio_lat__range=(inicio_lat - 1, inicio_lat + 1),
+        inicio_lng__range=(inicio_lng - 1, inicio_lng + 1),
+    )
+
+    puntos = preparar_puntos(lats, lngs)
+    mejor = (None, None, 0.0)
+    for plantilla in candidatas:
+        if not plantilla.paradas:
+            continue
+        paradas = preparar_puntos(
+            [p["lat"] for p in plantilla.paradas], [p["lng"] for p in plantilla.paradas]
+        )
+        distancias = matriz_distancias(puntos, paradas) * 1000
+
+        cercanas = np.argmin(distancias, axis=1)
+        dentro = distancias[np.arange(len(cercanas)), cercanas] <= settings.ROUTING_PLANTILLA_RADIO_M
+        cobertura = min(
+            dentro.mean(),                                         # paquetes con parada en la plantilla
+            len(np.unique(cercanas[dentro])) / len(plantilla.paradas)  # paradas de la plantilla que se usan
+        )
+        if cobertura >= settings.ROUTING_PLANTILLA_COINCIDENCIA and cobertura > mejor[2]:
+            mejor = (plantilla, np.where(dentro, cercanas, -1), cobertura)
+
+    return mejor[0], mejor[1]
+
+
+def ordenar_con_plantilla(plantilla, punto_inicio, paquetes, asignacion, modo="haversine"):
+    """
+    Orden de entrega siguiendo la plantilla: las paradas usadas en su orden,
+    con sus paquetes consecutivos, y los paquetes nuevos insertados en su
+    posición más barata (en línea recta).
+
+    Args:
+        punto_inicio: (lat, lng)
+        paquetes: lista de dicts {"id", "lat", "lng", ...} alineada con asignacion
+
+    Returns:
+        (ordenados, paradas, claves, anteriores) listos para recalcular solo
+        los tramos nuevos: paradas son las coordenadas de cada punto del
+        recorrido (las de la plantilla para los paquetes asignados), claves su
+        identificador y anteriores {(clave_a, clave_b): (tramo, geometria)}
+        con los tramos de la plantilla que se reutilizan
+    """
+    usadas = [int(k) for k in np.unique(asignacion[asignacion >= 0])]
+    nuevos = np.flatnonzero(asignacion < 0)
+    miembros = {k: np.flatnonzero(asignacion == k) for k in usadas}
+
+    coordenadas = np.array(
+        [punto_inicio]
+        + [(plantilla.paradas[k]["lat"], plantilla.paradas[k]["lng"]) for k in usadas]
+        + [(paquetes[i]["lat"], paquetes[i]["lng"]) for i in nuevos],
+        dtype=np.float64
+    )
+    recorrido = insercion_mas_barata(
+        matriz_haversine(coordenadas[:, 0], coordenadas[:, 1], modo=modo),
+        np.arange(len(usadas) + 1),
+        np.arange(len(usadas) + 1, len(coordenadas))
+    )
+
+    ordenados, paradas, claves = [], [tuple(punto_inicio)], ["inicio"]
+    for nodo in recorrido[1:]:
+        if nodo <= len(usadas):
+            k = usadas[nodo - 1]
+            for i in miembros[k]:
+                ordenados.append(paquetes[i])
+                paradas.append(tuple(coordenadas[nodo]))
+                claves.append(_clave_parada(k))
+        else:
+            i = nuevos[nodo - len(usadas) - 1]
+            ordenados.append(paquetes[i])
+            paradas.append((paquetes[i]["lat"], paquetes[i]["lng"]))
+            claves.append(paquetes[i]["id"])
+
+    # Solo se decodifican los tramos de la plantilla que aparecen en el recorrido
+    necesarios = set(zip(claves[:-1], claves[1:]))
+    claves_plantilla = ["inicio"] + [_clave_parada(k) for k in range(len(plantilla.paradas))]
+    anteriores = {
+        par: (tramo, decodificar_polilinea(geometria))
+        for par, tramo, geometria in zip(
+            zip(claves_plantilla[:-1], claves_plantilla[1:]), plantilla.tramos, plantilla.geometria_tramos
+        )
+        if par in necesarios
+    }
+
+    # Paquetes de la misma parada: tramo de costo 0 sobre el mismo punto
+    for k in usadas:
+        parada = plantilla.paradas[k]
+        anteriores[(_clave_parada(k), _clave_parada(k))] = (
+            {"distancia_m": 0.0, "duracion_s": 0.0}, [[parada["lng"], parada["lat"]]]
+        )
+
+    return ordenados, paradas, claves, anteriores
+
+
+def registrar_uso(plantilla):
+    PlantillaRuta.objects.filter(pk=plantilla.pk).update(
+        veces_usada=F("veces_usada") + 1, fecha_ultimo_uso=timezone.now()
+    )
+
+
+def resumen_plantilla(plantilla):
+    return {
+        "id_plantilla": plantilla.id_plantilla,
+        "nombre": plantilla.nombre,
+        "punto_inicio": plantilla.punto_inicio,
+        "total_paradas": len(plantilla.paradas),
+        "distancia_km": round(sum(t["distancia_m"] for t in plantilla.tramos) / 1000, 2),
+        "duracion_min": round(sum(t["duracion_s"] for t in plantilla.tramos) / 60),
+        "id_ruta_origen": plantilla.ruta_origen_id,
+        "veces_usada": plantilla.veces_usada,
+        "fecha_creacion": plantilla.fecha_creacion,
+        "fecha_ultimo_uso": plantilla.fecha_ultimo_uso,
+    }
@@ -6,7 +6,9 @@ from packages.serializer import PaqueteSerializer
 from drivers.models import Driver
 from drivers.serializer import DriverSerializer
 
-from .models import EntregaPaquete, Ruta
+from .llegadas import estimar_llegadas
+from .geometria import representar_ruta_optimizada, simplificacion_solicitada, FORMATOS_GEOMETRIA
+from .models import EntregaPaquete, Ruta, TrabajoRuta
 
 
 
@@ -155,6 +157,25 @@ class RutaSerializer(serializers.ModelSerializer):
         }
 
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+
+        # Por defecto la geometría se entrega como polilínea codificada, tal como
+        # se guarda; los clientes que aún esperan coordenadas GeoJSON en
+        # "geometry" deben pedir ?geometry=geojson.
+        # ?tolerance= (metros) o ?zoom= eligen una versión simplificada.
+        request = self.context.get("request")
+        params = request.query_params if request else {}
+        formato = params.get("geometry", "polyline")
+        if formato not in FORMATOS_GEOMETRIA:
+            formato = "polyline"
+
+        data["ruta_optimizada"] = representar_ruta_optimizada(
+            data.get("ruta_optimizada"), formato, simplificacion_solicitada(instance, params)
+        )
+        return data
+
+
     def validate(self, data):
         conductor = data.get('conductor')
         
@@ -181,6 +202,9 @@ class RutaMonitoreoSerializer(serializers.ModelSerializer):
     # Paquetes pendientes (solo básico)
     paquetes_pendientes = serializers.SerializerMethodField()
     
+    # Tiempo restante y llegada estimada a cada parada (sin llamadas externas)
+    eta = serializers.SerializerMethodField()
+    
     
     class Meta:
         model = Ruta
@@ -188,7 +212,7 @@ class RutaMonitoreoSerializer(serializers.ModelSerializer):
             "id_ruta", "codigo_manifiesto", "estado",
             "conductor_nombre", "conductor_ubicacion",
             "total_paquetes", "paquetes_entregados", "paquetes_fallidos",
-            "progreso_porcentaje", "proximo_paquete", "paquetes_pendientes"
+            "progreso_porcentaje", "proximo_paquete", "paquetes_pendientes", "eta"
         )
     
     
@@ -202,6 +226,18 @@ class RutaMonitoreoSerializer(serializers.ModelSerializer):
         return None
     
     
+    def _llegadas(self, objeto):
+        # Se calcula una vez por ruta y se reutiliza en los campos que la necesitan
+        if not hasattr(self, "_cache_llegadas"):
+            self._cache_llegadas = {}
+        if objeto.pk not in self._cache_llegadas:
+            estimacion = estimar_llegadas(objeto)
+            self._cache_llegadas[objeto.pk] = (
+                estimacion, {p["id"]: p for p in estimacion["paradas"]} if estimacion else {}
+            )
+        return self._cache_llegadas[objeto.pk]
+    
+    
     def get_progreso_porcentaje(self, objeto):
         if objeto.total_paquetes == 0:
             return 0
@@ -214,12 +250,15 @@ class RutaMonitoreoSerializer(serializers.ModelSerializer):
         ).order_by('orden_entrega').first()
         
         if proximo:
+            llegada = self._llegadas(objeto)[1].get(proximo.id_paquete, {})
             return {
                 "id": proximo.id_paquete,
                 "direccion": proximo.direccion_entrega,
                 "orden": proximo.orden_entrega,
                 "lat": float(proximo.lat) if proximo.lat else None,
-                "lng": float(proximo.lng) if proximo.lng else None
+                "lng": float(proximo.lng) if proximo.lng else None,
+                "segundos_restantes": llegada.get("segundos_restantes"),
+                "llegada_estimada": llegada.get("llegada_estimada")
             }
         return None
     
@@ -229,11 +268,36 @@ class RutaMonitoreoSerializer(serializers.ModelSerializer):
             estado_paquete__in=["Asignado", "En ruta"]
         ).order_by('orden_entrega')
         
+        llegadas = self._llegadas(objeto)[1]
         return [
             {
                 "id": p.id_paquete,
                 "direccion": p.direccion_entrega,
-                "orden": p.orden_entrega
+                "orden": p.orden_entrega,
+                "llegada_estimada": llegadas.get(p.id_paquete, {}).get("llegada_estimada")
             }
             for p in pendientes
-        ]
\ No newline at end of file
+        ]
+    
+    
+    def get_eta(self, objeto):
+        estimacion = self._llegadas(objeto)[0]
+        if not estimacion:
+            return None
+        return {
+            "desde_ubicacion_conductor": estimacion["desde_ubicacion_conductor"],
+            "tiempo_restante_min": estimacion["tiempo_restante_min"],
+            "distancia_restante_km": estimacion["distancia_restante_km"],
+            "llegada_estimada_final": estimacion["llegada_estimada_final"]
+        }
+
+
+class TrabajoRutaSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = TrabajoRuta
+        fields = (
+            "id_trabajo", "ruta", "tipo", "parametros", "estado", "progreso", "intentos",
+            "resultado", "error", "fecha_creacion", "fecha_inicio", "fecha_fin",
+        )
+        read_only_fields = fields
@@ -0,0 +1,686 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from packages.models import Paquete
+
+from .geometria import (
+    indices_paradas, dividir_por_tramos, unir_tramos,
+    codificar_polilinea, coordenadas_ruta, simplificaciones_ruta,
+    PRECISION_POLILINEA
+)
+from .enrutamiento import calcular_ruta_optimizada, calcular_rutas_optimizadas
+from .geodesia import distancias_tramos
+from .matriz import matriz_costos, matrices_costos
+from .models import Ruta, SimplificacionRuta, TelemetriaOptimizacion
+from .optimizador import (
+    matriz_haversine, insercion_mas_barata, cargar_coordenadas, optimizar_paradas, agrupar_paradas
+)
+from .plantillas import buscar_plantilla, ordenar_con_plantilla, registrar_uso
+from .telemetria import Medicion, cronometrar, nueva_fila, registrar
+
+
+def construir_ruta_optimizada(punto_inicio, ordenados, resultado):
+    """
+    Construye el contenido de Ruta.ruta_optimizada.
+
+    Args:
+        punto_inicio: {"lat": float, "lng": float}
+        ordenados: lista de dicts {"id", "lat", "lng", "direccion", "estado"} en orden de entrega
+        resultado: respuesta de calcular_ruta_optimizada (o None si falló)
+    """
+    geometry = resultado["geometry"] if resultado else None
+    coordinates = geometry["coordinates"] if geometry else None
+    paradas = [(punto_inicio["lat"], punto_inicio["lng"])] + [(p["lat"], p["lng"]) for p in ordenados]
+    indices = (
+        resultado.get("indices_geometria") or indices_paradas(coordinates, paradas)
+    ) if coordinates else []
+    tramos = resultado.get("tramos", []) if resultado else []
+
+    # Distancia y duración acumuladas desde el punto de inicio hasta cada parada (para ETAs)
+    if len(tramos) == len(ordenados):
+        distancias_acumuladas = np.cumsum([t["distancia_m"] for t in tramos]).tolist()
+        duraciones_acumuladas = np.cumsum([t["duracion_s"] for t in tramos]).tolist()
+    else:
+        distancias_acumuladas = duraciones_acumuladas = [None] * len(ordenados)
+
+    return {
+        # Geometría como polilínea codificada: ocupa una fracción del GeoJSON
+        "polyline": codificar_polilinea(coordinates) if coordinates else None,
+        "precision": PRECISION_POLILINEA,
+        "orden_paquetes": [p["id"] for p in ordenados],
+        "punto_inicio": punto_inicio,
+        "paquetes": [
+            {
+                "id": p["id"],
+                "lat": p["lat"],
+                "lng": p["lng"],
+                "direccion": p["direccion"],
+                "orden_entrega": idx,
+                "estado": p["estado"],  # Para recuperación
+                "distancia_acumulada_m": distancia,
+                "duracion_acumulada_s": duracion
+            }
+            for idx, (p, distancia, duracion) in enumerate(
+                zip(ordenados, distancias_acumuladas, duraciones_acumuladas), 1
+            )
+        ],
+        # Distancia y duración de cada tramo (base -> 1, 1 -> 2, ...) y posición de
+        # cada parada en la geometría, para poder modificar solo los tramos afectados
+        "tramos": tramos,
+        # (la geometría por tramo se deriva de polyline e indices_geometria al
+        # leer; las versiones simplificadas se guardan en simplificacion_ruta)
+        "indices_geometria": indices,
+        # Algún tramo se estimó en línea recta (OSRM no disponible): se refresca
+        # con python manage.py refrescar_estimadas
+        "estimado": any(t.get("estimado") for t in tramos),
+    }
+
+
+def guardar_simplificaciones(rutas):
+    """
+    Reemplaza las versiones simplificadas (SimplificacionRuta) de cada ruta
+    por las de su ruta_optimizada actual: se calculan una vez al guardar la
+    ruta y la API solo elige el nivel. Debe llamarse en la misma transacción
+    que guarda ruta_optimizada.
+    """
+    SimplificacionRuta.objects.filter(ruta__in=rutas).delete()
+
+    nuevas = []
+    for ruta in rutas:
+        coordinates = coordenadas_ruta(ruta.ruta_optimizada)
+        if not coordinates:
+            continue
+        niveles = simplificaciones_ruta(coordinates, ruta.ruta_optimizada.get("indices_geometria"))
+        nuevas += [
+            SimplificacionRuta(
+                ruta=ruta, tolerancia_m=tolerancia,
+                polyline=nivel["polyline"], indices_geometria=nivel["indices_geometria"]
+            )
+            for tolerancia, nivel in niveles.items()
+        ]
+
+    SimplificacionRuta.objects.bulk_create(nuevas, batch_size=500)
+
+
+def _procesos_optimizador():
+    """
+    Procesos que puede usar el optimizador (búsqueda multiarranque, zonas y
+    lotes): todos los núcleos solo si ROUTING_MULTIPROCESO está activo; si
+    no, 1 y nunca se crea un pool de procesos.
+    """
+    return (os.cpu_count() or 1) if settings.ROUTING_MULTIPROCESO else 1
+
+
+def _zonas_particion(localidades):
+    """
+    Localidad de cada parada si la ruta tiene al menos ROUTING_PARADAS_POR_ZONAS
+    paradas (se optimiza por partición y unión de zonas), o None.
+    """
+    umbral = settings.ROUTING_PARADAS_POR_ZONAS
+    return np.asarray(localidades) if umbral and len(localidades) >= umbral else None
+
+
+def calcular_ruta(ruta, progreso=None, presupuesto_ms=None):
+    """
+    Optimiza el orden de entrega de una ruta, consulta su recorrido por vía y
+    guarda el resultado. La ruta debe tener conductor con base y paquetes con
+    coordenadas (lo valida la vista antes de encolar el cálculo).
+
+    Args:
+        ruta: instancia de Ruta
+        progreso: función opcional progreso(porcentaje) para reportar avance
+        presupuesto_ms: tiempo para la búsqueda multiarranque (None = una sola búsqueda)
+
+    Si hay una plantilla que coincide con los paquetes (ver routes/plantillas.py)
+    se reutilizan su orden y su geometría en lugar de optimizar desde cero.
+
+    Returns:
+        dict con orden_paquetes, distancia_km, duracion_min, punto_inicio y
+        plantilla (nombre de la plantilla usada o None)
+    """
+    avanzar = progreso or (lambda porcentaje: None)
+    conductor = ruta.conductor
+
+    # La ruta pudo cambiar entre que se encoló y se procesa
+    if not conductor or conductor.base_lat is None or conductor.base_lng is None:
+        raise ValueError("La ruta no tiene conductor con dirección base configurada")
+
+    # 1. Punto de partida desde la base del conductor
+    start_lat = float(conductor.base_lat)
+    start_lng = float(conductor.base_lng)
+
+    # Cada cálculo (también los fallidos) deja una fila en telemetria_optimizacion
+    telemetria = {"algoritmo": "", "paradas": ruta.total_paquetes}
+    medicion = Medicion()
+    try:
+        with medicion:
+            respuesta = _optimizar_y_guardar(ruta, start_lat, start_lng, avanzar, presupuesto_ms, telemetria)
+    except Exception as e:
+        registrar(nueva_fila(ruta, medicion=medicion, exito=False, error=str(e), **telemetria))
+        raise
+
+    registrar(nueva_fila(ruta, medicion=medicion, **telemetria))
+    avanzar(100)
+    return respuesta
+
+
+def _por_zonas(zonas):
+    # optimizar_paradas solo usa partición y unión con más de una zona
+    return zonas is not None and len(np.unique(zonas)) > 1
+
+
+def _algoritmo(presupuesto_ms, zonas):
+    """
+    Nombre del algoritmo de ordenamiento que usará optimizar_paradas (para la telemetría).
+    """
+    if _por_zonas(zonas):
+        return "zonas"
+    return "multiarranque" if presupuesto_ms else "local"
+
+
+def _optimizar_y_guardar(ruta, start_lat, start_lng, avanzar, presupuesto_ms, telemetria):
+    """
+    Pasos 2 a 4 de calcular_ruta. Completa telemetria (dict) con el
+    algoritmo, las paradas, las distancias y si la ruta quedó estimada.
+    """
+    # 2. Optimizar el orden (Nearest Neighbor + 2-opt + Or-opt)
+    ids, lats, lngs = cargar_coordenadas(ruta.paquetes.all())
+    info_paquetes = {
+        id_paquete: (direccion, estado, localidad)
+        for id_paquete, direccion, estado, localidad in ruta.paquetes.values_list(
+            "id_paquete", "direccion_entrega", "estado_paquete", "localidad_id"
+        )
+    }
+    paquetes = [
+        {
+            "id": int(id_paquete),
+            "lat": float(lat),
+            "lng": float(lng),
+            "direccion": info_paquetes[int(id_paquete)][0],
+            "estado": info_paquetes[int(id_paquete)][1],
+        }
+        for id_paquete, lat, lng in zip(ids, lats, lngs)
+    ]
+    telemetria["paradas"] = len(paquetes)
+    avanzar(10)
+
+    plantilla, asignacion = buscar_plantilla(start_lat, start_lng, lats, lngs)
+    if plantilla is not None:
+        # Ruta repetida: orden y geometría de la plantilla; solo se piden al
+        # backend los tramos que no existían en ella
+        telemetria["algoritmo"] = "plantilla"
+        with cronometrar("tiempo_optimizacion_ms"):
+            ordenados, paradas, claves, anteriores = ordenar_con_plantilla(
+                plantilla, (start_lat, start_lng), paquetes, asignacion, modo=settings.ROUTING_MODO_DISTANCIA
+            )
+        avanzar(60)
+
+        recalculado = _recalcular_tramos(paradas, claves, anteriores)
+        resultado = _resultado_desde_tramos(*recalculado) if recalculado else None
+        registrar_uso(plantilla)
+    else:
+        # Paquetes de la misma parada: la matriz solo se pide para la base y el
+        # líder de cada parada (duración real por vía, caché + OSRM table; si
+        # no está completa se usa Haversine)
+        paradas = agrupar_paradas(lats, lngs, settings.ROUTING_RADIO_PARADA_M)
+        zonas = _zonas_particion([info_paquetes[int(i)][2] for i in ids])
+        costos = None
+        if not _por_zonas(zonas):
+            with cronometrar("tiempo_matriz_ms"):
+                costos = matriz_costos([start_lat, *lats[paradas[1]]], [start_lng, *lngs[paradas[1]]])
+        avanzar(40)
+
+        # Por zonas no se construye la matriz completa: el optimizador pide
+        # solo el bloque de cada zona y los de sus fronteras
+        telemetria["algoritmo"] = _algoritmo(presupuesto_ms, zonas)
+        with cronometrar("tiempo_optimizacion_ms"):
+            orden, _ = optimizar_paradas(
+                start_lat, start_lng, lats, lngs,
+                matriz=costos[0] if costos is not None else None,
+                presupuesto_ms=presupuesto_ms,
+                procesos=_procesos_optimizador(),
+                modo=settings.ROUTING_MODO_DISTANCIA,
+                zonas=zonas,
+                paradas=paradas,
+                matriz_bloque=_bloque_costos if _por_zonas(zonas) else None
+            )
+        avanzar(60)
+
+        ordenados = [paquetes[i] for i in orden]
+
+        # 3. Calcular la ruta por vía (OSRM u otro backend configurado), fuera de la transacción
+        coordenadas = [(start_lat, start_lng)] + [(p["lat"], p["lng"]) for p in ordenados]
+        resultado = calcular_ruta_optimizada(coordenadas)
+
+    distancia_km = resultado["distancia_km"] if resultado else None
+    duracion_min = resultado["duracion_minutos"] if resultado else None
+    telemetria["distancia_recta_km"] = _distancia_recta_km(start_lat, start_lng, ordenados)
+    telemetria["distancia_via_km"] = distancia_km
+    avanzar(90)
+
+    # 4. Guardar orden de los paquetes y la ruta
+    with transaction.atomic():
+        Paquete.objects.bulk_update(
+            [
+                Paquete(id_paquete=p["id"], orden_entrega=idx)
+                for idx, p in enumerate(ordenados, 1)
+            ],
+            ["orden_entrega"]
+        )
+
+        ruta.ruta_optimizada = construir_ruta_optimizada(
+            {"lat": start_lat, "lng": start_lng}, ordenados, resultado
+        )
+        ruta.ruta_optimizada["plantilla"] = plantilla.nombre if plantilla else None
+        ruta.distancia_total_km = distancia_km
+        ruta.tiempo_estimado_minutos = duracion_min
+        ruta.save()
+        guardar_simplificaciones([ruta])
+    telemetria["estimado"] = bool(ruta.ruta_optimizada.get("estimado"))
+
+    return {
+        "orden_paquetes": [p["id"] for p in ordenados],
+        "distancia_km": distancia_km,
+        "duracion_min": duracion_min,
+        "punto_inicio": {"lat": start_lat, "lng": start_lng},
+        "plantilla": plantilla.nombre if plantilla else None
+    }
+
+
+def _distancia_recta_km(start_lat, start_lng, ordenados):
+    coordenadas = np.array([(start_lat, start_lng)] + [(p["lat"], p["lng"]) for p in ordenados], dtype=np.float64)
+    return round(float(distancias_tramos(coordenadas).sum()), 3)
+
+
+def _validar_lote(ruta, paquetes):
+    """
+    Mismas validaciones que calcular_ruta; retorna el mensaje de error o None.
+    """
+    if ruta.estado not in ["Pendiente", "Asignada"]:
+        return f"No se puede calcular la ruta en estado '{ruta.estado}'"
+    if not ruta.conductor:
+        return "La ruta no tiene conductor asignado"
+    if ruta.conductor.base_lat is None or ruta.conductor.base_lng is None:
+        return "El conductor no tiene configurada su dirección base"
+    if not paquetes:
+        return "No hay paquetes asignados"
+    if any(p[1] is None or p[2] is None for p in paquetes):
+        return "Hay paquetes sin coordenadas"
+    return None
+
+
+def _bloque_costos(lats, lngs):
+    # matriz_bloque de optimizar_paradas en rutas por zonas: cada bloque cuenta como tiempo de matriz
+    with cronometrar("tiempo_matriz_ms"):
+        return matriz_costos(lats, lngs)
+
+
+def _optimizar_orden(argumentos, matriz_bloque=None):
+    # Se ejecuta en un proceso del pool: solo recibe y devuelve arrays (y el tiempo en ms).
+    # Con matriz_bloque (consulta la base de datos) se ejecuta en el proceso principal
+    start_lat, start_lng, lats, lngs, matriz, modo, paradas, zonas, presupuesto_ms, procesos = argumentos
+    inicio = time.perf_counter()
+    orden, _ = optimizar_paradas(
+        start_lat, start_lng, lats, lngs, matriz=matriz, presupuesto_ms=presupuesto_ms, procesos=procesos,
+        modo=modo, zonas=zonas, paradas=paradas, matriz_bloque=matriz_bloque
+    )
+    return orden, (time.perf_counter() - inicio) * 1000
+
+
+def calcular_rutas_lote(rutas, presupuesto_ms=None):
+    """
+    Calcula varias rutas en una sola operación: las matrices de costos de
+    todas las rutas se piden a la vez (matrices_costos, peticiones table en un
+    pool de hilos), el orden de cada una se optimiza en paralelo en un pool de
+    procesos (si ROUTING_MULTIPROCESO está activo), las consultas de ruta por vía comparten un pool de hilos
+    (calcular_rutas_optimizadas) y el resultado se guarda con bulk_update en
+    una sola transacción.
+
+    Args:
+        rutas: lista de Ruta (con conductor cargado, p. ej. select_related)
+        presupuesto_ms: tiempo de búsqueda multiarranque por ruta (None = una sola búsqueda)
+
+    Returns:
+        (calculadas, omitidas): listas de dicts con el resumen de cada ruta
+        calculada y el motivo de cada ruta omitida
+    """
+    paquetes_por_ruta = {ruta.id_ruta: [] for ruta in rutas}
+    for ruta_id, *fila in Paquete.objects.filter(ruta__in=rutas).values_list(
+        "ruta_id", "id_paquete", "lat", "lng", "direccion_entrega", "estado_paquete", "localidad_id"
+    ):
+        paquetes_por_ruta[ruta_id].append(fila)
+
+    omitidas = []
+    validas = []
+    for ruta in rutas:
+        error = _validar_lote(ruta, paquetes_por_ruta[ruta.id_ruta])
+        if error:
+            omitidas.append({"id_ruta": ruta.id_ruta, "error": error})
+        else:
+            validas.append(ruta)
+
+    if not validas:
+        return [], omitidas
+
+    # 1. Matrices de costos de todas las rutas (caché + OSRM table, las
+    # peticiones de red en paralelo) y argumentos de cada optimización
+    # (como en calcular_ruta, la matriz solo incluye la base y el líder de cada
+    # parada, y las rutas por zonas no piden la matriz completa)
+    puntos = []
+    for ruta in validas:
+        paquetes = paquetes_por_ruta[ruta.id_ruta]
+        lats = np.array([p[1] for p in paquetes], dtype=np.float64)
+        lngs = np.array([p[2] for p in paquetes], dtype=np.float64)
+        puntos.append((
+            float(ruta.conductor.base_lat), float(ruta.conductor.base_lng), lats, lngs,
+            agrupar_paradas(lats, lngs, settings.ROUTING_RADIO_PARADA_M),
+            _zonas_particion([p[5] for p in paquetes])
+        ))
+
+    mediciones = [Medicion() for _ in validas]
+    completas = [k for k, p in enumerate(puntos) if not _por_zonas(p[5])]
+    matrices = [None] * len(puntos)
+    for k, costos in zip(completas, matrices_costos(
+        [
+            ([start_lat, *lats[paradas[1]]], [start_lng, *lngs[paradas[1]]])
+            for start_lat, start_lng, lats, lngs, paradas, _ in (puntos[k] for k in completas)
+        ],
+        [mediciones[k] for k in completas]
+    )):
+        matrices[k] = costos
+
+    argumentos = [
+        (
+            start_lat, start_lng, lats, lngs,
+            costos[0] if costos is not None else None, settings.ROUTING_MODO_DISTANCIA,
+            paradas, zonas
+        )
+        for (start_lat, start_lng, lats, lngs, paradas, zonas), costos in zip(puntos, matrices)
+    ]
+
+    # 2. Optimización del orden en paralelo (CPU, con ROUTING_MULTIPROCESO).
+    # Con varias rutas cada una usa un núcleo; con una sola, la búsqueda
+    # multiarranque usa todos
+    procesos = min(_procesos_optimizador(), len(completas))
+    if procesos > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            ordenes = dict(zip(completas, executor.map(
+                _optimizar_orden, [(*argumentos[k], presupuesto_ms, 1) for k in completas]
+            )))
+    else:
+        ordenes = {k: _optimizar_orden((*argumentos[k], presupuesto_ms, _procesos_optimizador())) for k in completas}
+
+    # Las rutas por zonas piden los bloques de su matriz (caché, costo_tramo y
+    # OSRM) durante la optimización, así que se optimizan en este proceso
+    for k in range(len(argumentos)):
+        if k not in ordenes:
+            with mediciones[k]:
+                ordenes[k] = _optimizar_orden(
+                    (*argumentos[k], presupuesto_ms, _procesos_optimizador()), matriz_bloque=_bloque_costos
+                )
+    ordenes, tiempos_ms = zip(*(ordenes[k] for k in range(len(argumentos))))
+
+    ordenados_por_ruta = [
+        [
+            {
+                "id": paquetes[i][0],
+                "lat": float(paquetes[i][1]),
+                "lng": float(paquetes[i][2]),
+                "direccion": paquetes[i][3],
+                "estado": paquetes[i][4],
+            }
+            for i in orden
+        ]
+        for paquetes, orden in zip((paquetes_por_ruta[ruta.id_ruta] for ruta in validas), ordenes)
+    ]
+
+    # 3. Rutas por vía de todas las rutas a la vez (I/O)
+    resultados = calcular_rutas_optimizadas([
+        [(a[0], a[1])] + [(p["lat"], p["lng"]) for p in ordenados]
+        for a, ordenados in zip(argumentos, ordenados_por_ruta)
+    ])
+
+    # 4. Guardar todo en lote
+    calculadas = []
+    with transaction.atomic():
+        Paquete.objects.bulk_update(
+            [
+                Paquete(id_paquete=p["id"], orden_entrega=idx)
+                for ordenados in ordenados_por_ruta
+                for idx, p in enumerate(ordenados, 1)
+            ],
+            ["orden_entrega"],
+            batch_size=500
+        )
+
+        for ruta, a, ordenados, resultado in zip(validas, argumentos, ordenados_por_ruta, resultados):
+            ruta.ruta_optimizada = construir_ruta_optimizada({"lat": a[0], "lng": a[1]}, ordenados, resultado)
+            ruta.distancia_total_km = resultado["distancia_km"] if resultado else None
+            ruta.tiempo_estimado_minutos = resultado["duracion_minutos"] if resultado else None
+
+            calculadas.append({
+                "id_ruta": ruta.id_ruta,
+                "codigo_manifiesto": ruta.codigo_manifiesto,
+                "total_paquetes": len(ordenados),
+                "distancia_km": ruta.distancia_total_km,
+                "duracion_min": ruta.tiempo_estimado_minutos,
+            })
+
+        Ruta.objects.bulk_update(
+            validas, ["ruta_optimizada", "distancia_total_km", "tiempo_estimado_minutos"], batch_size=100
+        )
+        guardar_simplificaciones(validas)
+
+    # Telemetría por ruta: matriz y optimización propias; el enrutamiento es
+    # compartido por todo el lote, así que su tiempo y el total quedan en null
+    registrar(*[
+        nueva_fila(
+            ruta, _algoritmo(presupuesto_ms, a[7]), len(ordenados), medicion=medicion,
+            operacion=TelemetriaOptimizacion.Operacion.CALCULAR_LOTE,
+            tiempo_total_ms=None, tiempo_optimizacion_ms=tiempo_ms,
+            distancia_recta_km=_distancia_recta_km(a[0], a[1], ordenados),
+            distancia_via_km=resultado["distancia_km"] if resultado else None,
+            estimado=ruta.ruta_optimizada.get("estimado")
+        )
+        for ruta, a, ordenados, resultado, medicion, tiempo_ms in zip(
+            validas, argumentos, ordenados_por_ruta, resultados, mediciones, tiempos_ms
+        )
+    ])
+
+    return calculadas, omitidas
+
+
+def _recalcular_tramos(paradas, claves, anteriores):
+    """
+    Reutiliza los tramos que no cambiaron y pide al backend de enrutamiento solo
+    los tramos nuevos, agrupados en secuencias contiguas.
+
+    Args:
+        paradas: [(lat, lng), ...] del nuevo recorrido, incluyendo el punto de inicio
+        claves: identificador de cada parada (mismo largo que paradas)
+        anteriores: dict {(clave_a, clave_b): (tramo, geometria)} del recorrido previo
+
+    Returns:
+        (tramos, geometrias) o None si el backend falla
+    """
+    tramos = [None] * (len(paradas) - 1)
+    geometrias = [None] * (len(paradas) - 1)
+
+    for i, par in enumerate(zip(claves[:-1], claves[1:])):
+        if par in anteriores:
+            tramos[i], geometrias[i] = anteriores[par]
+
+    i = 0
+    while i < len(tramos):
+        if tramos[i] is not None:
+            i += 1
+            continue
+
+        fin = i
+        while fin < len(tramos) and tramos[fin] is None:
+            fin += 1
+
+        resultado = calcular_ruta_optimizada(paradas[i:fin + 1])
+        if resultado is None or len(resultado["tramos"]) != fin - i:
+            return None
+
+        coordinates = resultado["geometry"]["coordinates"]
+        partes = dividir_por_tramos(coordinates, indices_paradas(coordinates, paradas[i:fin + 1]))
+        for k in range(i, fin):
+            tramos[k] = resultado["tramos"][k - i]
+            geometrias[k] = partes[k - i]
+
+        i = fin
+
+    return tramos, geometrias
+
+
+def _resultado_desde_tramos(tramos, geometrias):
+    """
+    Une los tramos recalculados en el mismo formato de calcular_ruta_optimizada.
+    """
+    coordinates, indices = unir_tramos(geometrias)
+    return {
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+        "tramos": tramos,
+        "indices_geometria": indices,
+        "distancia_km": round(sum(t["distancia_m"] for t in tramos) / 1000, 2),
+        "duracion_minutos": round(sum(t["duracion_s"] for t in tramos) / 60),
+    }
+
+
+def _paquetes_en_orden(ruta, excluir=()):
+    """
+    Paquetes de la ruta con orden_entrega y coordenadas, en orden de entrega.
+    """
+    return [
+        {"id": id_paquete, "lat": float(lat), "lng": float(lng), "direccion": direccion, "estado": estado}
+        for id_paquete, lat, lng, direccion, estado in Paquete.objects.filter(
+            ruta=ruta, orden_entrega__isnull=False, lat__isnull=False, lng__isnull=False
+        ).exclude(id_paquete__in=excluir).order_by("orden_entrega").values_list(
+            "id_paquete", "lat", "lng", "direccion_entrega", "estado_paquete"
+        )
+    ]
+
+
+def insertar_paquetes(ruta, paquetes_ids):
+    """
+    Inserta paquetes en una ruta ya calculada sin recalcularla completa:
+    cada paquete va a su posición más barata dentro del orden vigente (duración
+    por vía de matriz_costos) y solo se actualiza orden_entrega de los paquetes
+    que se desplazan. El recorrido por vía no se pide aquí: lo actualiza el
+    worker con actualizar_tramos (trabajo "actualizar_tramos").
+
+    Returns:
+        dict {id_paquete: orden_entrega} de los paquetes insertados,
+        o None si la ruta no tiene un cálculo previo utilizable
+    """
+    datos = ruta.ruta_optimizada
+    if not datos or not datos.get("orden_paquetes"):
+        return None
+
+    paquetes_ids = {int(id_paquete) for id_paquete in paquetes_ids}
+
+    nuevos = [
+        {"id": id_paquete, "lat": float(lat), "lng": float(lng)}
+        for id_paquete, lat, lng in Paquete.objects.filter(
+            id_paquete__in=paquetes_ids, lat__isnull=False, lng__isnull=False
+        ).values_list("id_paquete", "lat", "lng")
+    ]
+    if len(nuevos) != len(paquetes_ids):
+        return None
+
+    # El orden vigente está en los paquetes (puede haber inserciones cuyo
+    # recorrido aún no actualizó el worker)
+    inicio = datos["punto_inicio"]
+    vigentes = _paquetes_en_orden(ruta, excluir=paquetes_ids)
+    existentes = [p["id"] for p in vigentes]
+    todos = existentes + [p["id"] for p in nuevos]
+    coordenadas = {p["id"]: (p["lat"], p["lng"]) for p in vigentes + nuevos}
+
+    lats = np.array([inicio["lat"]] + [coordenadas[i][0] for i in todos])
+    lngs = np.array([inicio["lng"]] + [coordenadas[i][1] for i in todos])
+    costos = matriz_costos(lats, lngs)
+    matriz = costos[0] if costos is not None else matriz_haversine(lats, lngs, modo=settings.ROUTING_MODO_DISTANCIA)
+
+    recorrido = insercion_mas_barata(
+        matriz,
+        np.arange(len(existentes) + 1),
+        np.arange(len(existentes) + 1, len(todos) + 1)
+    )
+    ordenados = [todos[i - 1] for i in recorrido[1:]]
+
+    # Solo los paquetes que cambian de posición (los existentes ya tienen 1..n en orden)
+    anteriores = {id_paquete: idx for idx, id_paquete in enumerate(existentes, 1)}
+    Paquete.objects.bulk_update(
+        [
+            Paquete(id_paquete=id_paquete, orden_entrega=idx)
+            for idx, id_paquete in enumerate(ordenados, 1)
+            if anteriores.get(id_paquete) != idx
+        ],
+        ["orden_entrega"]
+    )
+
+    return {
+        id_paquete: idx
+        for idx, id_paquete in enumerate(ordenados, 1)
+        if id_paquete in paquetes_ids
+    }
+
+
+def actualizar_tramos(ruta, progreso=None):
+    """
+    Actualiza el recorrido por vía de la ruta al orden vigente de sus paquetes
+    (p. ej. después de insertar_paquetes): reutiliza los tramos del cálculo
+    anterior y solo pide al backend de enrutamiento los que cambiaron.
+
+    Returns:
+        dict con orden_paquetes, distancia_km, duracion_min y tramos_recalculados
+    """
+    datos = ruta.ruta_optimizada
+    if not datos or not datos.get("punto_inicio"):
+        raise ValueError("La ruta no tiene un cálculo previo; usa calcular_ruta")
+
+    inicio = datos["punto_inicio"]
+    ordenados = _paquetes_en_orden(ruta)
+    previos = datos.get("paquetes") or []
+
+    paradas = [(inicio["lat"], inicio["lng"])] + [(p["lat"], p["lng"]) for p in ordenados]
+    claves = ["inicio"] + [p["id"] for p in ordenados]
+
+    anteriores = {}
+    coordinates_previas = coordenadas_ruta(datos)
+    tramos_previos = datos.get("tramos") or []
+    indices_previos = datos.get("indices_geometria") or []
+    if coordinates_previas and len(tramos_previos) == len(previos) and len(indices_previos) == len(previos) + 1:
+        claves_previas = ["inicio"] + [p["id"] for p in previos]
+        partes = dividir_por_tramos(coordinates_previas, indices_previos)
+        anteriores = {
+            par: (tramo, parte)
+            for par, tramo, parte in zip(zip(claves_previas[:-1], claves_previas[1:]), tramos_previos, partes)
+        }
+
+    recalculado = _recalcular_tramos(paradas, claves, anteriores)
+    resultado = _resultado_desde_tramos(*recalculado) if recalculado else None
+
+    ruta.ruta_optimizada = construir_ruta_optimizada(inicio, ordenados, resultado)
+    ruta.distancia_total_km = resultado["distancia_km"] if resultado else None
+    ruta.tiempo_estimado_minutos = resultado["duracion_minutos"] if resultado else None
+    with transaction.atomic():
+        ruta.save(update_fields=["ruta_optimizada", "distancia_total_km", "tiempo_estimado_minutos"])
+        guardar_simplificaciones([ruta])
+
+    if progreso:
+        progreso(100)
+
+    return {
+        "orden_paquetes": [p["id"] for p in ordenados],
+        "distancia_km": ruta.distancia_total_km,
+        "duracion_min": ruta.tiempo_estimado_minutos,
+        "tramos_recalculados": sum(par not in anteriores for par in zip(claves[:-1], claves[1:])),
+    }
@@ -0,0 +1,201 @@
+"""
+Telemetría de las optimizaciones de ruta.
+
+calcular_ruta y calcular_rutas_lote abren una Medicion; mientras está activa,
+los puntos instrumentados (matriz de costos, optimizador, consultas de ruta
+por vía) suman tiempos y contadores con cronometrar() y sumar(). Al terminar
+se guarda una fila compacta en telemetria_optimizacion con registrar(); las
+filas con más de ROUTING_TELEMETRIA_DIAS días se borran periódicamente
+(python manage.py limpiar_vencidos, que también ejecuta el worker).
+Fuera de una Medicion sumar() no hace nada, así que los mismos servicios se
+pueden usar sin telemetría (p. ej. desde el benchmark).
+
+La medición vive en una ContextVar: solo cuenta lo que ocurre en el hilo que
+la abrió, por eso los contadores se suman en el hilo principal y no dentro
+de los pools de hilos o procesos.
+"""
+
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TelemetriaOptimizacion
+
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 95, 99)
+RANGOS_PARADAS = ((1, 25), (26, 100), (101, 500), (501, None))
+METRICAS = (
+    "tiempo_total_ms", "tiempo_matriz_ms", "tiempo_optimizacion_ms", "tiempo_enrutamiento_ms",
+    "factor_circuito", "km_por_parada",
+)
+
+_medicion = ContextVar("medicion_optimizacion", default=None)
+
+
+class Medicion:
+    """
+    Acumula tiempos (ms) y contadores de una optimización mientras está activa.
+
+        with Medicion() as medicion:
+            ...
+        registrar(nueva_fila(ruta, algoritmo, paradas, medicion=medicion))
+    """
+
+    def __init__(self):
+        self.valores = defaultdict(float)
+        self._inicio = None
+        self._token = None
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        self._token = _medicion.set(self)
+        return self
+
+    def __exit__(self, *excepcion):
+        self.valores["tiempo_total_ms"] += (time.perf_counter() - self._inicio) * 1000
+        _medicion.reset(self._token)
+        return False
+
+
+def sumar(campo, valor):
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.valores[campo] += valor
+
+
+@contextmanager
+def cronometrar(campo):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        sumar(campo, (time.perf_counter() - inicio) * 1000)
+
+
+def nueva_fila(ruta, algoritmo, paradas, medicion=None, operacion=TelemetriaOptimizacion.Operacion.CALCULAR_RUTA,
+               **campos):
+    """
+    Fila de telemetría sin guardar. Los tiempos y contadores de la medición
+    se combinan con los campos enviados (que tienen prioridad).
+    """
+    valores = dict(medicion.valores) if medicion else {}
+    valores.update(campos)
+
+    return TelemetriaOptimizacion(
+        ruta=ruta,
+        operacion=operacion,
+        algoritmo=algoritmo,
+        paradas=paradas,
+        exito=valores.get("exito", True),
+        estimado=bool(valores.get("estimado", False)),
+        error=(valores.get("error") or "")[:255],
+        tiempo_total_ms=_ms(valores.get("tiempo_total_ms")),
+        tiempo_matriz_ms=_ms(valores.get("tiempo_matriz_ms")),
+        tiempo_optimizacion_ms=_ms(valores.get("tiempo_optimizacion_ms")),
+        tiempo_enrutamiento_ms=_ms(valores.get("tiempo_enrutamiento_ms")),
+        aciertos_cache=int(valores.get("aciertos_cache", 0)),
+        consultas_backend=int(valores.get("consultas_backend", 0)),
+        distancia_recta_km=valores.get("distancia_recta_km"),
+        distancia_via_km=valores.get("distancia_via_km"),
+    )
+
+
+def registrar(*filas):
+    """
+    Guarda las filas de telemetría (ver nueva_fila) en una sola consulta.
+    Nunca interrumpe el cálculo: si falla el guardado solo se reporta.
+    """
+    try:
+        # Savepoint propio: un error aquí no debe dejar inválida la transacción de quien llama
+        with transaction.atomic():
+            TelemetriaOptimizacion.objects.bulk_create(filas)
+    except Exception:
+        logger.exception("Error guardando telemetría de optimización (%s filas)", len(filas))
+
+
+def descartar_antiguas():
+    """
+    Borra las filas con más de ROUTING_TELEMETRIA_DIAS días (ver limpiar_vencidos).
+
+    Returns:
+        cantidad de filas borradas
+    """
+    borradas, _ = TelemetriaOptimizacion.objects.filter(
+        fecha__lt=timezone.now() - timedelta(days=settings.ROUTING_TELEMETRIA_DIAS)
+    ).delete()
+    return borradas
+
+
+def _ms(valor):
+    return None if valor is None else int(round(valor))
+
+
+def _percentiles(valores):
+    valores = np.asarray([v for v in valores if v is not None], dtype=np.float64)
+    if not len(valores):
+        return None
+    return {
+        **{f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(valores, PERCENTILES))},
+        "max": round(float(valores.max()), 2)
+    }
+
+
+def _resumen_filas(filas):
+    """
+    filas: tuplas (paradas, exito, estimado, tiempo_total_ms, tiempo_matriz_ms,
+    tiempo_optimizacion_ms, tiempo_enrutamiento_ms, aciertos_cache,
+    consultas_backend, distancia_recta_km, distancia_via_km)
+    """
+    exitosas = [f for f in filas if f[1]]
+    aciertos = sum(f[7] for f in exitosas)
+    consultas = sum(f[8] for f in exitosas)
+
+    columnas = {
+        "tiempo_total_ms": [f[3] for f in exitosas],
+        "tiempo_matriz_ms": [f[4] for f in exitosas],
+        "tiempo_optimizacion_ms": [f[5] for f in exitosas],
+        "tiempo_enrutamiento_ms": [f[6] for f in exitosas],
+        # Calidad: recorrido por vía frente al recorrido en línea recta y km por parada
+        "factor_circuito": [f[10] / f[9] for f in exitosas if f[9] and f[10] is not None],
+        "km_por_parada": [f[10] / f[0] for f in exitosas if f[0] and f[10] is not None],
+    }
+
+    return {
+        "total": len(filas),
+        "fallidas": len(filas) - len(exitosas),
+        "estimadas": sum(1 for f in exitosas if f[2]),
+        "tasa_aciertos_cache": round(aciertos / (aciertos + consultas), 3) if aciertos + consultas else None,
+        **{metrica: _percentiles(columnas[metrica]) for metrica in METRICAS},
+    }
+
+
+def resumen_telemetria(queryset):
+    """
+    Percentiles de tiempo y calidad de las optimizaciones del queryset, en
+    total y por rango de cantidad de paradas.
+    """
+    filas = list(queryset.values_list(
+        "paradas", "exito", "estimado", "tiempo_total_ms", "tiempo_matriz_ms", "tiempo_optimizacion_ms",
+        "tiempo_enrutamiento_ms", "aciertos_cache", "consultas_backend", "distancia_recta_km", "distancia_via_km"
+    ))
+
+    rangos = []
+    for minimo, maximo in RANGOS_PARADAS:
+        propias = [f for f in filas if f[0] >= minimo and (maximo is None or f[0] <= maximo)]
+        if propias:
+            rangos.append({
+                "paradas": f"{minimo}-{maximo}" if maximo else f"{minimo}+",
+                **_resumen_filas(propias),
+            })
+
+    return {"general": _resumen_filas(filas), "por_paradas": rangos}
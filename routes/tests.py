@@ -1,3 +1,1026 @@
-from django.test import TestCase
+import heapq
+import math
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from config.grafo_vial import GrafoVial, construir_grafo, guardar_grafo, preprocesar
+from config.osm_service import OSMService
+from config.routing import CircuitoEnrutamiento, HaversineBackend, OSRMBackend, get_routing_backend
+from drivers.models import Driver
+from empresa.models import Empresa
+from packages.models import Cliente, Localidad, Paquete
+from users.models import Rol, Usuario
+from vehicles.models import Vehiculo
+
+from .benchmark import nearest_neighbor_haversine
+from .cache import CacheLRU, buscar_ruta, cache_rutas, descartar_vencidas, guardar_ruta
+from .enrutamiento import _rutas_segmentadas, _segmentos
+from .estimacion import cache_calibracion, estimar_ruta
+from .geodesia import RADIO_TIERRA_KM, distancias_desde, distancias_tramos, matriz_distancias, preparar_puntos
+from .geometria import (
+    TOLERANCIAS_SIMPLIFICACION, codificar_polilinea, decodificar_polilinea, simplificaciones_ruta, tramos_restantes
+)
+from .llegadas import estimar_llegadas
+from .matriz import PRECISION, cache_tramos, cuantizar, matriz_costos
+from .models import (
+    CostoTramo, PlantillaRuta, RespuestaRuta, Ruta, SimplificacionRuta, TelemetriaOptimizacion, TrabajoRuta
+)
+from .optimizador import (
+    agrupar_paradas, longitud_recorrido, matriz_haversine, optimizar_multiarranque,
+    optimizar_paradas, optimizar_recorrido, vecino_mas_cercano
+)
+from .planificador import resolver_cvrp
+from .services import calcular_ruta
+from .telemetria import registrar
+from .trabajos import encolar_calculo, tomar_siguiente
+
+
+BASE = (4.65, -74.1)
+
+
+def _paquetes_aleatorios(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return 4.6 + rng.random(n) * 0.15, -74.15 + rng.random(n) * 0.1
+
+
+def _longitud_km(start_lat, start_lng, lats, lngs, orden):
+    coordenadas = np.column_stack((
+        np.concatenate(([start_lat], np.asarray(lats)[orden])), np.concatenate(([start_lng], np.asarray(lngs)[orden]))
+    ))
+    return float(distancias_tramos(coordenadas).sum())
+
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    # Referencia escalar, independiente de los kernels vectorizados
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+def _grafo_cuadricula(directorio, lado=12, semilla=0):
+    """
+    Grafo vial de una cuadrícula de calles con tipos de vía al azar y
+    algunas de un solo sentido, guardado en directorio.
+    """
+    rng = np.random.default_rng(semilla)
+    coordenadas = {
+        fila * lado + columna: (4.6 + fila * 0.002 + rng.normal(0, 2e-4), -74.1 + columna * 0.002 + rng.normal(0, 2e-4))
+        for fila in range(lado)
+        for columna in range(lado)
+    }
+
+    tipos = ["primary", "secondary", "tertiary", "residential"]
+    vias = []
+    for k in range(lado):
+        for nodos in ([k * lado + c for c in range(lado)], [f * lado + k for f in range(lado)]):
+            etiquetas = {"highway": tipos[rng.integers(len(tipos))]}
+            if rng.random() < 0.3:
+                etiquetas["oneway"] = "yes"
+            vias.append((nodos, etiquetas))
+
+    guardar_grafo(preprocesar(construir_grafo(coordenadas, vias), num_hitos=4), directorio)
+    return GrafoVial(directorio)
+
+
+def _dijkstra(grafo, origen):
+    costos = np.full(grafo.n, np.inf)
+    costos[origen] = 0
+    cola = [(0.0, origen)]
+
+    while cola:
+        costo, nodo = heapq.heappop(cola)
+        if costo > costos[nodo]:
+            continue
+        for arista in range(int(grafo.indptr[nodo]), int(grafo.indptr[nodo + 1])):
+            vecino = int(grafo.destino[arista])
+            nuevo = costo + float(grafo.duracion_s[arista])
+            if nuevo < costos[vecino]:
+                costos[vecino] = nuevo
+                heapq.heappush(cola, (nuevo, vecino))
+
+    return costos
+
+
+class BackendContado(HaversineBackend):
+    """
+    HaversineBackend que registra cuántas coordenadas tuvo cada consulta de route.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.consultas = []
+
+    def route(self, coordenadas):
+        self.consultas.append(len(coordenadas))
+        return super().route(coordenadas)
+
+
+class OptimizadorTests(SimpleTestCase):
+
+    def test_orden_es_una_permutacion(self):
+        for n in (1, 2, 3, 10, 150):
+            lats, lngs = _paquetes_aleatorios(n, semilla=n)
+            orden, _ = optimizar_paradas(*BASE, lats, lngs)
+            self.assertEqual(sorted(orden.tolist()), list(range(n)))
+
+    def test_nunca_mas_largo_que_vecino_mas_cercano(self):
+        for semilla in range(5):
+            lats, lngs = _paquetes_aleatorios(80, semilla=semilla)
+            orden, distancia_km = optimizar_paradas(*BASE, lats, lngs)
+
+            paquetes = [{"id": i, "lat": lat, "lng": lng} for i, (lat, lng) in enumerate(zip(lats, lngs))]
+            orden_nn = [p["id"] for p in nearest_neighbor_haversine(*BASE, paquetes)]
+
+            self.assertAlmostEqual(distancia_km, _longitud_km(*BASE, lats, lngs, orden), places=6)
+            self.assertLessEqual(distancia_km, _longitud_km(*BASE, lats, lngs, orden_nn) + 1e-9)
+
+    def test_recorrido_con_matriz_asimetrica(self):
+        rng = np.random.default_rng(3)
+        matriz = rng.random((40, 40)) * 100
+        np.fill_diagonal(matriz, 0)
+
+        recorrido = optimizar_recorrido(matriz)
+        self.assertEqual(sorted(recorrido.tolist()), list(range(1, 40)))
+        self.assertLessEqual(
+            longitud_recorrido(np.concatenate(([0], recorrido)), matriz),
+            longitud_recorrido(vecino_mas_cercano(matriz), matriz) + 1e-9
+        )
+
+    def test_multiarranque_no_empeora_la_busqueda_local(self):
+        lats, lngs = _paquetes_aleatorios(60, semilla=7)
+        matriz = matriz_haversine(np.concatenate(([BASE[0]], lats)), np.concatenate(([BASE[1]], lngs)))
+
+        local = optimizar_recorrido(matriz)
+        multiarranque = optimizar_multiarranque(matriz, presupuesto_ms=100, procesos=1)
+
+        self.assertEqual(sorted(multiarranque.tolist()), list(range(1, 61)))
+        self.assertLessEqual(
+            longitud_recorrido(np.concatenate(([0], multiarranque)), matriz),
+            longitud_recorrido(np.concatenate(([0], local)), matriz) + 1e-9
+        )
+
+    def test_paquetes_de_la_misma_parada_quedan_consecutivos(self):
+        rng = np.random.default_rng(1)
+        edificios = np.column_stack(_paquetes_aleatorios(20, semilla=2))
+        puntos = np.repeat(edificios, 3, axis=0) + rng.normal(0, 0.00002, (60, 2))
+
+        grupos, lideres = agrupar_paradas(puntos[:, 0], puntos[:, 1], 15)
+        self.assertEqual(len(lideres), 20)
+
+        orden, _ = optimizar_paradas(*BASE, puntos[:, 0], puntos[:, 1], radio_parada_m=15)
+        self.assertEqual(sorted(orden.tolist()), list(range(60)))
+        for parada in range(20):
+            posiciones = np.flatnonzero(grupos[orden] == parada)
+            self.assertEqual(posiciones[-1] - posiciones[0], len(posiciones) - 1)
+
+    def test_por_zonas_solo_pide_bloques(self):
+        lats, lngs = _paquetes_aleatorios(90, semilla=4)
+        zonas = np.repeat(np.arange(3), 30)
+        pedidos = []
+
+        def matriz_bloque(lats_bloque, lngs_bloque):
+            pedidos.append(len(lats_bloque))
+            distancias = matriz_haversine(lats_bloque, lngs_bloque) * 1000
+            return distancias / 8, distancias
+
+        orden, _ = optimizar_paradas(*BASE, lats, lngs, zonas=zonas, procesos=1, matriz_bloque=matriz_bloque)
+
+        self.assertEqual(sorted(orden.tolist()), list(range(90)))
+        self.assertTrue(pedidos)
+        self.assertLess(max(pedidos), 91)
+        # Cada zona se recorre completa antes de pasar a la siguiente
+        self.assertEqual(int((np.diff(zonas[orden]) != 0).sum()), 2)
+
+
+class GeometriaTests(SimpleTestCase):
+
+    def test_polilinea_ida_y_vuelta(self):
+        rng = np.random.default_rng(0)
+        coordinates = np.round(
+            np.column_stack((-74.2 + rng.random(500) * 0.2, 4.5 + rng.random(500) * 0.3)), 5
+        ).tolist()
+
+        self.assertEqual(decodificar_polilinea(codificar_polilinea(coordinates)), coordinates)
+        self.assertEqual(decodificar_polilinea(codificar_polilinea([])), [])
+
+    def test_polilinea_con_otra_precision(self):
+        coordinates = [[-74.123456, 4.654321], [-74.0, 4.7], [-73.999999, 4.700001]]
+        self.assertEqual(decodificar_polilinea(codificar_polilinea(coordinates, precision=6), precision=6), coordinates)
+
+    def test_simplificacion_conserva_las_paradas(self):
+        rng = np.random.default_rng(0)
+        lng = -74.15 + np.cumsum(rng.normal(2e-5, 1e-5, 2000))
+        lat = 4.6 + np.cumsum(rng.normal(1e-5, 1e-5, 2000))
+        coordinates = np.round(np.column_stack((lng, lat)), 5).tolist()
+        indices = [0, 700, 1500, 1999]
+
+        niveles = simplificaciones_ruta(coordinates, indices)
+
+        self.assertEqual(list(niveles), list(TOLERANCIAS_SIMPLIFICACION))
+        tamanos = []
+        for nivel in niveles.values():
+            simplificada = decodificar_polilinea(nivel["polyline"])
+            tamanos.append(len(simplificada))
+            self.assertEqual([simplificada[i] for i in nivel["indices_geometria"]], [coordinates[i] for i in indices])
+        self.assertLess(tamanos[0], len(coordinates))
+        self.assertEqual(tamanos, sorted(tamanos, reverse=True))
+
+
+class GeodesiaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.lats, self.lngs = _paquetes_aleatorios(40, semilla=12)
+        self.puntos = preparar_puntos(self.lats, self.lngs)
+
+    def test_kernels_coinciden_con_haversine(self):
+        esperada = np.array([
+            [_haversine_km(a, b, c, d) for c, d in zip(self.lats, self.lngs)]
+            for a, b in zip(self.lats, self.lngs)
+        ])
+
+        matriz = matriz_distancias(self.puntos)
+        np.testing.assert_allclose(matriz, esperada, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(distancias_desde(3, self.puntos), esperada[3], rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(
+            distancias_desde((self.lats[3], self.lngs[3]), np.column_stack((self.lats, self.lngs))),
+            esperada[3], rtol=1e-9, atol=1e-9
+        )
+        np.testing.assert_allclose(distancias_tramos(self.puntos), np.diagonal(esperada, 1), rtol=1e-9)
+        np.testing.assert_allclose(
+            matriz_distancias(self.puntos[:5], self.puntos[10:20]), esperada[:5, 10:20], rtol=1e-9
+        )
+
+    def test_cota_de_error_equirectangular(self):
+        # Cotas del docstring de routes/geodesia.py: ±0.5° alrededor de Bogotá
+        # y toda la ciudad incluida Sumapaz
+        rng = np.random.default_rng(13)
+        for (lat_min, lat_max, lng_min, lng_max), cota in (
+            ((4.15, 5.15, -74.6, -73.6), 0.001),
+            ((3.73, 4.84, -74.45, -73.99), 0.002),
+        ):
+            puntos = preparar_puntos(rng.uniform(lat_min, lat_max, 300), rng.uniform(lng_min, lng_max, 300))
+            exacta = matriz_distancias(puntos)
+            plana = matriz_distancias(puntos, modo="equirectangular")
+
+            self.assertEqual(plana.dtype, np.float32)
+            lejanos = exacta > 0.3
+            self.assertLess(np.abs(plana[lejanos] / exacta[lejanos] - 1).max(), cota)
+            np.testing.assert_allclose(
+                distancias_tramos(puntos, modo="equirectangular"), np.diagonal(plana, 1), rtol=1e-5
+            )
+
+    def test_subconjunto_conserva_la_referencia(self):
+        subconjunto = self.puntos[[4, 9, 30]]
+
+        np.testing.assert_array_equal(subconjunto.planas(), self.puntos.planas()[[4, 9, 30]])
+        np.testing.assert_allclose(
+            distancias_desde(0, subconjunto, modo="equirectangular"),
+            matriz_distancias(self.puntos, modo="equirectangular")[4, [4, 9, 30]], rtol=1e-6
+        )
+
+    def test_modo_desconocido(self):
+        with self.assertRaises(ValueError):
+            matriz_distancias(self.puntos, modo="manhattan")
+
+
+class GrafoVialTests(SimpleTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.grafo = _grafo_cuadricula(directorio.name)
+        self.rng = np.random.default_rng(5)
+
+    def test_camino_igual_a_dijkstra(self):
+        for origen, destino in self.rng.integers(self.grafo.n, size=(25, 2)).tolist():
+            duracion, distancia, aristas = self.grafo.camino(origen, destino)
+
+            self.assertAlmostEqual(duracion, _dijkstra(self.grafo, origen)[destino], places=6)
+            self.assertAlmostEqual(duracion, float(self.grafo.duracion_s[aristas].astype(np.float64).sum()), places=3)
+            self.assertAlmostEqual(distancia, float(self.grafo.distancia_m[aristas].sum()), places=3)
+
+            # Las aristas forman un camino continuo de origen a destino
+            nodo = origen
+            for arista in aristas:
+                self.assertTrue(self.grafo.indptr[nodo] <= arista < self.grafo.indptr[nodo + 1])
+                nodo = int(self.grafo.destino[arista])
+            self.assertEqual(nodo, destino)
+
+    def test_matriz_igual_a_dijkstra(self):
+        origenes = self.rng.choice(self.grafo.n, 6, replace=False)
+        destinos = self.rng.choice(self.grafo.n, 9, replace=False)
+
+        duraciones, distancias = self.grafo.matriz(origenes, destinos)
+
+        esperadas = np.array([_dijkstra(self.grafo, int(o))[destinos] for o in origenes])
+        np.testing.assert_allclose(duraciones, esperadas, rtol=1e-5)
+        for i, origen in enumerate(origenes.tolist()):
+            for j, destino in enumerate(destinos.tolist()):
+                self.assertAlmostEqual(distancias[i, j], self.grafo.camino(origen, destino)[1], delta=0.1)
+
+
+def _crear_conductor(numero, tipo=Vehiculo.TipoVehiculo.FURGON, base=BASE):
+    empresa = Empresa.objects.first() or Empresa.objects.create(nit="1", nombre_empresa="e", telefono_empresa="1")
+    rol, _ = Rol.objects.get_or_create(nombre_rol="driver")
+    vehiculo = Vehiculo.objects.create(tipo=tipo, placa=f"ABC{numero:03d}", imagen="http://x")
+    usuario = Usuario.objects.create(
+        supabase_uid=str(numero), correo=f"{numero}@x.co", nombre=f"c{numero}", apellido="x",
+        empresa=empresa, telefono_movil="1", rol=rol, documento=str(numero)
+    )
+
+    conductor = Driver.objects.get(conductor=usuario)
+    conductor.vehiculo = vehiculo
+    conductor.base_lat, conductor.base_lng = Decimal(str(base[0])), Decimal(str(base[1]))
+    conductor.save()
+    return conductor
+
+
+class RutasTestCase(TestCase):
+    """
+    Datos de prueba con el backend en línea recta (sin red).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(
+            nombre="a", apellido="b", direccion="c", correo="a@b.co", telefono_movil="1"
+        )
+        cls.localidades = [Localidad.objects.create(nombre=nombre) for nombre in Localidad.LocalidadChoices.values]
+
+    def setUp(self):
+        ajustes = override_settings(ROUTING_BACKEND="config.routing.HaversineBackend")
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        get_routing_backend.cache_clear()
+        self.addCleanup(get_routing_backend.cache_clear)
+
+        self.client = APIClient()
+        self._conductores = 0
+
+    def crear_conductor(self, **kwargs):
+        self._conductores += 1
+        return _crear_conductor(self._conductores, **kwargs)
+
+    def crear_paquetes(self, n, estado="Pendiente", ruta=None, centro=None, semilla=0):
+        if centro is None:
+            lats, lngs = _paquetes_aleatorios(n, semilla=semilla)
+        else:
+            rng = np.random.default_rng(semilla)
+            lats, lngs = centro[0] + rng.normal(0, 0.003, n), centro[1] + rng.normal(0, 0.003, n)
+
+        return Paquete.objects.bulk_create([
+            Paquete(
+                largo=30, ancho=20, alto=10, peso=2, valor_declarado=1, cantidad=1,
+                cliente=self.cliente, localidad=self.localidades[i % len(self.localidades)],
+                lat=Decimal(str(round(lat, 7))), lng=Decimal(str(round(lng, 7))),
+                direccion_entrega=f"calle {i}", estado_paquete=estado, ruta=ruta
+            )
+            for i, (lat, lng) in enumerate(zip(lats, lngs))
+        ])
+
+    def crear_ruta(self, n, conductor=None, estado="Asignada", **kwargs):
+        ruta = Ruta.objects.create(conductor=conductor, estado=estado)
+        self.crear_paquetes(n, estado="Asignado", ruta=ruta, **kwargs)
+        ruta.total_paquetes = n
+        ruta.save()
+        return ruta
+
+    def procesar_trabajos(self):
+        call_command("procesar_trabajos", una_vez=True, stdout=StringIO())
+
+
+@override_settings(ROUTING_BACKEND="config.routing.HaversineBackend")
+class MatrizCostosTests(TestCase):
+
+    def setUp(self):
+        get_routing_backend.cache_clear()
+        self.addCleanup(get_routing_backend.cache_clear)
+        cache_tramos.limpiar()
+        self.addCleanup(cache_tramos.limpiar)
+
+    def test_costos_se_guardan_y_se_reutilizan(self):
+        lats, lngs = _paquetes_aleatorios(12, semilla=20)
+        cuantizados = [(lat / 10 ** PRECISION, lng / 10 ** PRECISION) for lat, lng in map(cuantizar, lats, lngs)]
+        esperada = HaversineBackend().table(cuantizados)
+
+        with mock.patch.object(OSMService, "calcular_matriz", wraps=OSMService.calcular_matriz) as consultas:
+            duraciones, distancias = matriz_costos(lats, lngs)
+            self.assertTrue(consultas.called)
+            np.testing.assert_allclose(duraciones, esperada["duraciones"], rtol=1e-9)
+            np.testing.assert_allclose(distancias, esperada["distancias"], rtol=1e-9)
+            self.assertEqual(CostoTramo.objects.count(), 12 * 11)
+
+            # Sin el LRU los costos salen de costo_tramo y sin costo_tramo, del LRU
+            consultas.reset_mock()
+            cache_tramos.limpiar()
+            np.testing.assert_array_equal(matriz_costos(lats, lngs)[0], duraciones)
+            CostoTramo.objects.all().delete()
+            np.testing.assert_array_equal(matriz_costos(lats, lngs)[1], distancias)
+            consultas.assert_not_called()
+
+    def test_puntos_repetidos_cuestan_cero(self):
+        lats, lngs = _paquetes_aleatorios(6, semilla=21)
+        # El último paquete está en el mismo edificio que el primero (~5 m)
+        lats, lngs = np.append(lats, lats[0] + 0.00001), np.append(lngs, lngs[0])
+
+        duraciones, distancias = matriz_costos(lats, lngs)
+
+        self.assertEqual(duraciones.shape, (7, 7))
+        self.assertEqual(distancias[0, 6], 0)
+        np.testing.assert_array_equal(duraciones[6, :6], duraciones[0, :6])
+        self.assertEqual(CostoTramo.objects.count(), 6 * 5)
+
+
+class CacheRutasTests(TestCase):
+
+    def setUp(self):
+        cache_rutas.limpiar()
+        self.addCleanup(cache_rutas.limpiar)
+        self.coordenadas = [(4.6, -74.1), (4.65, -74.08), (4.7, -74.05)]
+        self.respuesta = HaversineBackend().route(self.coordenadas)
+
+    def test_guarda_y_recupera_por_secuencia(self):
+        guardar_ruta(self.coordenadas, self.respuesta)
+        self.assertEqual(buscar_ruta(self.coordenadas), self.respuesta)
+
+        # Sin el LRU se lee de respuesta_ruta
+        cache_rutas.limpiar()
+        self.assertEqual(buscar_ruta(self.coordenadas), self.respuesta)
+
+        # Coordenadas a menos de un metro comparten la entrada; otro orden no
+        self.assertEqual(buscar_ruta([(lat + 1e-7, lng) for lat, lng in self.coordenadas]), self.respuesta)
+        self.assertIsNone(buscar_ruta(self.coordenadas[::-1]))
+
+    def test_respuestas_vencidas(self):
+        guardar_ruta(self.coordenadas, self.respuesta)
+        RespuestaRuta.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        cache_rutas.limpiar()
+
+        self.assertIsNone(buscar_ruta(self.coordenadas))
+        self.assertEqual(descartar_vencidas(), 1)
+        self.assertFalse(RespuestaRuta.objects.exists())
+
+    def test_lru_con_vencimiento(self):
+        cache = CacheLRU(2, ttl=0.05)
+        cache.guardar("a", 1)
+        cache.guardar("b", 2)
+        cache.obtener("a")
+        cache.guardar("c", 3)
+
+        # Se descarta la menos usada y, pasado el TTL, todas
+        self.assertIsNone(cache.obtener("b"))
+        self.assertEqual((cache.obtener("a"), cache.obtener("c")), (1, 3))
+        time.sleep(0.06)
+        self.assertIsNone(cache.obtener("a"))
+        self.assertIsNone(cache.obtener("c"))
+
+
+@override_settings(ROUTING_MAX_COORDENADAS=5)
+class RutasSegmentadasTests(TestCase):
+
+    def setUp(self):
+        cache_rutas.limpiar()
+        self.addCleanup(cache_rutas.limpiar)
+
+    def test_segmentos_comparten_la_parada_de_union(self):
+        for total in (2, 5, 6, 13, 101):
+            segmentos = _segmentos(total, 5)
+
+            self.assertEqual((segmentos[0][0], segmentos[-1][1]), (0, total - 1))
+            self.assertTrue(all(fin - inicio + 1 <= 5 for inicio, fin in segmentos))
+            self.assertTrue(all(fin == inicio for (_, fin), (inicio, _) in zip(segmentos[:-1], segmentos[1:])))
+
+    def test_ruta_larga_se_une_como_una_sola(self):
+        lats, lngs = _paquetes_aleatorios(13, semilla=11)
+        coordenadas = list(zip(lats.tolist(), lngs.tolist()))
+        backend = BackendContado()
+
+        ruta, corta = _rutas_segmentadas([coordenadas, coordenadas[:3]], backend)
+
+        completa = HaversineBackend().route(coordenadas)
+        self.assertEqual(sorted(backend.consultas), [3, 5, 5, 5])
+        self.assertAlmostEqual(ruta["distancia_m"], completa["distancia_m"], places=6)
+        self.assertAlmostEqual(ruta["duracion_s"], completa["duracion_s"], places=6)
+        self.assertEqual(len(ruta["tramos"]), 12)
+        self.assertEqual(ruta["geometry"]["coordinates"], completa["geometry"]["coordinates"])
+        self.assertEqual(len(corta["tramos"]), 2)
+
+        # Cada segmento tiene su entrada de caché: repetir la ruta no consulta el backend
+        self.assertEqual(RespuestaRuta.objects.count(), 4)
+        _rutas_segmentadas([coordenadas], backend)
+        self.assertEqual(len(backend.consultas), 4)
+
+
+class CircuitoEnrutamientoTests(TestCase):
+
+    def setUp(self):
+        cache_rutas.limpiar()
+        cache_calibracion.limpiar()
+        self.addCleanup(cache_rutas.limpiar)
+        self.addCleanup(cache_calibracion.limpiar)
+        self.coordenadas = [(4.6, -74.1), (4.65, -74.08), (4.7, -74.05)]
+
+    def test_abre_prueba_y_cierra(self):
+        circuito = CircuitoEnrutamiento("prueba", fallos=2, espera_s=0.05)
+
+        with redirect_stdout(StringIO()):
+            self.assertTrue(circuito.permite())
+            circuito.registrar_fallo()
+            self.assertEqual(circuito.estado, CircuitoEnrutamiento.CERRADO)
+            circuito.registrar_fallo()
+            self.assertEqual(circuito.estado, CircuitoEnrutamiento.ABIERTO)
+            self.assertFalse(circuito.permite())
+
+            # Cumplida la espera pasa una sola petición de prueba; si falla se vuelve a abrir
+            time.sleep(0.06)
+            self.assertTrue(circuito.permite())
+            self.assertEqual(circuito.estado, CircuitoEnrutamiento.SEMIABIERTO)
+            self.assertFalse(circuito.permite())
+            circuito.registrar_fallo()
+            self.assertEqual(circuito.estado, CircuitoEnrutamiento.ABIERTO)
+
+            # Si la prueba responde se cierra
+            time.sleep(0.06)
+            self.assertTrue(circuito.permite())
+            circuito.registrar_exito()
+            self.assertEqual(circuito.estado, CircuitoEnrutamiento.CERRADO)
+            self.assertTrue(circuito.permite())
+
+    def test_caidas_de_osrm_abren_el_circuito(self):
+        backend = OSRMBackend(url="http://osrm.local")
+
+        with redirect_stdout(StringIO()), mock.patch(
+            "config.routing.requests.get", side_effect=requests.ConnectionError
+        ) as get:
+            for _ in range(backend.circuito.fallos_maximos + 3):
+                self.assertIsNone(backend.route(self.coordenadas))
+
+        self.assertEqual(get.call_count, backend.circuito.fallos_maximos)
+        self.assertEqual(backend.circuito.estado, CircuitoEnrutamiento.ABIERTO)
+
+    def test_con_el_circuito_abierto_se_estima_en_linea_recta(self):
+        backend = OSRMBackend(url="http://osrm.local")
+        backend.circuito.estado = CircuitoEnrutamiento.ABIERTO
+        backend.circuito._abierto_desde = time.monotonic()
+
+        with redirect_stdout(StringIO()), mock.patch("config.routing.requests.get") as get:
+            ruta, = _rutas_segmentadas([self.coordenadas], backend)
+
+        get.assert_not_called()
+        recta = HaversineBackend().route(self.coordenadas)
+        self.assertTrue(ruta["estimado"])
+        self.assertTrue(all(tramo["estimado"] for tramo in ruta["tramos"]))
+        self.assertAlmostEqual(ruta["distancia_m"], recta["distancia_m"], places=6)
+        # Lo estimado no se guarda en caché
+        self.assertFalse(RespuestaRuta.objects.exists())
+
+    def test_estimacion_calibrada_con_costo_tramo(self):
+        lats, lngs = _paquetes_aleatorios(80, semilla=30)
+        rectas_m = distancias_tramos(np.column_stack((lats, lngs)))[::2] * 1000
+        CostoTramo.objects.bulk_create([
+            CostoTramo(
+                origen_lat=round(lats[2 * k] * 10 ** PRECISION), origen_lng=round(lngs[2 * k] * 10 ** PRECISION),
+                destino_lat=round(lats[2 * k + 1] * 10 ** PRECISION), destino_lng=round(lngs[2 * k + 1] * 10 ** PRECISION),
+                distancia_m=recta * 1.5, duracion_s=recta * 1.5 / (30 / 3.6)
+            )
+            for k, recta in enumerate(rectas_m)
+        ])
+
+        respuesta = estimar_ruta(self.coordenadas)
+
+        recta = HaversineBackend(factor_circuito=1, velocidad_kmh=30).route(self.coordenadas)
+        self.assertAlmostEqual(respuesta["distancia_m"] / recta["distancia_m"], 1.5, places=2)
+        self.assertAlmostEqual(respuesta["duracion_s"] / recta["duracion_s"], 1.5, places=2)
+        self.assertTrue(respuesta["estimado"])
+
+
+class ColaTrabajosTests(RutasTestCase):
+
+    def test_cada_trabajo_se_toma_una_sola_vez(self):
+        rutas = [self.crear_ruta(2, self.crear_conductor()) for _ in range(3)]
+        encolados = [encolar_calculo(ruta).id_trabajo for ruta in rutas]
+
+        tomados = []
+        while (trabajo := tomar_siguiente()) is not None:
+            tomados.append(trabajo.id_trabajo)
+            self.assertEqual(trabajo.estado, TrabajoRuta.EstadoTrabajo.EN_PROCESO)
+            self.assertEqual(trabajo.intentos, 1)
+
+        self.assertEqual(tomados, encolados)
+        self.assertIsNone(tomar_siguiente())
+
+    def test_no_se_duplica_un_calculo_pendiente(self):
+        ruta = self.crear_ruta(2, self.crear_conductor())
+
+        primero = encolar_calculo(ruta)
+        self.assertEqual(encolar_calculo(ruta).id_trabajo, primero.id_trabajo)
+        self.assertNotEqual(encolar_calculo(ruta, {"presupuesto_ms": 500}).id_trabajo, primero.id_trabajo)
+        self.assertNotEqual(encolar_calculo(ruta, tipo="actualizar_tramos").id_trabajo, primero.id_trabajo)
+        self.assertEqual(TrabajoRuta.objects.filter(ruta=ruta).count(), 3)
+
+    def test_el_worker_calcula_la_ruta(self):
+        ruta = self.crear_ruta(12, self.crear_conductor())
+        trabajo = encolar_calculo(ruta)
+
+        self.procesar_trabajos()
+
+        trabajo.refresh_from_db()
+        ruta.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoRuta.EstadoTrabajo.COMPLETADO)
+        self.assertEqual(sorted(ruta.paquetes.values_list("orden_entrega", flat=True)), list(range(1, 13)))
+        self.assertEqual(len(ruta.ruta_optimizada["tramos"]), 12)
+
+
+class LlegadasTests(RutasTestCase):
+
+    def test_llegadas_en_orden_de_entrega(self):
+        conductor = self.crear_conductor()
+        ruta = self.crear_ruta(15, conductor)
+        calcular_ruta(ruta)
+        ruta.refresh_from_db()
+
+        # Sin ubicación, con el conductor en la ruta y con el conductor desviado lejos de ella
+        for ubicacion in (None, (4.66, -74.09), (4.9, -73.8)):
+            if ubicacion:
+                conductor.ubicacion_actual_lat, conductor.ubicacion_actual_lng = map(Decimal, map(str, ubicacion))
+                conductor.save()
+                ruta.conductor.refresh_from_db()
+
+            llegadas = estimar_llegadas(ruta)["paradas"]
+            segundos = [p["segundos_restantes"] for p in llegadas]
+            self.assertEqual([p["orden_entrega"] for p in llegadas], list(range(1, 16)))
+            self.assertEqual(segundos, sorted(segundos))
+            self.assertGreaterEqual(segundos[0], 0)
+
+    def test_solo_paradas_pendientes(self):
+        ruta = self.crear_ruta(6, self.crear_conductor())
+        calcular_ruta(ruta)
+        ruta.refresh_from_db()
+
+        entregados = ruta.ruta_optimizada["orden_paquetes"][:2]
+        Paquete.objects.filter(id_paquete__in=entregados).update(estado_paquete="Entregado")
+
+        llegadas = estimar_llegadas(ruta)
+        self.assertEqual([p["orden_entrega"] for p in llegadas["paradas"]], [3, 4, 5, 6])
+
+        Paquete.objects.filter(ruta=ruta).update(estado_paquete="Entregado")
+        self.assertIsNone(estimar_llegadas(ruta))
+
+
+class PlanificadorTests(RutasTestCase):
+
+    def test_cvrp_respeta_capacidad_y_asigna_una_vez(self):
+        rng = np.random.default_rng(0)
+        bases = np.array([[4.6, -74.15], [4.7, -74.05], [4.65, -74.1]])
+        capacidades = np.array([[40, 1e9], [60, 1e9], [30, 1e9]])
+        puntos = np.column_stack(_paquetes_aleatorios(80))
+        demandas = np.column_stack((rng.integers(1, 4, 80), np.ones(80)))
+
+        rutas, no_asignados = resolver_cvrp(bases, capacidades, puntos, demandas)
+
+        asignados = np.concatenate(rutas)
+        self.assertEqual(len(asignados), len(np.unique(asignados)))
+        self.assertEqual(sorted(asignados.tolist() + no_asignados.tolist()), list(range(80)))
+        for ruta, capacidad in zip(rutas, capacidades):
+            self.assertLessEqual(demandas[ruta, 0].sum(), capacidad[0])
+
+    def test_planificar_crea_rutas_asignadas(self):
+        conductores = [self.crear_conductor(base=base) for base in ((4.6, -74.15), (4.7, -74.05))]
+        paquetes = self.crear_paquetes(30)
+
+        respuesta = self.client.post("/api/v1/rutas/planificar/", {}, format="json")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED)
+        planificados = [p for ruta in respuesta.data["rutas"] for p in ruta["paquetes"]]
+        self.assertEqual(sorted(planificados + respuesta.data["no_asignados"]), sorted(p.id_paquete for p in paquetes))
+        self.assertEqual(Ruta.objects.filter(estado="Asignada").count(), len(respuesta.data["rutas"]))
+        self.assertFalse(Paquete.objects.filter(id_paquete__in=planificados).exclude(estado_paquete="Asignado").exists())
+        self.assertTrue(all(ruta["conductor"] in [c.id_conductor for c in conductores] for ruta in respuesta.data["rutas"]))
+
+    def test_planificar_simulado_no_guarda(self):
+        self.crear_conductor()
+        self.crear_paquetes(10)
+
+        respuesta = self.client.post("/api/v1/rutas/planificar/", {"simular": True}, format="json")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertFalse(Ruta.objects.exists())
+        self.assertEqual(Paquete.objects.filter(estado_paquete="Pendiente").count(), 10)
+
+
+class CalculoRutaApiTests(RutasTestCase):
+
+    def test_calcular_ruta_encola_el_calculo(self):
+        ruta = self.crear_ruta(10, self.crear_conductor())
+
+        respuesta = self.client.post(f"/api/v1/rutas/{ruta.id_ruta}/calcular_ruta/")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_202_ACCEPTED)
+        trabajo = TrabajoRuta.objects.get(id_trabajo=respuesta.data["id_trabajo"])
+        self.assertEqual(trabajo.estado, TrabajoRuta.EstadoTrabajo.PENDIENTE)
+
+        self.procesar_trabajos()
+        ruta.refresh_from_db()
+        self.assertIsNotNone(ruta.ruta_optimizada)
+        self.assertEqual(sorted(ruta.ruta_optimizada["orden_paquetes"]), sorted(ruta.paquetes.values_list("id_paquete", flat=True)))
+
+    def test_calcular_ruta_sin_conductor(self):
+        ruta = self.crear_ruta(3)
+
+        respuesta = self.client.post(f"/api/v1/rutas/{ruta.id_ruta}/calcular_ruta/")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TrabajoRuta.objects.exists())
+
+    def test_calcular_lote(self):
+        rutas = [self.crear_ruta(8, self.crear_conductor(), semilla=k) for k in range(2)]
+        vacia = Ruta.objects.create(conductor=self.crear_conductor(), estado="Asignada")
+
+        respuesta = self.client.post(
+            "/api/v1/rutas/calcular_lote/", {"rutas": [r.id_ruta for r in rutas] + [vacia.id_ruta]}, format="json"
+        )
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(r["id_ruta"] for r in respuesta.data["calculadas"]), [r.id_ruta for r in rutas])
+        self.assertEqual([r["id_ruta"] for r in respuesta.data["omitidas"]], [vacia.id_ruta])
+        for ruta in rutas:
+            ruta.refresh_from_db()
+            self.assertEqual(sorted(ruta.paquetes.values_list("orden_entrega", flat=True)), list(range(1, 9)))
+
+    def test_calcular_lote_valida_las_rutas(self):
+        self.assertEqual(
+            self.client.post("/api/v1/rutas/calcular_lote/", {}, format="json").status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            self.client.post("/api/v1/rutas/calcular_lote/", {"rutas": [999]}, format="json").status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+
+class AsignarPaquetesApiTests(RutasTestCase):
+
+    def test_inserta_sin_recalcular_la_ruta(self):
+        ruta = self.crear_ruta(10, self.crear_conductor(), estado="Pendiente")
+        calcular_ruta(ruta)
+        ruta.refresh_from_db()
+        previos = ruta.ruta_optimizada["orden_paquetes"]
+        nuevos = [p.id_paquete for p in self.crear_paquetes(3, semilla=9)]
+
+        respuesta = self.client.post(f"/api/v1/rutas/{ruta.id_ruta}/asignar_paquetes/", {"paquetes": nuevos}, format="json")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        orden = list(ruta.paquetes.order_by("orden_entrega").values_list("id_paquete", flat=True))
+        self.assertEqual(sorted(ruta.paquetes.values_list("orden_entrega", flat=True)), list(range(1, 14)))
+        self.assertEqual(respuesta.data["orden_entrega"], {i: orden.index(i) + 1 for i in nuevos})
+        # Los paquetes que ya estaban conservan su orden relativo
+        self.assertEqual([i for i in orden if i not in nuevos], previos)
+
+        # El worker solo pide los tramos que cambiaron
+        trabajo = TrabajoRuta.objects.get(id_trabajo=respuesta.data["id_trabajo"])
+        self.assertEqual(trabajo.tipo, "actualizar_tramos")
+        self.procesar_trabajos()
+        trabajo.refresh_from_db()
+        ruta.refresh_from_db()
+        self.assertEqual(ruta.ruta_optimizada["orden_paquetes"], orden)
+        self.assertEqual(len(ruta.ruta_optimizada["tramos"]), 13)
+        self.assertLessEqual(trabajo.resultado["tramos_recalculados"], 6)
+
+    def test_ruta_sin_calcular(self):
+        ruta = self.crear_ruta(4, self.crear_conductor(), estado="Pendiente")
+        nuevos = [p.id_paquete for p in self.crear_paquetes(2, semilla=9)]
+
+        respuesta = self.client.post(f"/api/v1/rutas/{ruta.id_ruta}/asignar_paquetes/", {"paquetes": nuevos}, format="json")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertNotIn("orden_entrega", respuesta.data)
+        self.assertFalse(TrabajoRuta.objects.exists())
+        self.assertEqual(ruta.paquetes.count(), 6)
+
+
+class GeometriaApiTests(RutasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ruta = self.crear_ruta(8, self.crear_conductor())
+        calcular_ruta(self.ruta)
+        self.ruta.refresh_from_db()
+        self.url = f"/api/v1/rutas/{self.ruta.id_ruta}/"
+
+    def test_polilinea_por_defecto_y_geojson_opcional(self):
+        datos = self.client.get(self.url).data["ruta_optimizada"]
+        self.assertNotIn("geometry", datos)
+        self.assertEqual(datos["polyline"], self.ruta.ruta_optimizada["polyline"])
+
+        geojson = self.client.get(self.url, {"geometry": "geojson"}).data["ruta_optimizada"]
+        self.assertNotIn("polyline", geojson)
+        self.assertEqual(geojson["geometry"]["coordinates"], decodificar_polilinea(datos["polyline"]))
+
+    def test_nivel_simplificado_guardado(self):
+        self.assertEqual(
+            list(self.ruta.simplificaciones.values_list("tolerancia_m", flat=True)), list(TOLERANCIAS_SIMPLIFICACION)
+        )
+
+        datos = self.client.get(self.url, {"tolerance": 30}).data["ruta_optimizada"]
+        self.assertEqual(datos["tolerancia_m"], 20.0)
+        self.assertEqual(datos["polyline"], self.ruta.simplificaciones.get(tolerancia_m=20).polyline)
+
+        # Sin un nivel aplicable se entrega la geometría completa
+        completa = self.client.get(self.url, {"tolerance": 1}).data["ruta_optimizada"]
+        self.assertNotIn("tolerancia_m", completa)
+        self.assertEqual(completa["polyline"], self.ruta.ruta_optimizada["polyline"])
+
+        listado = self.client.get("/api/v1/rutas/", {"zoom": 10}).data
+        self.assertEqual(listado[0]["ruta_optimizada"]["tolerancia_m"], 80.0)
+
+        # Recalcular la ruta reemplaza sus niveles
+        calcular_ruta(self.ruta)
+        self.assertEqual(SimplificacionRuta.objects.filter(ruta=self.ruta).count(), len(TOLERANCIAS_SIMPLIFICACION))
+
+
+class RutaRestanteApiTests(RutasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ruta = self.crear_ruta(8, self.crear_conductor())
+        calcular_ruta(self.ruta)
+        self.ruta.refresh_from_db()
+        self.url = f"/api/v1/rutas/{self.ruta.id_ruta}/ruta_restante/"
+
+    def test_desde_el_proximo_paquete_pendiente(self):
+        datos = self.ruta.ruta_optimizada
+        Paquete.objects.filter(id_paquete__in=datos["orden_paquetes"][:3]).update(estado_paquete="Entregado")
+
+        respuesta = self.client.get(self.url, {"geometry": "geojson"})
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual(respuesta.data["desde_orden"], 4)
+        tramos = respuesta.data["tramos"]
+        self.assertEqual([t["id_paquete"] for t in tramos], datos["orden_paquetes"][3:])
+        self.assertAlmostEqual(
+            respuesta.data["distancia_restante_m"], sum(t["distancia_m"] for t in datos["tramos"][3:]), places=6
+        )
+
+        # Los tramos se encadenan hasta el final del recorrido completo
+        completa = decodificar_polilinea(datos["polyline"])
+        self.assertEqual(tramos[0]["coordinates"][0], completa[datos["indices_geometria"][3]])
+        self.assertEqual(tramos[-1]["coordinates"][-1], completa[-1])
+        for anterior, siguiente in zip(tramos[:-1], tramos[1:]):
+            self.assertEqual(anterior["coordinates"][-1], siguiente["coordinates"][0])
+
+    def test_desde_un_orden_dado(self):
+        respuesta = self.client.get(self.url, {"desde": 7})
+
+        self.assertEqual([t["orden_entrega"] for t in respuesta.data["tramos"]], [7, 8])
+        self.assertTrue(all(t["polyline"] for t in respuesta.data["tramos"]))
+
+        Paquete.objects.filter(ruta=self.ruta).update(estado_paquete="Entregado")
+        respuesta = self.client.get(self.url)
+        self.assertEqual((respuesta.data["desde_orden"], respuesta.data["tramos"]), (9, []))
+
+    def test_parametros_invalidos(self):
+        for params in ({"desde": "x"}, {"geometry": "svg"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+        sin_calcular = self.crear_ruta(3, self.crear_conductor())
+        respuesta = self.client.get(f"/api/v1/rutas/{sin_calcular.id_ruta}/ruta_restante/")
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReasignacionApiTests(RutasTestCase):
+
+    def test_rebalancear_encola_las_rutas_calculadas(self):
+        norte, sur = (4.72, -74.05), (4.58, -74.15)
+        # Cada ruta tiene la mitad de sus paquetes junto a la base de la otra
+        ruta_norte = Ruta.objects.create(conductor=self.crear_conductor(base=norte), estado="Pendiente")
+        ruta_sur = Ruta.objects.create(conductor=self.crear_conductor(base=sur), estado="Pendiente")
+        for ruta, propia, ajena in ((ruta_norte, norte, sur), (ruta_sur, sur, norte)):
+            self.crear_paquetes(6, estado="Asignado", ruta=ruta, centro=propia, semilla=1)
+            self.crear_paquetes(6, estado="Asignado", ruta=ruta, centro=ajena, semilla=2)
+            ruta.total_paquetes = 12
+            ruta.save()
+        calcular_ruta(ruta_norte)
+
+        respuesta = self.client.post("/api/v1/rutas/rebalancear/", {}, format="json")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertTrue(respuesta.data["movimientos"])
+        self.assertEqual([t["id_ruta"] for t in respuesta.data["trabajos"]], [ruta_norte.id_ruta])
+        self.assertEqual(
+            TrabajoRuta.objects.get(id_trabajo=respuesta.data["trabajos"][0]["id_trabajo"]).estado,
+            TrabajoRuta.EstadoTrabajo.PENDIENTE
+        )
+        self.assertEqual(Paquete.objects.filter(ruta__in=[ruta_norte, ruta_sur]).count(), 24)
+
+    def test_rebalancear_necesita_dos_rutas(self):
+        respuesta = self.client.post("/api/v1/rutas/rebalancear/", {}, format="json")
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reasignar_fallidos(self):
+        anterior = self.crear_ruta(2, self.crear_conductor(), estado="Completada")
+        fallido = anterior.paquetes.first()
+        Paquete.objects.filter(pk=fallido.pk).update(estado_paquete="Fallido")
+
+        destino = self.crear_ruta(5, self.crear_conductor(), estado="Pendiente")
+        calcular_ruta(destino)
+
+        respuesta = self.client.post("/api/v1/rutas/reasignar_fallidos/", {}, format="json")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        self.assertEqual([a["paquete"] for a in respuesta.data["asignados"]], [fallido.id_paquete])
+        fallido.refresh_from_db()
+        self.assertEqual((fallido.ruta_id, fallido.estado_paquete), (destino.id_ruta, "Asignado"))
+        self.assertEqual(sorted(destino.paquetes.values_list("orden_entrega", flat=True)), list(range(1, 7)))
+        self.assertTrue(TrabajoRuta.objects.filter(ruta=destino, tipo="actualizar_tramos").exists())
+
+    def test_reasignar_fallidos_sin_paquetes(self):
+        respuesta = self.client.post("/api/v1/rutas/reasignar_fallidos/", {}, format="json")
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PlantillasApiTests(RutasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ruta = self.crear_ruta(10, self.crear_conductor())
+        calcular_ruta(self.ruta)
+
+    def test_guardar_listar_y_eliminar(self):
+        respuesta = self.client.post(
+            f"/api/v1/rutas/{self.ruta.id_ruta}/guardar_plantilla/", {"nombre": "lunes"}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(respuesta.data["plantilla"]["total_paradas"], 10)
+
+        listado = self.client.get("/api/v1/rutas/plantillas/")
+        self.assertEqual([p["nombre"] for p in listado.data], ["lunes"])
+
+        id_plantilla = respuesta.data["plantilla"]["id_plantilla"]
+        self.assertEqual(
+            self.client.delete(f"/api/v1/rutas/plantillas/{id_plantilla}/").status_code, status.HTTP_204_NO_CONTENT
+        )
+        self.assertEqual(
+            self.client.delete(f"/api/v1/rutas/plantillas/{id_plantilla}/").status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_guardar_sin_nombre(self):
+        respuesta = self.client.post(f"/api/v1/rutas/{self.ruta.id_ruta}/guardar_plantilla/", {}, format="json")
+        self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PlantillaRuta.objects.exists())
+
+    def test_ruta_nueva_reutiliza_la_plantilla(self):
+        self.client.post(f"/api/v1/rutas/{self.ruta.id_ruta}/guardar_plantilla/", {"nombre": "lunes"}, format="json")
+        nueva = self.crear_ruta(10, self.crear_conductor())
+
+        calcular_ruta(nueva)
+
+        nueva.refresh_from_db()
+        self.assertEqual(nueva.ruta_optimizada["plantilla"], "lunes")
+        self.assertEqual(len(nueva.ruta_optimizada["tramos"]), 10)
+        tramos = tramos_restantes(nueva.ruta_optimizada, 1, formato="geojson")
+        self.assertEqual(len(tramos), 10)
+        self.assertTrue(all(t["coordinates"] for t in tramos))
+
+
+class TelemetriaApiTests(RutasTestCase):
+
+    def test_resumen_de_las_optimizaciones(self):
+        for semilla in range(3):
+            calcular_ruta(self.crear_ruta(5 + semilla, self.crear_conductor(), semilla=semilla))
+
+        respuesta = self.client.get("/api/v1/rutas/telemetria/")
+
+        self.assertEqual(respuesta.status_code, status.HTTP_200_OK)
+        general = respuesta.data["general"]
+        self.assertEqual((general["total"], general["fallidas"]), (3, 0))
+        self.assertEqual(set(general["tiempo_total_ms"]), {"p50", "p90", "p95", "p99", "max"})
+        self.assertGreaterEqual(general["factor_circuito"]["p50"], 1)
+        self.assertEqual([r["paradas"] for r in respuesta.data["por_paradas"]], ["1-25"])
+
+        filtrada = self.client.get("/api/v1/rutas/telemetria/", {"operacion": "calcular_lote"})
+        self.assertEqual(filtrada.data["general"]["total"], 0)
+
+    def test_parametros_invalidos(self):
+        for params in ({"dias": 0}, {"dias": "x"}, {"operacion": "otra"}):
+            respuesta = self.client.get("/api/v1/rutas/telemetria/", params)
+            self.assertEqual(respuesta.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_un_error_al_guardar_no_interrumpe_el_calculo(self):
+        with self.assertLogs("routes.telemetria", level="ERROR"):
+            registrar(TelemetriaOptimizacion(paradas=None))
+
+        # El savepoint deja la transacción utilizable
+        self.assertFalse(TelemetriaOptimizacion.objects.exists())
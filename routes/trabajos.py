@@ -0,0 +1,168 @@
+"""
+Cola de trabajos en base de datos para los cálculos de ruta.
+
+La vista solo encola (respuesta inmediata con 202) y el worker
+(python manage.py procesar_trabajos) toma los trabajos en orden de llegada.
+Cada worker bloquea el trabajo que toma con SELECT ... FOR UPDATE SKIP LOCKED,
+así varios workers pueden correr en paralelo sin tomar el mismo trabajo.
+SKIP LOCKED requiere MySQL 8.0.1+ o MariaDB 10.6+; en MariaDB 10.5 (y en
+SQLite, sin bloqueo de filas) la cola funciona igual pero se debe ejecutar un
+solo worker: el bloqueo se hace sin SKIP LOCKED y los workers se esperan.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import descartar_vencidas
+from .models import Ruta, TrabajoRuta
+from .services import calcular_ruta, actualizar_tramos
+from .telemetria import descartar_antiguas
+
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 3
+TIEMPO_MAXIMO = timedelta(minutes=10)  # Un trabajo En proceso más viejo se considera abandonado
+INTERVALO_LIMPIEZA = timedelta(hours=1)  # Cada cuánto el worker ejecuta limpiar_vencidos
+
+PROCESADORES = {
+    "calcular_ruta": calcular_ruta,
+    "actualizar_tramos": actualizar_tramos,
+}
+
+
+def encolar_calculo(ruta, parametros=None, tipo="calcular_ruta"):
+    """
+    Encola el cálculo de la ruta. Si ya hay uno pendiente para la misma ruta,
+    del mismo tipo y con los mismos parámetros se reutiliza, porque calculará
+    con los datos vigentes al ejecutarse.
+
+    Args:
+        parametros: argumentos extra para el cálculo (p. ej. {"presupuesto_ms": 2000})
+        tipo: procesador del trabajo (ver PROCESADORES)
+    """
+    parametros = parametros or {}
+
+    with transaction.atomic():
+        pendiente = (
+            TrabajoRuta.objects.select_for_update()
+            .filter(
+                ruta=ruta, tipo=tipo, estado=TrabajoRuta.EstadoTrabajo.PENDIENTE,
+                parametros=parametros
+            )
+            .first()
+        )
+        if pendiente:
+            return pendiente
+
+        return TrabajoRuta.objects.create(ruta=ruta, tipo=tipo, parametros=parametros)
+
+
+def encolar_estimadas():
+    """
+    Encola de nuevo el cálculo de las rutas cuyo recorrido quedó estimado en
+    línea recta porque OSRM no estaba disponible. Solo rutas que aún se
+    pueden recalcular (Pendiente o Asignada, con conductor y base).
+
+    Returns:
+        lista de trabajos encolados (o reutilizados)
+    """
+    rutas = Ruta.objects.filter(
+        ruta_optimizada__estimado=True,
+        estado__in=[Ruta.EstadoRuta.PENDIENTE, Ruta.EstadoRuta.ASIGNADA],
+        conductor__base_lat__isnull=False,
+        conductor__base_lng__isnull=False,
+    ).order_by("id_ruta")
+
+    return [encolar_calculo(ruta) for ruta in rutas]
+
+
+def recuperar_abandonados():
+    """
+    Devuelve a la cola los trabajos que quedaron En proceso (worker caído)
+    o los marca Fallidos si ya agotaron sus intentos.
+    """
+    limite = timezone.now() - TIEMPO_MAXIMO
+    abandonados = TrabajoRuta.objects.filter(
+        estado=TrabajoRuta.EstadoTrabajo.EN_PROCESO, fecha_inicio__lt=limite
+    )
+
+    abandonados.filter(intentos__gte=MAX_INTENTOS).update(
+        estado=TrabajoRuta.EstadoTrabajo.FALLIDO,
+        error="El trabajo superó el tiempo máximo de ejecución",
+        fecha_fin=timezone.now()
+    )
+    return abandonados.filter(intentos__lt=MAX_INTENTOS).update(
+        estado=TrabajoRuta.EstadoTrabajo.PENDIENTE, progreso=0
+    )
+
+
+def limpiar_vencidos():
+    """
+    Borra las respuestas de ruta vencidas y la telemetría fuera de la
+    retención. Lo ejecuta el worker cada INTERVALO_LIMPIEZA y también
+    python manage.py limpiar_vencidos (p. ej. desde cron).
+
+    Returns:
+        (respuestas, telemetria) cantidad de filas borradas de cada tabla
+    """
+    return descartar_vencidas(), descartar_antiguas()
+
+
+def admite_varios_workers():
+    """
+    True si la base de datos soporta SELECT ... FOR UPDATE SKIP LOCKED
+    (MySQL 8.0.1+, MariaDB 10.6+, PostgreSQL).
+    """
+    return connection.features.has_select_for_update_skip_locked
+
+
+def tomar_siguiente():
+    """
+    Toma el trabajo pendiente más antiguo y lo marca En proceso.
+    Retorna None si la cola está vacía.
+    """
+    with transaction.atomic():
+        trabajo = (
+            TrabajoRuta.objects.select_for_update(skip_locked=admite_varios_workers())
+            .filter(estado=TrabajoRuta.EstadoTrabajo.PENDIENTE)
+            .order_by("fecha_creacion", "id_trabajo")
+            .first()
+        )
+        if trabajo is None:
+            return None
+
+        trabajo.estado = TrabajoRuta.EstadoTrabajo.EN_PROCESO
+        trabajo.intentos += 1
+        trabajo.progreso = 0
+        trabajo.fecha_inicio = timezone.now()
+        trabajo.save(update_fields=["estado", "intentos", "progreso", "fecha_inicio"])
+
+    return trabajo
+
+
+def procesar_trabajo(trabajo):
+    """
+    Ejecuta un trabajo ya tomado y guarda su resultado o su error.
+    """
+    def progreso(porcentaje):
+        TrabajoRuta.objects.filter(pk=trabajo.pk).update(progreso=porcentaje)
+
+    try:
+        resultado = PROCESADORES[trabajo.tipo](trabajo.ruta, progreso=progreso, **trabajo.parametros)
+    except Exception as e:
+        logger.exception("Error en trabajo %s (%s, ruta %s)", trabajo.pk, trabajo.tipo, trabajo.ruta_id)
+        trabajo.estado = TrabajoRuta.EstadoTrabajo.FALLIDO
+        trabajo.error = str(e)
+    else:
+        trabajo.estado = TrabajoRuta.EstadoTrabajo.COMPLETADO
+        trabajo.progreso = 100
+        trabajo.resultado = resultado
+        trabajo.error = None
+
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save(update_fields=["estado", "progreso", "resultado", "error", "fecha_fin"])
+    return trabajo
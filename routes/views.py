@@ -1,13 +1,13 @@
 # routes/views.py
 from django.http import HttpResponse
 
-import requests
-
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
+from datetime import timedelta
 from django.db import transaction
+from django.db.models import Q
 
 from drf_spectacular.utils import extend_schema
 
@@ -15,17 +15,26 @@ from config.supabase_client import supabase
 from django.utils import timezone
 import os
 
-from config.osm_service import OSMService
 
-from .models import Ruta, EntregaPaquete
-from .serializer import RutaSerializer, RutaMonitoreoSerializer, EntregaPaqueteSerializer
+from .models import Ruta, EntregaPaquete, TrabajoRuta, PlantillaRuta, TelemetriaOptimizacion
+from .serializer import RutaSerializer, RutaMonitoreoSerializer, EntregaPaqueteSerializer, TrabajoRutaSerializer
 from packages.models import Paquete
 from packages.serializer import PaqueteSerializer
 from drivers.models import Driver
 from vehicles.models import Vehiculo
 
 from .pdf import generar_pdf_ruta
-from .utils import haversine_distance_vectorized
+from .planificador import planificar_rutas, planificar_reentregas, rebalancear_rutas
+from .optimizador import MAX_PRESUPUESTO_MS
+from .services import insertar_paquetes, calcular_rutas_lote
+from .trabajos import encolar_calculo
+from .plantillas import crear_plantilla, resumen_plantilla
+from .telemetria import resumen_telemetria
+from .llegadas import estimar_llegadas
+from .geometria import (
+    representar_ruta_optimizada, tolerancia_solicitada, simplificacion_solicitada, tramos_restantes,
+    FORMATOS_GEOMETRIA, PRECISION_POLILINEA
+)
 
 
 
@@ -43,11 +52,42 @@ class RutaViewSet(viewsets.ModelViewSet):
         # Filtrar por estado
         estado = self.request.query_params.get('estado')
         if estado:
-            return queryset.filter(estado=estado)
+            queryset = queryset.filter(estado=estado)
+        
+        # Rutas con recorrido estimado en línea recta (OSRM no disponible al calcularlas)
+        if self.request.query_params.get('estimado') in ('true', '1'):
+            queryset = queryset.filter(ruta_optimizada__estimado=True)
+        
+        # Versiones simplificadas de la geometría (?tolerance= / ?zoom=) en una sola consulta
+        if tolerancia_solicitada(self.request.query_params) is not None:
+            queryset = queryset.prefetch_related('simplificaciones')
         
         return queryset
     
     
+    def obtener_presupuesto(self, request):
+        """
+        Lee time_budget_ms del body (tiempo para la búsqueda multiarranque).
+        Retorna (presupuesto_ms o None, Response de error o None).
+        """
+        valor = request.data.get('time_budget_ms')
+        if valor in (None, ""):
+            return None, None
+        
+        try:
+            presupuesto_ms = int(valor)
+        except (TypeError, ValueError):
+            presupuesto_ms = 0
+        
+        if not 0 < presupuesto_ms <= MAX_PRESUPUESTO_MS:
+            return None, Response(
+                {"error": f"time_budget_ms debe ser un entero entre 1 y {MAX_PRESUPUESTO_MS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return presupuesto_ms, None
+    
+    
     def handle_imagen(self, entrega, archivo):
         if not archivo:
             return
@@ -120,13 +160,23 @@ class RutaViewSet(viewsets.ModelViewSet):
             ruta.total_paquetes = ruta.total_paquetes + len(paquetes_ids)
             ruta.save()
         
+        # Si la ruta ya estaba calculada, insertar los nuevos paquetes sin recalcularla completa;
+        # el recorrido por vía de los tramos que cambiaron lo actualiza el worker
+        ordenes = insertar_paquetes(ruta, paquetes_ids)
+        
         # Refrescar el objeto después de la transacción
         ruta.refresh_from_db()
         
-        return Response({
+        respuesta = {
             "mensaje": f"{len(paquetes_ids)} paquetes asignados correctamente",
             "total_paquetes": ruta.total_paquetes
-        })
+        }
+        
+        if ordenes:
+            respuesta["orden_entrega"] = ordenes
+            respuesta["id_trabajo"] = encolar_calculo(ruta, tipo="actualizar_tramos").id_trabajo
+        
+        return Response(respuesta)
        
         
     """Hecho con IA"""
@@ -197,13 +247,162 @@ class RutaViewSet(viewsets.ModelViewSet):
             ruta_destino.total_paquetes += 1
             ruta_destino.save()
         
+        # Si la ruta destino ya estaba calculada, insertar el paquete en su posición más barata
+        ordenes = insertar_paquetes(ruta_destino, [paquete.id_paquete])
+        trabajo = encolar_calculo(ruta_destino, tipo="actualizar_tramos") if ordenes else None
+        
         return Response({
             "mensaje": "Paquete reasignado correctamente",
             "paquete": paquete_id,
             "ruta_origen": ruta_origen.codigo_manifiesto,
-            "ruta_destino": ruta_destino.codigo_manifiesto
+            "ruta_destino": ruta_destino.codigo_manifiesto,
+            "orden_entrega": ordenes.get(paquete.id_paquete) if ordenes else None,
+            "id_trabajo": trabajo.id_trabajo if trabajo else None
+        })
+        
+    
+    @action(detail=False, methods=['post'])
+    def reasignar_fallidos(self, request):
+        """
+        Reasigna en una sola llamada todos los paquetes Fallidos de rutas
+        Completadas o Fallidas a la ruta Pendiente donde su inserción cuesta
+        menos km y que tenga capacidad en el vehículo.
+        URL: POST /api/v1/rutas/reasignar_fallidos/
+        Body: {"simular": true}  # Opcional, solo devuelve las asignaciones sin guardarlas
+        """
+        simular = bool(request.data.get('simular', False))
+        
+        resultado = planificar_reentregas(simular=simular)
+        
+        if not resultado["asignados"]:
+            return Response(
+                {"error": "No hay paquetes fallidos que se puedan reasignar", **resultado},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Las rutas destino que ya estaban calculadas reciben los paquetes en su posición más barata
+        if not simular:
+            nuevos_por_ruta = {r["id_ruta"]: r["paquetes_nuevos"] for r in resultado["rutas"]}
+            ordenes = {}
+            for ruta in Ruta.objects.filter(id_ruta__in=nuevos_por_ruta):
+                insertados = insertar_paquetes(ruta, nuevos_por_ruta[ruta.id_ruta])
+                if insertados:
+                    ordenes.update(insertados)
+                    encolar_calculo(ruta, tipo="actualizar_tramos")
+            for asignado in resultado["asignados"]:
+                asignado["orden_entrega"] = ordenes.get(asignado["paquete"])
+        
+        return Response({
+            "mensaje": f"{len(resultado['asignados'])} paquetes {'simulados' if simular else 'reasignados'}",
+            "simulacion": simular,
+            **resultado
+        })
+    
+    
+    @action(detail=False, methods=['post'])
+    def rebalancear(self, request):
+        """
+        Mueve paquetes entre las rutas Pendientes (reubicación e intercambio)
+        mientras baje el total de km de la flota, respetando la capacidad de
+        cada vehículo. Las rutas modificadas que ya estaban calculadas se
+        encolan para recalcularlas (ver TrabajoRuta).
+        URL: POST /api/v1/rutas/rebalancear/
+        Body: {"simular": true}  # Opcional, solo devuelve los movimientos sin guardarlos
+        """
+        simular = bool(request.data.get('simular', False))
+        
+        resultado = rebalancear_rutas(simular=simular)
+        
+        if resultado["rutas_evaluadas"] < 2:
+            return Response(
+                {"error": "Se necesitan al menos dos rutas Pendientes para rebalancear", **resultado},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # El recálculo (optimización + OSRM) lo hace el worker fuera de la petición
+        trabajos = []
+        recalcular = [r["id_ruta"] for r in resultado["rutas"] if r["recalcular"]]
+        if not simular and recalcular:
+            for ruta in Ruta.objects.filter(id_ruta__in=recalcular).order_by("id_ruta"):
+                trabajo = encolar_calculo(ruta)
+                trabajos.append({"id_ruta": ruta.id_ruta, "id_trabajo": trabajo.id_trabajo})
+        
+        return Response({
+            "mensaje": f"{len(resultado['movimientos'])} movimientos {'simulados' if simular else 'aplicados'}",
+            "simulacion": simular,
+            **resultado,
+            "trabajos": trabajos
         })
+    
+    
+    @action(detail=False, methods=['post'])
+    def planificar(self, request):
+        """
+        Reparte todos los paquetes Pendientes entre los conductores Disponibles
+        (con vehículo y dirección base) creando una ruta Asignada por conductor.
+        Respeta la capacidad de peso y volumen de cada tipo de vehículo.
+        Body: {"simular": true}  # Opcional, solo devuelve el plan sin guardarlo
+              "time_budget_ms": 2000  # Opcional, búsqueda multiarranque por ruta
+        """
+        simular = bool(request.data.get('simular', False))
+        presupuesto_ms, error = self.obtener_presupuesto(request)
+        if error:
+            return error
+        
+        plan = planificar_rutas(simular=simular, presupuesto_ms=presupuesto_ms)
         
+        if not plan["rutas"]:
+            return Response(
+                {"error": "No hay paquetes pendientes o conductores disponibles para planificar", **plan},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            "mensaje": f"{len(plan['rutas'])} rutas {'simuladas' if simular else 'creadas'}",
+            "simulacion": simular,
+            **plan
+        }, status=status.HTTP_200_OK if simular else status.HTTP_201_CREATED)
+    
+    
+    @action(detail=False, methods=['post'])
+    def calcular_lote(self, request):
+        """
+        Calcula varias rutas en una sola llamada (optimización en paralelo y
+        guardado en lote).
+        Body: {"rutas": [1, 2, 3]} o {"estado": "Asignada"}
+              "time_budget_ms": 2000  # Opcional, búsqueda multiarranque por ruta
+        """
+        ids_rutas = request.data.get('rutas')
+        estado = request.data.get('estado')
+        presupuesto_ms, error = self.obtener_presupuesto(request)
+        if error:
+            return error
+        
+        if not ids_rutas and not estado:
+            return Response(
+                {"error": "Debes proporcionar una lista de rutas o un estado"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        rutas = Ruta.objects.select_related("conductor")
+        if ids_rutas:
+            rutas = rutas.filter(id_ruta__in=ids_rutas)
+            if rutas.count() != len(set(ids_rutas)):
+                return Response(
+                    {"error": "Algunas rutas no existen"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            rutas = rutas.filter(estado=estado)
+        
+        calculadas, omitidas = calcular_rutas_lote(list(rutas), presupuesto_ms=presupuesto_ms)
+        
+        return Response({
+            "mensaje": f"{len(calculadas)} rutas calculadas",
+            "calculadas": calculadas,
+            "omitidas": omitidas
+        })
+    
     
     @action(detail=True, methods=['post'])
     def asignar_conductor(self, request, pk=None):
@@ -417,106 +616,110 @@ class RutaViewSet(viewsets.ModelViewSet):
         if ruta.total_paquetes == 0:
             return Response({"error": "No hay paquetes asignados"}, status=400)
 
-        paquetes = list(ruta.paquetes.all())
-        
         # VALIDACIÓN 4: Todos los paquetes tienen coordenadas
-        if any(p.lat is None or p.lng is None for p in paquetes):
+        if ruta.paquetes.filter(Q(lat__isnull=True) | Q(lng__isnull=True)).exists():
             return Response({"error": "Hay paquetes sin coordenadas"}, status=400)
 
-        # 1. Punto de partida desde la base del conductor
-        start_lat = float(conductor.base_lat)
-        start_lng = float(conductor.base_lng)
+        presupuesto_ms, error = self.obtener_presupuesto(request)
+        if error:
+            return error
 
-        # 2. Algoritmo Nearest Neighbor
-        restantes = [(float(p.lat), float(p.lng), p) for p in paquetes]
-        ordenados = []
-        current_lat, current_lng = start_lat, start_lng
-        
-        while restantes:
-            # Calcular distancia REAL con Haversine
-            distancias = []
-            for lat, lng, paquete in restantes:
-                dist = haversine_distance_vectorized(current_lat, current_lng, lat, lng)
-                distancias.append((dist, lat, lng, paquete))
-            
-            # Tomar el más cercano (menor distancia en km)
-            _, lat, lng, paquete_cercano = min(distancias, key=lambda x: x[0])
-            ordenados.append(paquete_cercano)
-            current_lat, current_lng = lat, lng
-            restantes = [x for x in restantes if x[2].id_paquete != paquete_cercano.id_paquete]
+        # El cálculo (optimización + OSRM) lo hace el worker fuera de la petición
+        trabajo = encolar_calculo(ruta, {"presupuesto_ms": presupuesto_ms} if presupuesto_ms else None)
 
-        # 3. Guardar orden y calcular ruta OSRM
-        with transaction.atomic():
-            # Guardar orden en paquetes
-            for idx, paquete in enumerate(ordenados, 1):
-                paquete.orden_entrega = idx
-                paquete.save()
+        return Response({
+            "mensaje": "Cálculo de ruta en cola",
+            "id_trabajo": trabajo.id_trabajo,
+            "estado": trabajo.estado
+        }, status=status.HTTP_202_ACCEPTED)
 
-            # Construir coordenadas para OSRM
-            coordenadas_para_osrm = [
-                [start_lng, start_lat]  # Punto inicial del conductor
-            ] + [
-                [float(p.lng), float(p.lat)] for p in ordenados
-            ]
-            
-            # Convertir a string para OSRM
-            coords_str = ";".join([f"{lng},{lat}" for lng, lat in coordenadas_para_osrm])
-            
-            # 4. Llamar a OSRM
-            url = f"https://router.project-osrm.org/route/v1/driving/{coords_str}"
-            geometry = None
-            distancia_km = None
-            duracion_min = None
-            
-            try:
-                resp = requests.get(
-                    url, 
-                    params={
-                        "overview": "full", 
-                        "geometries": "geojson",
-                        "steps": "false"
-                    }, 
-                    timeout=10
-                )
-                
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if data.get("code") == "Ok" and data.get("routes"):
-                        route = data["routes"][0]
-                        geometry = route["geometry"]
-                        distancia_km = round(route["distance"] / 1000, 2)
-                        duracion_min = round(route["duration"] / 60)
-            except requests.RequestException as e:
-                print(f"Error OSRM: {e}")
 
-            # 5. Guardar en la ruta
-            ruta.ruta_optimizada = {
-                "geometry": geometry,
-                "orden_paquetes": [p.id_paquete for p in ordenados],
-                "punto_inicio": {"lat": start_lat, "lng": start_lng},
-                "paquetes": [
-                    {
-                        "id": p.id_paquete,
-                        "lat": float(p.lat),
-                        "lng": float(p.lng),
-                        "direccion": p.direccion_entrega,
-                        "orden_entrega": idx,
-                        "estado": p.estado_paquete  # Para recuperación
-                    }
-                    for idx, p in enumerate(ordenados, 1)
-                ]
-            }
-            ruta.distancia_total_km = distancia_km
-            ruta.tiempo_estimado_minutos = duracion_min
-            ruta.save()
+    @action(detail=False, methods=['get'], url_path=r'trabajos/(?P<id_trabajo>\d+)')
+    def estado_trabajo(self, request, id_trabajo=None):
+        """
+        Estado, progreso y resultado de un cálculo de ruta encolado.
+        """
+        trabajo = TrabajoRuta.objects.filter(id_trabajo=id_trabajo).first()
+        if not trabajo:
+            return Response({"error": "Trabajo no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
+        return Response(TrabajoRutaSerializer(trabajo).data)
+    
+    
+    @action(detail=False, methods=['get'])
+    def telemetria(self, request):
+        """
+        Percentiles (p50, p90, p95, p99 y máximo) de tiempo y calidad de las
+        optimizaciones recientes, en total y por rango de cantidad de paradas.
+        Query params: dias (por defecto 7), operacion (calcular_ruta o
+        calcular_lote), algoritmo (local, multiarranque, zonas o plantilla)
+        """
+        try:
+            dias = int(request.query_params.get('dias', 7))
+        except (TypeError, ValueError):
+            return Response({"error": "dias debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if dias < 1:
+            return Response({"error": "dias debe ser mayor que 0"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        registros = TelemetriaOptimizacion.objects.filter(fecha__gte=timezone.now() - timedelta(days=dias))
+        
+        operacion = request.query_params.get('operacion')
+        if operacion:
+            if operacion not in TelemetriaOptimizacion.Operacion.values:
+                return Response(
+                    {"error": f"operacion debe ser una de: {', '.join(TelemetriaOptimizacion.Operacion.values)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            registros = registros.filter(operacion=operacion)
+        
+        algoritmo = request.query_params.get('algoritmo')
+        if algoritmo:
+            registros = registros.filter(algoritmo=algoritmo)
+        
+        return Response({"dias": dias, **resumen_telemetria(registros)})
+    
+    
+    @action(detail=True, methods=['post'])
+    def guardar_plantilla(self, request, pk=None):
+        """
+        Guarda el recorrido calculado de la ruta como plantilla con el nombre
+        enviado (si ya existe una con ese nombre se reemplaza). Las rutas que
+        se calculen después desde el mismo punto de inicio y con casi los
+        mismos paquetes reutilizan su orden y su geometría.
+        """
+        ruta = self.get_object()
+        nombre = (request.data.get("nombre") or "").strip()
+        
+        if not nombre:
+            return Response(
+                {"error": "Debes enviar el nombre de la plantilla"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            plantilla = crear_plantilla(ruta, nombre)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
         return Response({
-            "mensaje": "Ruta optimizada calculada",
-            "orden_paquetes": [p.id_paquete for p in ordenados],
-            "distancia_km": distancia_km,
-            "duracion_min": duracion_min,
-            "punto_inicio": {"lat": start_lat, "lng": start_lng}
-        })
+            "mensaje": "Plantilla guardada correctamente",
+            "plantilla": resumen_plantilla(plantilla)
+        }, status=status.HTTP_201_CREATED)
+    
+    
+    @action(detail=False, methods=['get'])
+    def plantillas(self, request):
+        return Response([resumen_plantilla(p) for p in PlantillaRuta.objects.all()])
+    
+    
+    @action(detail=False, methods=['delete'], url_path=r'plantillas/(?P<id_plantilla>\d+)')
+    def eliminar_plantilla(self, request, id_plantilla=None):
+        eliminadas, _ = PlantillaRuta.objects.filter(id_plantilla=id_plantilla).delete()
+        if not eliminadas:
+            return Response({"error": "Plantilla no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response(status=status.HTTP_204_NO_CONTENT)
     
     
     @action(detail=True, methods=['post'])
@@ -561,10 +764,15 @@ class RutaViewSet(viewsets.ModelViewSet):
                 ruta.conductor.vehiculo.estado = "En ruta"
                 ruta.conductor.vehiculo.save()
         
+        geometria = representar_ruta_optimizada(
+            ruta.ruta_optimizada, "polyline", simplificacion_solicitada(ruta, request.query_params)
+        )
+
         return Response({
             "mensaje": "Ruta iniciada correctamente",
             "fecha_inicio": ruta.fecha_inicio,
-            "polyline": ruta.ruta_optimizada.get("polyline")
+            "polyline": geometria.get("polyline"),
+            "precision": geometria.get("precision")
         })
         
         
@@ -578,6 +786,10 @@ class RutaViewSet(viewsets.ModelViewSet):
         
         if proximo:
             serializer = PaqueteSerializer(proximo)
+            estimacion = estimar_llegadas(ruta)
+            llegada = next(
+                (p for p in estimacion["paradas"] if p["id"] == proximo.id_paquete), {}
+            ) if estimacion else {}
             return Response({
                 'proximo': {
                     **serializer.data,
@@ -586,7 +798,10 @@ class RutaViewSet(viewsets.ModelViewSet):
                 },
                 'orden': proximo.orden_entrega,
                 'total_paquetes': ruta.total_paquetes,
-                'entregados': ruta.paquetes_entregados
+                'entregados': ruta.paquetes_entregados,
+                'segundos_restantes': llegada.get('segundos_restantes'),
+                'llegada_estimada': llegada.get('llegada_estimada'),
+                'tiempo_restante_min': estimacion["tiempo_restante_min"] if estimacion else None
             })
         
         return Response({
@@ -614,6 +829,9 @@ class RutaViewSet(viewsets.ModelViewSet):
             estado_paquete='Fallido'
         ).order_by('orden_entrega')
         
+        estimacion = estimar_llegadas(ruta)
+        llegadas = {p["id"]: p["llegada_estimada"] for p in estimacion["paradas"]} if estimacion else {}
+        
         return Response({
             "ruta_id": ruta.id_ruta,
             "estado": ruta.estado,
@@ -622,12 +840,15 @@ class RutaViewSet(viewsets.ModelViewSet):
             "paquetes_fallidos": ruta.paquetes_fallidos,
             "proximo_paquete": paquetes_pendientes.first().id_paquete if paquetes_pendientes.exists() else None,
             "orden_entrega_actual": paquetes_entregados.count() + paquetes_fallidos.count() + 1,
+            "tiempo_restante_min": estimacion["tiempo_restante_min"] if estimacion else None,
+            "llegada_estimada_final": estimacion["llegada_estimada_final"] if estimacion else None,
             "paquetes": {
                 "pendientes": [
                     {
                         "id": p.id_paquete,
                         "orden_entrega": p.orden_entrega,
-                        "direccion": p.direccion_entrega
+                        "direccion": p.direccion_entrega,
+                        "llegada_estimada": llegadas.get(p.id_paquete)
                     } for p in paquetes_pendientes
                 ],
                 "entregados": [
@@ -646,6 +867,60 @@ class RutaViewSet(viewsets.ModelViewSet):
         })
         
     
+    @action(detail=True, methods=['get'])
+    def ruta_restante(self, request, pk=None):
+        """
+        Solo los tramos que le faltan al conductor: desde el que lleva a la
+        parada ?desde= (orden_entrega; por defecto el próximo paquete
+        pendiente) hasta el final. ?geometry=geojson entrega coordenadas en
+        lugar de polilíneas; ?tolerance= o ?zoom= eligen una versión simplificada.
+        """
+        ruta = self.get_object()
+        datos = ruta.ruta_optimizada
+        
+        if not datos or not datos.get("paquetes"):
+            return Response(
+                {"error": "La ruta no tiene un cálculo de recorrido"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        formato = request.query_params.get("geometry", "polyline")
+        if formato not in FORMATOS_GEOMETRIA:
+            return Response(
+                {"error": f"geometry debe ser uno de: {', '.join(FORMATOS_GEOMETRIA)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        desde = request.query_params.get("desde")
+        if desde not in (None, ""):
+            try:
+                desde = int(desde)
+            except (TypeError, ValueError):
+                return Response(
+                    {"error": "desde debe ser un orden de entrega"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            proximo = ruta.paquetes.filter(
+                estado_paquete__in=['Pendiente', 'Asignado', 'En ruta'],
+                orden_entrega__isnull=False
+            ).order_by('orden_entrega').values_list('orden_entrega', flat=True).first()
+            desde = proximo if proximo is not None else len(datos["paquetes"]) + 1
+        
+        tramos = tramos_restantes(datos, desde, formato, simplificacion_solicitada(ruta, request.query_params))
+        completos = all(t["distancia_m"] is not None for t in tramos)
+        
+        return Response({
+            "id_ruta": ruta.id_ruta,
+            "desde_orden": desde,
+            "precision": PRECISION_POLILINEA if formato == "polyline" else None,
+            "tramos": tramos,
+            "distancia_restante_m": sum(t["distancia_m"] for t in tramos) if completos else None,
+            "duracion_restante_s": sum(t["duracion_s"] for t in tramos) if completos else None,
+            "estimado": any(t["estimado"] for t in tramos),
+        })
+    
+    
     @action(detail=True, methods=['post'])
     def actualizar_ubicacion(self, request, pk=None):
         ruta = self.get_object()
@@ -15,6 +15,14 @@ class Vehiculo(models.Model):
         EN_RUTA = "En ruta", "En ruta"
         NO_DISPONIBLE = "No disponible", "No disponible"
         
+    # Capacidad de carga por tipo: peso en kg y volumen en cm³ (largo * ancho * alto del paquete)
+    CAPACIDAD_POR_TIPO = {
+        TipoVehiculo.CAMION: {"peso": 3500, "volumen": 20_000_000},
+        TipoVehiculo.FURGON: {"peso": 1500, "volumen": 8_000_000},
+        TipoVehiculo.CAMIONETA: {"peso": 800, "volumen": 3_000_000},
+        TipoVehiculo.MOTO: {"peso": 20, "volumen": 100_000},
+    }
+    
     
     id_vehiculo = models.AutoField(primary_key=True)
     tipo = models.CharField(choices=TipoVehiculo, default=TipoVehiculo.FURGON, max_length=10)